@@ -0,0 +1,97 @@
+from asgiref.sync import sync_to_async
+from django.http import Http404, HttpResponse
+from django.views.decorators.http import require_GET
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from .facets import facet_counts
+from .views import CategoryViewSet, PerfumesViewSet, ReviewViewSet
+
+# Native async versions of the read-only catalog endpoints, under /api/async/. Served by
+# an ASGI server (scenthives.asgi, e.g uvicorn workers, see gunicorn.conf.py) a request
+# waiting on the database holds a coroutine instead of a whole worker thread.
+#
+# They answer with the same JSON as the viewsets for the same query parameters: the
+# viewsets still build the querysets (filters, search, ordering) and serialize the rows,
+# only the queries are run through the async ORM. The catalog is public, so there's no
+# authentication, and JSON is the only format. These responses don't go through the
+# response cache or the ETag checks of the viewsets.
+
+
+def json_response(data, status_code=status.HTTP_200_OK):
+    return HttpResponse(JSONRenderer().render(data), content_type='application/json', status=status_code)
+
+
+def error_response(exc):
+    if isinstance(exc, Http404):
+        return json_response({'detail': str(exc) or 'Not found.'}, status.HTTP_404_NOT_FOUND)
+    return json_response(exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}, exc.status_code)
+
+
+def get_view(viewset_class, request, action, **kwargs):
+    view = viewset_class(request=request, args=(), kwargs=kwargs, format_kwarg=None, action=action)
+    view.headers = {}
+    return view
+
+
+def filtered_queryset(view):
+    # Sync on purpose: validating the filters can query the database (the category of
+    # ?category=) and so can picking the search backend, the rows themselves aren't read
+    return view.filter_queryset(view.get_queryset())
+
+
+async def list_response(viewset_class, request, **kwargs):
+    request = Request(request)
+    view = get_view(viewset_class, request, 'list', **kwargs)
+    try:
+        wants_facets = hasattr(view, 'wants_facets') and view.wants_facets(request)
+        queryset = await sync_to_async(filtered_queryset)(view)
+        page = await view.paginator.apaginate_queryset(queryset, request, view=view)
+    except APIException as exc:
+        return error_response(exc)
+    serializer = view.get_serializer(page, many=True)
+    data = view.paginator.get_paginated_response(serializer.data).data
+    if wants_facets:
+        data['facets'] = await sync_to_async(facet_counts)(queryset)
+    return json_response(data)
+
+
+async def detail_response(viewset_class, request, pk, **kwargs):
+    request = Request(request)
+    view = get_view(viewset_class, request, 'retrieve', pk=pk, **kwargs)
+    try:
+        queryset = await sync_to_async(filtered_queryset)(view)
+    except APIException as exc:
+        return error_response(exc)
+    try:
+        instance = await queryset.aget(pk=pk)
+    except queryset.model.DoesNotExist:
+        return error_response(Http404(f"No {queryset.model._meta.object_name} matches the given query."))
+    return json_response(view.get_serializer(instance).data)
+
+
+@require_GET
+async def perfume_list(request):
+    # Also the search (?search=), the filters, the facets and the cursor pages of /api/perfumes/
+    return await list_response(PerfumesViewSet, request)
+
+
+@require_GET
+async def perfume_detail(request, pk):
+    return await detail_response(PerfumesViewSet, request, pk)
+
+
+@require_GET
+async def category_list(request):
+    return await list_response(CategoryViewSet, request)
+
+
+@require_GET
+async def category_detail(request, pk):
+    return await detail_response(CategoryViewSet, request, pk)
+
+
+@require_GET
+async def review_list(request, perfume_pk):
+    return await list_response(ReviewViewSet, request, perfume_pk=perfume_pk)
@@ -0,0 +1,175 @@
+import hashlib
+import threading
+import time
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from rest_framework.response import Response
+
+
+class ResponseCache:
+    # Caches the data of read-only API responses in one of Django's cache backends
+    # (local memory, file or Redis, see CACHES in settings).
+    #
+    # Every entry depends on one or more namespaces ("perfumes", "perfume:<id>",
+    # "reviews:<perfume_id>", ...). Each namespace has a version number stored in the
+    # cache and the versions are part of the entry keys, so invalidating a namespace is
+    # a single increment and the old entries simply expire.
+    #
+    # When many requests miss the same key at once only one of them rebuilds the entry,
+    # the others wait for it to land in the cache.
+
+    prefix = 'api-response'
+
+    def __init__(self, alias=None, timeout=None, lock_timeout=10, wait_interval=0.02):
+        self.alias = alias
+        self.timeout = timeout
+        self.lock_timeout = lock_timeout
+        self.wait_interval = wait_interval
+        self._counters = {'hits': 0, 'misses': 0, 'coalesced': 0}
+        self._counters_lock = threading.Lock()
+
+    @property
+    def cache(self):
+        return caches[self.alias or getattr(settings, 'API_CACHE_ALIAS', 'default')]
+
+    @property
+    def enabled(self):
+        return getattr(settings, 'API_CACHE_ENABLED', True)
+
+    def get_timeout(self):
+        return self.timeout or getattr(settings, 'API_CACHE_TIMEOUT', 300)
+
+    def version_key(self, namespace):
+        return f'{self.prefix}:version:{namespace}'
+
+    def get_versions(self, namespaces):
+        keys = [self.version_key(namespace) for namespace in namespaces]
+        versions = self.cache.get_many(keys)
+        for key in keys:
+            if key not in versions:
+                # Starting from the clock rather than 1 means a version that was evicted
+                # never comes back with a number that old entries were stored under
+                self.cache.add(key, time.time_ns(), timeout=None)
+                versions[key] = self.cache.get(key)
+        return [versions[key] for key in keys]
+
+    def make_key(self, request, namespaces, validator=None):
+        user = request.user
+        if not user.is_authenticated:
+            auth = 'anon'
+        else:
+            auth = 'staff' if user.is_staff else 'user'
+
+        query = sorted(request.GET.lists())
+        versions = self.get_versions(namespaces)
+        raw = f'{request.path}|{query}|{auth}|{list(zip(namespaces, versions))}|{validator}'
+        return f'{self.prefix}:{hashlib.sha1(raw.encode()).hexdigest()}'
+
+    def invalidate(self, *namespaces):
+        for namespace in namespaces:
+            key = self.version_key(namespace)
+            try:
+                self.cache.incr(key)
+            except ValueError:
+                # The version was never read (or was evicted), nothing can be cached under it
+                pass
+
+    def get_or_set(self, key, build):
+        # build() returns the value to cache, or None when the result must not be cached
+        value = self.cache.get(key)
+        if value is not None:
+            self._count('hits')
+            return value
+
+        lock_key = f'{key}:lock'
+        if not self.cache.add(lock_key, 1, timeout=self.lock_timeout):
+            # Someone else is rebuilding this entry, wait for them rather than piling up
+            value = self.wait_for(key, lock_key)
+            if value is not None:
+                self._count('coalesced')
+                return value
+            self._count('misses')
+            return build()
+
+        self._count('misses')
+        try:
+            value = build()
+            if value is not None:
+                self.cache.set(key, value, timeout=self.get_timeout())
+            return value
+        finally:
+            self.cache.delete(lock_key)
+
+    def wait_for(self, key, lock_key):
+        deadline = time.monotonic() + self.lock_timeout
+        while time.monotonic() < deadline:
+            time.sleep(self.wait_interval)
+            value = self.cache.get(key)
+            if value is not None or self.cache.get(lock_key) is None:
+                return value
+        return None
+
+    def _count(self, counter):
+        with self._counters_lock:
+            self._counters[counter] += 1
+
+    def stats(self):
+        # Counters of this process since it started
+        with self._counters_lock:
+            stats = dict(self._counters)
+        lookups = stats['hits'] + stats['coalesced'] + stats['misses']
+        stats['hit_ratio'] = (stats['hits'] + stats['coalesced']) / lookups if lookups else 0.0
+        return stats
+
+
+response_cache = ResponseCache()
+
+
+def invalidate(*namespaces):
+    # Bumped right away, and once more after the commit so that a request that rebuilt
+    # the entry from the old rows while the transaction was open doesn't stick around
+    response_cache.invalidate(*namespaces)
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(lambda: response_cache.invalidate(*namespaces))
+
+
+class CachedResponseMixin:
+    # Serves list and retrieve from the response cache. Views list the namespaces their
+    # responses depend on, the signals in api/signals.py invalidate them.
+    cache_namespaces = ()
+
+    def get_cache_namespaces(self):
+        return list(self.cache_namespaces)
+
+    def get_cache_validator(self):
+        # The ETag that ConditionalGetMixin (above this mixin) worked out from the rows.
+        # It's part of the key, so a write the signals didn't see (a bulk update, a raw
+        # query) moves to another entry instead of serving the old body under the new
+        # ETag, which clients would then revalidate against for good.
+        return getattr(self, 'conditional_etag', None)
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(super().retrieve, request, *args, **kwargs)
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        if not response_cache.enabled:
+            return handler(request, *args, **kwargs)
+
+        built = []
+
+        def build():
+            response = handler(request, *args, **kwargs)
+            built.append(response)
+            return response.data if response.status_code == 200 else None
+
+        key = response_cache.make_key(request, self.get_cache_namespaces(), self.get_cache_validator())
+        data = response_cache.get_or_set(key, build)
+        if built:
+            response = built[0]
+            response['X-Cache'] = 'MISS'
+            return response
+        return Response(data, headers={'X-Cache': 'HIT'})
@@ -0,0 +1,409 @@
+import time
+import uuid
+from contextlib import contextmanager, nullcontext
+from functools import lru_cache
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+from django.db.models import Count, F, Prefetch
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from shop.models import Cart, Cartitems, Perfume
+
+
+class CartNotFound(Exception):
+    pass
+
+
+class CartCheckoutInProgress(Exception):
+    pass
+
+
+class PerfumeNotFound(Exception):
+    pass
+
+
+class CartLocked(Exception):
+    # Another request held the cart for the whole lock timeout, worth retrying
+    pass
+
+
+class BaseCartStore:
+    # Where the carts and their items live. Stores hand out Cart-like objects (id, items,
+    # grand_total) and Cartitems with sub_total, so CartSerializer and CartItemSerializer
+    # render them the same whatever the store. Ids that aren't valid are just not found.
+    uses_database = False
+
+    def create(self):
+        raise NotImplementedError
+
+    def get(self, cart_id):
+        # The cart with its items, or None
+        raise NotImplementedError
+
+    def delete(self, cart_id):
+        raise NotImplementedError
+
+    def items(self, cart_id):
+        raise NotImplementedError
+
+    def get_item(self, cart_id, item_id):
+        raise NotImplementedError
+
+    def add_item(self, cart_id, perfume_id, quantity):
+        # Adds to the quantity when the perfume is already in the cart, raises CartNotFound
+        # or PerfumeNotFound
+        raise NotImplementedError
+
+    def set_items(self, cart_id, quantities):
+        # Sets the quantity of each perfume of {perfume_id: quantity}, adding the lines
+        # that aren't in the cart yet. Raises CartNotFound or PerfumeNotFound.
+        raise NotImplementedError
+
+    def update_item(self, cart_id, item_id, quantity):
+        raise NotImplementedError
+
+    def remove_item(self, cart_id, item_id):
+        raise NotImplementedError
+
+    def item_count(self, cart_id):
+        # The number of lines of the cart, None when there's no such cart
+        raise NotImplementedError
+
+    def checkout(self, cart_id):
+        # Context manager wrapped around the checkout, inside its transaction. The cart must
+        # be in the shop_cart/shop_cartitems tables within it.
+        return nullcontext()
+
+
+class DatabaseCartStore(BaseCartStore):
+    # Carts are Cart and Cartitems rows
+    uses_database = True
+
+    def carts(self):
+        from .serializers import cart_total_expression
+
+        # The grand total and the line sub totals are computed by the database, so a cart
+        # costs two queries (cart + items with their perfumes) whatever its size
+        return Cart.objects.annotate(
+            grand_total=cart_total_expression('items__')
+        ).prefetch_related(
+            Prefetch('items', queryset=self.lines())
+        )
+
+    def lines(self):
+        from .serializers import line_total_expression
+
+        return Cartitems.objects.select_related('perfume').annotate(sub_total=line_total_expression()).order_by('pk')
+
+    def create(self):
+        return Cart.objects.create()
+
+    def get(self, cart_id):
+        try:
+            return self.carts().filter(pk=cart_id).first()
+        except ValidationError:
+            return None
+
+    def delete(self, cart_id):
+        (deleted, counts) = Cart.objects.filter(pk=cart_id).delete()
+        return bool(counts.get(Cart._meta.label))
+
+    def items(self, cart_id):
+        return self.lines().filter(cart_id=cart_id)
+
+    def get_item(self, cart_id, item_id):
+        try:
+            return self.items(cart_id).filter(pk=item_id).first()
+        except (ValueError, ValidationError):
+            return None
+
+    def add_item(self, cart_id, perfume_id, quantity):
+        with transaction.atomic():
+            # Touching the cart first also locks its row, concurrent adds to a cart queue up
+            if not self.touch(cart_id):
+                raise CartNotFound(cart_id)
+
+            # One upsert whether the perfume is already in the cart or not, the database
+            # does the addition. Selecting the perfume inserts nothing when there's none.
+            cart = Cartitems._meta.get_field('cart')
+            with connection.cursor() as cursor:
+                cursor.execute(self.add_item_sql(), [
+                    cart.get_db_prep_value(cart.to_python(cart_id), connection),
+                    quantity,
+                    Perfume._meta.pk.get_db_prep_value(perfume_id, connection),
+                ])
+                row = cursor.fetchone()
+            if row is None:
+                raise PerfumeNotFound(perfume_id)
+        item_id, quantity = row
+        return Cartitems(id=item_id, cart_id=cart_id, perfume_id=perfume_id, quantity=quantity)
+
+    def add_item_sql(self):
+        # INSERT .. ON CONFLICT (cart, perfume) DO UPDATE .. RETURNING, on SQLite and Postgres
+        qn = connection.ops.quote_name
+        items, perfumes, perfume_pk = qn(Cartitems._meta.db_table), qn(Perfume._meta.db_table), qn(Perfume._meta.pk.column)
+        cart, perfume, quantity, item_id = [
+            qn(Cartitems._meta.get_field(name).column) for name in ('cart', 'perfume', 'quantity', 'id')
+        ]
+        return (
+            f'INSERT INTO {items} ({cart}, {perfume}, {quantity}) '
+            f'SELECT %s, {perfume_pk}, %s FROM {perfumes} WHERE {perfume_pk} = %s '
+            f'ON CONFLICT ({cart}, {perfume}) DO UPDATE SET {quantity} = {items}.{quantity} + excluded.{quantity} '
+            f'RETURNING {item_id}, {quantity}'
+        )
+
+    def set_items(self, cart_id, quantities):
+        with transaction.atomic():
+            if not self.touch(cart_id):
+                raise CartNotFound(cart_id)
+            existing = set(Perfume.objects.filter(pk__in=quantities).values_list('pk', flat=True))
+            missing = [perfume_id for perfume_id in quantities if perfume_id not in existing]
+            if missing:
+                raise PerfumeNotFound(*missing)
+
+            # One INSERT .. ON CONFLICT (cart, perfume) DO UPDATE for all the lines
+            Cartitems.objects.bulk_create(
+                [Cartitems(cart_id=cart_id, perfume_id=perfume_id, quantity=quantity) for perfume_id, quantity in quantities.items()],
+                update_conflicts=True,
+                unique_fields=['cart', 'perfume'],
+                update_fields=['quantity'],
+            )
+
+    def update_item(self, cart_id, item_id, quantity):
+        Cartitems.objects.filter(cart_id=cart_id, pk=item_id).update(quantity=quantity)
+        self.touch(cart_id)
+        return self.get_item(cart_id, item_id)
+
+    def remove_item(self, cart_id, item_id):
+        (deleted, counts) = Cartitems.objects.filter(cart_id=cart_id, pk=item_id).delete()
+        self.touch(cart_id)
+        return bool(deleted)
+
+    def item_count(self, cart_id):
+        try:
+            carts = Cart.objects.filter(pk=cart_id)
+        except ValidationError:
+            return None
+        return carts.annotate(lines=Count('items')).values_list('lines', flat=True).first()
+
+    def touch(self, cart_id):
+        # Any change to the items is a change to the cart, its ETag must go stale. Returns
+        # whether there's such a cart.
+        try:
+            return bool(Cart.objects.filter(pk=cart_id).update(updated_at=timezone.now()))
+        except ValidationError:
+            return False
+
+
+class StoredCart:
+    # A cart of the cache store, shaped like an annotated Cart for CartSerializer
+    def __init__(self, cart_id, items):
+        self.id = self.pk = cart_id
+        self.items = items
+        self.grand_total = sum(item.sub_total for item in items)
+
+
+class CacheCartStore(BaseCartStore):
+    # Carts are single entries of one of Django's caches (local memory, file or Redis),
+    # {'items': [[item_id, perfume_id, quantity], ...], 'next_id': n}. Every change
+    # renews the expiry, carts nobody touches for CART_STORE_TTL seconds just vanish.
+    # The tables are only written when the cart is checked out.
+    #
+    # Reading a cart costs one query for the perfumes of its lines, so the names and
+    # prices are always current and perfumes that were deleted drop out of the cart.
+    prefix = 'cart'
+    lock_timeout = 5
+    wait_interval = 0.01
+
+    def __init__(self, alias=None, ttl=None):
+        self.alias = alias
+        self.ttl = ttl
+
+    @property
+    def cache(self):
+        return caches[self.alias or getattr(settings, 'CART_STORE_CACHE', 'default')]
+
+    def get_ttl(self):
+        return self.ttl or getattr(settings, 'CART_STORE_TTL', 3 * 24 * 60 * 60)
+
+    def key(self, cart_id):
+        return f'{self.prefix}:{cart_id}'
+
+    def parse_id(self, cart_id):
+        try:
+            return uuid.UUID(str(cart_id))
+        except ValueError:
+            return None
+
+    def load(self, cart_id):
+        cart_id = self.parse_id(cart_id)
+        if cart_id is None:
+            return None, None
+        return cart_id, self.cache.get(self.key(cart_id))
+
+    def save(self, cart_id, data):
+        self.cache.set(self.key(cart_id), data, timeout=self.get_ttl())
+
+    @contextmanager
+    def lock(self, cart_id):
+        # Serializes the read-modify-write of one cart, e.g on a double click. A request
+        # that waits lock_timeout without getting it raises CartLocked instead of writing
+        # without it. The lock expires after lock_timeout, a crashed request can't keep it.
+        lock_key = f'{self.key(cart_id)}:lock'
+        token = uuid.uuid4().hex
+        deadline = time.monotonic() + self.lock_timeout
+        while not self.cache.add(lock_key, token, timeout=self.lock_timeout):
+            if time.monotonic() >= deadline:
+                raise CartLocked(cart_id)
+            time.sleep(self.wait_interval)
+        try:
+            yield
+        finally:
+            # Ours may have expired and another request taken the lock since, only release
+            # it if it's still ours
+            if self.cache.get(lock_key) == token:
+                self.cache.delete(lock_key)
+
+    def build_items(self, cart_id, lines):
+        perfumes = Perfume.objects.only('id', 'name', 'price').in_bulk([perfume_id for _, perfume_id, _ in lines])
+        items = []
+        for item_id, perfume_id, quantity in lines:
+            perfume = perfumes.get(uuid.UUID(perfume_id))
+            if perfume is not None:
+                item = Cartitems(id=item_id, cart_id=cart_id, perfume=perfume, quantity=quantity)
+                item.sub_total = quantity * perfume.price
+                items.append(item)
+        return items
+
+    def create(self):
+        cart_id = uuid.uuid4()
+        self.save(cart_id, {'items': [], 'next_id': 1})
+        return StoredCart(cart_id, [])
+
+    def get(self, cart_id):
+        cart_id, data = self.load(cart_id)
+        if data is None:
+            return None
+        return StoredCart(cart_id, self.build_items(cart_id, data['items']))
+
+    def delete(self, cart_id):
+        cart_id = self.parse_id(cart_id)
+        return cart_id is not None and bool(self.cache.delete(self.key(cart_id)))
+
+    def items(self, cart_id):
+        cart = self.get(cart_id)
+        return cart.items if cart is not None else []
+
+    def get_item(self, cart_id, item_id):
+        return next((item for item in self.items(cart_id) if str(item.pk) == str(item_id)), None)
+
+    def add_item(self, cart_id, perfume_id, quantity):
+        perfume_id = str(perfume_id)
+        with self.lock(cart_id):
+            cart_id, data = self.load(cart_id)
+            if data is None:
+                raise CartNotFound(cart_id)
+
+            line = next((line for line in data['items'] if line[1] == perfume_id), None)
+            if line is not None:
+                line[2] += quantity
+            else:
+                if not Perfume.objects.filter(pk=perfume_id).exists():
+                    raise PerfumeNotFound(perfume_id)
+                line = [data['next_id'], perfume_id, quantity]
+                data['items'].append(line)
+                data['next_id'] += 1
+            self.save(cart_id, data)
+        return Cartitems(id=line[0], cart_id=cart_id, perfume_id=uuid.UUID(perfume_id), quantity=line[2])
+
+    def set_items(self, cart_id, quantities):
+        existing = set(Perfume.objects.filter(pk__in=quantities).values_list('pk', flat=True))
+        missing = [perfume_id for perfume_id in quantities if perfume_id not in existing]
+        if missing:
+            raise PerfumeNotFound(*missing)
+
+        with self.lock(cart_id):
+            cart_id, data = self.load(cart_id)
+            if data is None:
+                raise CartNotFound(cart_id)
+
+            lines = {line[1]: line for line in data['items']}
+            for perfume_id, quantity in quantities.items():
+                line = lines.get(str(perfume_id))
+                if line is not None:
+                    line[2] = quantity
+                else:
+                    data['items'].append([data['next_id'], str(perfume_id), quantity])
+                    data['next_id'] += 1
+            self.save(cart_id, data)
+
+    def update_item(self, cart_id, item_id, quantity):
+        with self.lock(cart_id):
+            cart_id, data = self.load(cart_id)
+            if data is None:
+                return None
+            for line in data['items']:
+                if str(line[0]) == str(item_id):
+                    line[2] = quantity
+            self.save(cart_id, data)
+        return self.get_item(cart_id, item_id)
+
+    def remove_item(self, cart_id, item_id):
+        with self.lock(cart_id):
+            cart_id, data = self.load(cart_id)
+            if data is None:
+                return False
+            lines = [line for line in data['items'] if str(line[0]) != str(item_id)]
+            removed = len(lines) != len(data['items'])
+            data['items'] = lines
+            self.save(cart_id, data)
+        return removed
+
+    def item_count(self, cart_id):
+        cart_id, data = self.load(cart_id)
+        return len(data['items']) if data is not None else None
+
+    @contextmanager
+    def checkout(self, cart_id):
+        # Only one checkout of a cart at a time, a double submit must not order it twice
+        cart_id = self.parse_id(cart_id)
+        if cart_id is None:
+            raise CartNotFound(cart_id)
+        claim_key = f'{self.key(cart_id)}:checkout'
+        if not self.cache.add(claim_key, 1, timeout=60):
+            raise CartCheckoutInProgress(cart_id)
+
+        try:
+            data = self.cache.get(self.key(cart_id))
+            if data is None:
+                raise CartNotFound(cart_id)
+            lines = data['items']
+            existing = set(Perfume.objects.filter(pk__in=[perfume_id for _, perfume_id, _ in lines]).values_list('pk', flat=True))
+            Cart.objects.create(id=cart_id)
+            Cartitems.objects.bulk_create([
+                Cartitems(cart_id=cart_id, perfume_id=uuid.UUID(perfume_id), quantity=quantity)
+                for _, perfume_id, quantity in lines
+                if uuid.UUID(perfume_id) in existing
+            ])
+            yield
+        except BaseException:
+            # The order rolls back, the cart stays in the cache as it was
+            self.cache.delete(claim_key)
+            raise
+
+        transaction.on_commit(lambda: self.cache.delete_many([self.key(cart_id), claim_key]))
+
+
+BACKENDS = {
+    'database': 'api.cart_store.DatabaseCartStore',
+    'cache': 'api.cart_store.CacheCartStore',
+}
+
+
+@lru_cache(maxsize=None)
+def get_cart_store():
+    # CART_STORE is "database", "cache" or the path of any BaseCartStore subclass
+    path = getattr(settings, 'CART_STORE', 'database') or 'database'
+    return import_string(BACKENDS.get(path, path))()
@@ -0,0 +1,79 @@
+import hashlib
+from django.core.exceptions import ValidationError
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, quote_etag
+from django.utils.http import http_date
+
+
+class ConditionalResponseMixin:
+    # Strong ETags and Last-Modified headers. Whether the client's copy is still current
+    # is decided from one aggregate query (the newest updated_at and the number of rows),
+    # so a 304 is answered without running the view or serializing anything. The row
+    # count catches deletions, which don't leave a newer updated_at behind.
+    last_modified_field = 'updated_at'
+    # The ETag of the current request, None when the view answers without one.
+    # CachedResponseMixin keys its entries on it (see get_cache_validator).
+    conditional_etag = None
+
+    def get_conditional_queryset(self):
+        # The rows a response is built from, without the annotations and prefetches
+        # that are only needed to render it
+        return self.get_queryset()
+
+    def get_related_modified_fields(self):
+        # Dates of the related rows that show in the response (the perfumes in a cart,
+        # say), whose changes don't touch the view's own rows. They're joined into the
+        # same aggregate query.
+        return []
+
+    def get_conditional_state(self, queryset):
+        related = {f'related_{i}': Max(field) for i, field in enumerate(self.get_related_modified_fields())}
+        # The joins repeat the rows, the distinct count still counts them once
+        count = Count('pk', distinct=True) if related else Count('*')
+        state = queryset.order_by().aggregate(last_modified=Max(self.last_modified_field), count=count, **related)
+        dates = [state[name] for name in ['last_modified', *related] if state[name] is not None]
+        return {'last_modified': max(dates, default=None), 'count': state['count']}
+
+    def conditional_response(self, queryset, handler, request, *args, **kwargs):
+        self.conditional_etag = None
+        state = self.get_conditional_state(queryset)
+        if not state['count']:
+            # Nothing to validate against, let the view answer (with a 404 for retrieve)
+            return handler(request, *args, **kwargs)
+
+        last_modified = state['last_modified'].timestamp()
+        etag = quote_etag(hashlib.sha1(
+            f"{request.path}|{sorted(request.GET.lists())}|{request.accepted_media_type}|"
+            f"{state['last_modified'].isoformat()}|{state['count']}".encode()
+        ).hexdigest())
+        self.conditional_etag = etag
+
+        response = get_conditional_response(request._request, etag=etag, last_modified=int(last_modified))
+        if response is None:
+            response = handler(request, *args, **kwargs)
+
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            response['Last-Modified'] = http_date(last_modified)
+        return response
+
+
+class ConditionalListMixin(ConditionalResponseMixin):
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_conditional_queryset())
+        return self.conditional_response(queryset, super().list, request, *args, **kwargs)
+
+
+class ConditionalRetrieveMixin(ConditionalResponseMixin):
+    def retrieve(self, request, *args, **kwargs):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        try:
+            queryset = self.get_conditional_queryset().filter(**{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        except (TypeError, ValueError, ValidationError):
+            # A malformed id, the view answers with its usual 404
+            return super().retrieve(request, *args, **kwargs)
+        return self.conditional_response(queryset, super().retrieve, request, *args, **kwargs)
+
+
+class ConditionalGetMixin(ConditionalListMixin, ConditionalRetrieveMixin):
+    pass
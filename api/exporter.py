@@ -0,0 +1,155 @@
+import csv
+import datetime
+import io
+from itertools import islice
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from order.models import OrderItem
+
+# Streams orders and order items as CSV or JSONL, for finance's exports. The rows are
+# read with values_list() through .iterator(), a chunk at a time (a server-side cursor
+# on Postgres), and written out as they come: no model instances, no serializer and no
+# list of the whole export, so the memory used is the same for a hundred rows or ten
+# million, and the first rows go out as soon as the first chunk is read.
+
+# Name in the export: field of values_list()
+ORDER_COLUMNS = {
+    'id': 'id',
+    'order_number': 'order_number',
+    'created_at': 'created_at',
+    'updated_at': 'updated_at',
+    'status': 'status',
+    'is_completed': 'is_completed',
+    'is_cancelled': 'is_cancelled',
+    'total_amount': 'total_amount',
+    'reference': 'reference',
+    'user_id': 'user_id',
+    'first_name': 'first_name',
+    'last_name': 'last_name',
+    'email': 'email',
+    'phone': 'phone',
+    'address': 'address',
+    'city': 'city',
+    'state': 'state',
+    'zipcode': 'zipcode',
+    'country': 'country',
+}
+ORDER_ITEM_COLUMNS = {
+    'id': 'id',
+    'order_id': 'order_id',
+    'order_number': 'order__order_number',
+    'order_created_at': 'order__created_at',
+    'order_status': 'order__status',
+    'perfume_id': 'perfume_id',
+    'perfume_name': 'perfume__name',
+    'price': 'price',
+    'quantity': 'quantity',
+}
+
+# Spreadsheets evaluate a cell that starts with one of these as a formula
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson',
+}
+
+
+def export_rows(queryset, columns, chunk_size=2000):
+    return queryset.values_list(*columns.values()).iterator(chunk_size=chunk_size)
+
+
+def batched(iterable, size, first_size=None):
+    # Lists of `size` items, the first one of `first_size`
+    iterator = iter(iterable)
+    chunk = list(islice(iterator, first_size or size))
+    while chunk:
+        yield chunk
+        chunk = list(islice(iterator, size))
+
+
+def to_text(value):
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    return value
+
+
+def csv_cell(value):
+    # The names and addresses are typed in by customers, and finance opens the export in
+    # a spreadsheet: text that would run as a formula is prefixed with a quote, which
+    # keeps it text. Numbers, dates and ids are never strings here, they're left alone.
+    value = to_text(value)
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def csv_chunks(names, rows, chunk_size):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def flush():
+        chunk = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return chunk
+
+    writer.writerow(names)
+    # The header is sent on its own, so the client gets it before the first query runs
+    yield flush()
+    for count, row in enumerate(rows, 1):
+        writer.writerow([csv_cell(value) for value in row])
+        if count % chunk_size == 0:
+            yield flush()
+    yield flush()
+
+
+def jsonl_chunks(names, rows, chunk_size):
+    encoder = DjangoJSONEncoder()
+    lines = []
+    for count, row in enumerate(rows):
+        lines.append(encoder.encode(dict(zip(names, row))))
+        # The first row is sent on its own, the client doesn't wait for a whole chunk
+        if count == 0 or len(lines) == chunk_size:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+
+def streaming_export(rows, columns, file_format, filename, chunk_size=2000):
+    chunks = csv_chunks if file_format == 'csv' else jsonl_chunks
+    response = StreamingHttpResponse(
+        (chunk.encode('utf-8') for chunk in chunks(list(columns), rows, chunk_size)),
+        content_type=CONTENT_TYPES[file_format],
+    )
+    stamp = timezone.now().strftime('%Y%m%d-%H%M%S')
+    response['Content-Disposition'] = f'attachment; filename="{filename}-{stamp}.{file_format}"'
+    # Proxies like nginx would otherwise buffer the whole export before sending it on
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def export_orders(orders, file_format, chunk_size=2000):
+    # Oldest first, the order of the (-created_at, -id) indexes read backwards
+    rows = export_rows(orders.order_by('created_at', 'id'), ORDER_COLUMNS, chunk_size)
+    return streaming_export(rows, ORDER_COLUMNS, file_format, 'orders', chunk_size)
+
+
+def order_item_rows(orders, columns, chunk_size=2000):
+    # The items of the orders, in the order of the orders. Sorting the join of the two
+    # tables by the order's date would sort the whole export before its first row, so the
+    # orders are read in index order and the items fetched a chunk of orders at a time.
+    order_ids = orders.order_by('created_at', 'id').values_list('pk', flat=True).iterator(chunk_size=chunk_size)
+    order_column = list(columns).index('order_id')
+    # A small first chunk, its items are fetched and sorted before the first row goes out
+    for chunk in batched(order_ids, chunk_size, first_size=min(chunk_size, 20)):
+        position = {pk: i for i, pk in enumerate(chunk)}
+        items = OrderItem.objects.filter(order_id__in=chunk).values_list(*columns.values())
+        yield from sorted(items, key=lambda row: (position[row[order_column]], row[0]))
+
+
+def export_order_items(orders, file_format, chunk_size=2000):
+    rows = order_item_rows(orders, ORDER_ITEM_COLUMNS, chunk_size)
+    return streaming_export(rows, ORDER_ITEM_COLUMNS, file_format, 'order-items', chunk_size)
@@ -0,0 +1,96 @@
+from django.db.models import Count, Q
+from rest_framework.exceptions import ValidationError
+from shop.models import Category
+
+# Counts for the filter sidebar of the catalog, over the perfumes a list request matches
+# (PerfumeFilter, search). Every facet comes out of one query grouped by category: the
+# price buckets and merchandising flags are conditional counts inside each group, summed
+# up here, and the gender is the category's. There's a row per category, not per perfume,
+# so the result stays small however big the catalog is. The query only reads columns of
+# the (category, price, flags) index on Perfume, which it scans in GROUP BY order without
+# touching the table; the titles and genders are looked up afterwards for the categories
+# found instead of being joined to every perfume.
+
+# Upper bounds of the price buckets, the last bucket has none
+PRICE_BUCKETS = (25, 50, 100, 200, 500)
+FLAGS = ('discount', 'top_deal', 'flash_sales')
+
+
+def price_ranges(bounds=PRICE_BUCKETS):
+    # [(None, 25), (25, 50), ..., (500, None)], the lower bound is included
+    return list(zip((None,) + tuple(bounds), tuple(bounds) + (None,)))
+
+
+def price_range_filter(lower, upper):
+    condition = Q()
+    if lower is not None:
+        condition &= Q(price__gte=lower)
+    if upper is not None:
+        condition &= Q(price__lt=upper)
+    return condition
+
+
+def facet_counts(queryset, bounds=PRICE_BUCKETS):
+    ranges = price_ranges(bounds)
+    # COUNT(price) counts the rows like COUNT(*) (the price is never null), but COUNT(*)
+    # can't take a filter in Django and the id isn't in the index
+    counts = {f'price_{i}': Count('price', filter=price_range_filter(*price_range)) for i, price_range in enumerate(ranges)}
+    counts.update({f'flag_{flag}': Count('price', filter=Q(**{flag: True})) for flag in FLAGS})
+    rows = list(
+        queryset.order_by().prefetch_related(None)
+        .values('category')
+        .annotate(total=Count('*'), **counts)
+    )
+    # The second and last query, one row per category found
+    found = Category.objects.filter(pk__in=[row['category'] for row in rows if row['category'] is not None])
+    details = {category['pk']: category for category in found.values('pk', 'title', 'gender')}
+
+    categories, genders = [], {}
+    prices = [0] * len(ranges)
+    flags = dict.fromkeys(FLAGS, 0)
+    for row in rows:
+        category = details.get(row['category'])
+        if category is not None:
+            categories.append({'value': category['pk'], 'title': category['title'], 'count': row['total']})
+            genders[category['gender']] = genders.get(category['gender'], 0) + row['total']
+        for i in range(len(ranges)):
+            prices[i] += row[f'price_{i}']
+        for flag in FLAGS:
+            flags[flag] += row[f'flag_{flag}']
+
+    return {
+        'category': sorted(categories, key=lambda facet: (-facet['count'], facet['title'])),
+        'gender': [{'value': gender, 'count': count} for gender, count in sorted(genders.items(), key=lambda item: (-item[1], item[0]))],
+        'price': [{'min': lower, 'max': upper, 'count': count} for (lower, upper), count in zip(ranges, prices)],
+        'flags': flags,
+    }
+
+
+class FacetedListMixin:
+    # Adds the facet counts to the list response when the client asks for them with
+    # ?facets=true. Goes under CachedResponseMixin and ConditionalGetMixin, whose keys
+    # include the query string, so the counts are cached per filter combination too. The
+    # view folds the categories into the ETag for their titles (see
+    # PerfumesViewSet.get_conditional_state).
+    facets_query_param = 'facets'
+
+    def list(self, request, *args, **kwargs):
+        wants_facets = self.wants_facets(request)
+        response = super().list(request, *args, **kwargs)
+        if wants_facets and response.status_code == 200:
+            response.data['facets'] = facet_counts(self.faceted_queryset)
+        return response
+
+    def paginate_queryset(self, queryset):
+        # The rows of the list, filtered once: validating a filter can cost a query (the
+        # category of ?category=)
+        self.faceted_queryset = queryset
+        return super().paginate_queryset(queryset)
+
+    def wants_facets(self, request):
+        value = request.query_params.get(self.facets_query_param, '').lower()
+        if value in ('', '0', 'false'):
+            return False
+        if value in ('1', 'true'):
+            return True
+        raise ValidationError({self.facets_query_param: ['Must be true or false.']})
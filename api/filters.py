@@ -1,4 +1,5 @@
-from django_filters.rest_framework import FilterSet
+from django_filters.rest_framework import DateTimeFilter, FilterSet
+from order.models import Order
 from shop.models import Perfume
 
 
@@ -8,4 +9,29 @@ class PerfumeFilter(FilterSet):
         fields = {
             'category': ['exact'],
             'price': ['gt', 'lt'],      # Implementing a range
-        }
\ No newline at end of file
+            # Served by the partial indexes on Perfume
+            'top_deal': ['exact'],
+            'flash_sales': ['exact'],
+            'discount': ['exact'],
+            # Served by the (rating_avg, id) index
+            'rating_avg': ['gte', 'lte'],
+        }
+
+class OrderFilter(FilterSet):
+    class Meta:
+        model = Order
+        fields = {
+            'status': ['exact', 'in'],
+        }
+
+
+class OrderExportFilter(FilterSet):
+    # The orders of an export, by date range (the end excluded) and status
+    created_after = DateTimeFilter(field_name='created_at', lookup_expr='gte')
+    created_before = DateTimeFilter(field_name='created_at', lookup_expr='lt')
+
+    class Meta:
+        model = Order
+        fields = {
+            'status': ['exact', 'in'],
+        }
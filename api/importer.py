@@ -0,0 +1,204 @@
+import csv
+import io
+import json
+import os
+import time
+import zipfile
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction, DatabaseError
+from django.utils.text import slugify
+from shop.images import schedule_derivatives
+from shop.models import Category, Perfume, PerfumeImage
+from .cache import invalidate
+from .search import get_search_backend
+from .serializers import PerfumeImportRowSerializer
+
+
+def read_rows(file, file_format):
+    # Streams the rows of a CSV or JSONL file (opened in binary mode) as dicts. Rows that
+    # can't be read come out as {'__error__': message}, reported as errors of that row
+    # rather than aborting the import.
+    if file_format == 'csv':
+        try:
+            yield from csv.DictReader(io.TextIOWrapper(file, encoding='utf-8-sig', newline=''))
+        except UnicodeDecodeError as error:
+            # The decoder can't pick up after a bad byte, the rest of the file is skipped
+            yield {'__error__': f'Invalid UTF-8, the rest of the file was not read: {error}'}
+        return
+
+    # JSONL lines are decoded one at a time, a bad byte only loses its own line
+    for line in file:
+        try:
+            line = line.decode('utf-8-sig').strip()
+        except UnicodeDecodeError as error:
+            yield {'__error__': f'Invalid UTF-8: {error}'}
+            continue
+        if not line:
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as error:
+            yield {'__error__': f'Invalid JSON: {error}'}
+            continue
+        if not isinstance(row, dict):
+            yield {'__error__': 'Expected a JSON object.'}
+            continue
+        yield row
+
+
+def detect_format(filename):
+    extension = os.path.splitext(filename or '')[1].lower()
+    return 'jsonl' if extension in ('.jsonl', '.json', '.ndjson') else 'csv'
+
+
+class CatalogImporter:
+    # Loads perfumes (and their images from a zip) in chunks with one bulk_create per
+    # table per chunk. Bad rows are reported and skipped, they never abort the import.
+    max_reported_errors = 1000
+
+    def __init__(self, images_zip=None, chunk_size=1000, on_chunk=None):
+        self.images_zip = zipfile.ZipFile(images_zip) if images_zip is not None else None
+        self.image_names = set(self.images_zip.namelist()) if self.images_zip else set()
+        self.chunk_size = chunk_size
+        self.on_chunk = on_chunk
+        self.categories = {}
+
+        self.rows = self.created = self.images = self.failed = 0
+        self.errors = []
+
+    def run(self, rows):
+        started = time.perf_counter()
+        chunk = []
+        for row_number, row in enumerate(rows, start=1):
+            chunk.append((row_number, row))
+            if len(chunk) == self.chunk_size:
+                self.import_chunk(chunk)
+                chunk = []
+        if chunk:
+            self.import_chunk(chunk)
+
+        if self.created:
+            # bulk_create skipped the signals that refresh the cached catalog
+            invalidate('perfumes')
+        return self.report(time.perf_counter() - started)
+
+    def import_chunk(self, chunk):
+        valid = []
+        for row_number, row in chunk:
+            self.rows += 1
+            data = self.validate(row_number, row)
+            if data is not None:
+                valid.append((row_number, data))
+
+        stored = {row_number: [self.store_image(name) for name in data['images']] for row_number, data in valid}
+        try:
+            perfumes, images = self.save_rows(valid, stored)
+        except DatabaseError:
+            # One bad row fails the whole bulk insert: the chunk is retried a row at a
+            # time, each in a savepoint, so that only the rows the database refuses fail
+            perfumes, images = [], []
+            with transaction.atomic():
+                for row_number, data in valid:
+                    try:
+                        row_perfumes, row_images = self.save_rows([(row_number, data)], stored)
+                    except DatabaseError as error:
+                        self.add_error(row_number, {'non_field_errors': [f'Database error: {error}']})
+                        for name in stored[row_number]:
+                            default_storage.delete(name)
+                        continue
+                    perfumes += row_perfumes
+                    images += row_images
+
+        schedule_derivatives(image.pk for image in images)
+        self.created += len(perfumes)
+        self.images += len(images)
+        if self.on_chunk:
+            self.on_chunk(self)
+
+    def save_rows(self, rows, stored):
+        # Creates the perfumes of the rows, with their categories and their already stored
+        # images, in one transaction. When it's rolled back the categories it created go
+        # with it, so they're forgotten here too.
+        categories = dict(self.categories)
+        perfumes, images = [], []
+        try:
+            with transaction.atomic():
+                category_ids = self.resolve_categories({data['category'] for _, data in rows if data.get('category')})
+                for row_number, data in rows:
+                    fields = {key: value for key, value in data.items() if key not in ('category', 'images')}
+                    perfume = Perfume(category_id=category_ids.get(data.get('category')), **fields)
+                    perfumes.append(perfume)
+                    images += [PerfumeImage(perfume=perfume, image=name) for name in stored[row_number]]
+
+                Perfume.objects.bulk_create(perfumes)
+                PerfumeImage.objects.bulk_create(images)
+                backend = get_search_backend()
+                if backend is not None:
+                    backend.index(perfumes)
+        except DatabaseError:
+            self.categories = categories
+            raise
+        return perfumes, images
+
+    def validate(self, row_number, row):
+        if '__error__' in row:
+            self.add_error(row_number, {'non_field_errors': [row['__error__']]})
+            return None
+
+        # Empty CSV cells mean "use the default"
+        row = {key: value for key, value in row.items() if value not in ('', None)}
+        if isinstance(row.get('images'), list):
+            row['images'] = ';'.join(row['images'])
+
+        serializer = PerfumeImportRowSerializer(data=row)
+        if not serializer.is_valid():
+            self.add_error(row_number, serializer.errors)
+            return None
+
+        data = dict(serializer.validated_data)
+        data['images'] = [name.strip() for name in data.get('images', '').split(';') if name.strip()]
+        missing = [name for name in data['images'] if name not in self.image_names]
+        if missing:
+            self.add_error(row_number, {'images': [f'Not found in the images zip: {", ".join(missing)}']})
+            return None
+        return data
+
+    def resolve_categories(self, values):
+        # Categories are matched on their slug, or created from the value. One query
+        # and one bulk_create per chunk at most, and only for values not seen before.
+        # bulk_create skips the signals, the cached category lists are invalidated here.
+        slugs = {value: slugify(value) for value in values if value not in self.categories}
+        if slugs:
+            existing = dict(Category.objects.filter(slug__in=set(slugs.values())).values_list('slug', 'category_id'))
+            missing = {}
+            for value, slug in slugs.items():
+                if slug not in existing and slug not in missing:
+                    missing[slug] = Category(title=value, slug=slug)
+            if missing:
+                Category.objects.bulk_create(missing.values())
+                invalidate('categories')
+            existing.update({slug: category.category_id for slug, category in missing.items()})
+            for value, slug in slugs.items():
+                self.categories[value] = existing[slug]
+        return {value: self.categories[value] for value in values}
+
+    def store_image(self, name):
+        content = ContentFile(self.images_zip.read(name))
+        return default_storage.save(f'img/store/{os.path.basename(name)}', content)
+
+    def add_error(self, row_number, errors):
+        self.failed += 1
+        if len(self.errors) < self.max_reported_errors:
+            self.errors.append({'row': row_number, 'errors': errors})
+
+    def report(self, seconds=0.0):
+        return {
+            'rows': self.rows,
+            'created': self.created,
+            'images': self.images,
+            'failed': self.failed,
+            'errors': self.errors,
+            'seconds': round(seconds, 3),
+            'rows_per_second': round(self.rows / seconds, 1) if seconds else None,
+        }
@@ -0,0 +1,126 @@
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+# Lists of placeholders (IN (%s, %s, ...)) vary with the number of
+# values, they're folded so the same query with another number of values is the same template
+IN_LIST = re.compile(r'\(\s*(?:%s|\?)(?:\s*,\s*(?:%s|\?))*\s*\)')
+WHITESPACE = re.compile(r'\s+')
+
+
+class RepeatedQueriesError(AssertionError):
+    # Raised instead of logged with SQL_INSTRUMENTATION_STRICT, so tests fail on an N+1
+    pass
+
+
+def query_template(sql):
+    return IN_LIST.sub('(...)', WHITESPACE.sub(' ', sql).strip())
+
+
+class QueryRecorder:
+    # Cursor wrapper (see connection.execute_wrapper) that times every query of the thread
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, time.perf_counter() - started))
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    @property
+    def duration(self):
+        return sum(duration for _, duration in self.queries)
+
+    def repeated(self, threshold):
+        # {template: times} of the SELECTs run at least threshold times, the mark of a
+        # relation fetched once per row instead of with select_related/prefetch_related
+        templates = Counter(query_template(sql) for sql, _ in self.queries if sql.lstrip()[:6].upper() == 'SELECT')
+        return {template: times for template, times in templates.items() if times >= threshold}
+
+
+def view_name(view_func, method):
+    # PerfumesViewSet.list, CartItemViewSet.bulk, paystack_webhook, ...
+    cls = getattr(view_func, 'cls', None)
+    if cls is None:
+        return getattr(view_func, '__name__', type(view_func).__name__)
+    # The router maps each method of a viewset route to its action
+    actions = getattr(view_func, 'actions', None)
+    if not actions:
+        return cls.__name__
+    return f"{cls.__name__}.{actions.get(method.lower(), method.lower())}"
+
+
+class SQLInstrumentationMiddleware:
+    # Counts and times the queries of each request when SQL_INSTRUMENTATION is on. Adds a
+    # Server-Timing header (shown by the browser devtools next to the request) and logs
+    # one line per request with the view and action, the query count, the SQL time and
+    # the query templates that ran SQL_REPEATED_QUERY_THRESHOLD times or more.
+    #
+    # Under ASGI the queries of async views run in sync_to_async's thread, out of reach of
+    # the wrappers, so async requests are passed through as they are. Being async capable
+    # keeps Django from running the whole stack, async views included, in a thread.
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.get_response(request)
+        if not getattr(settings, 'SQL_INSTRUMENTATION', False):
+            return self.get_response(request)
+
+        recorder = QueryRecorder()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+
+        view = getattr(request, 'sql_instrumentation_view', None) or request.path
+        repeated = recorder.repeated(getattr(settings, 'SQL_REPEATED_QUERY_THRESHOLD', 3))
+        if repeated and getattr(settings, 'SQL_INSTRUMENTATION_STRICT', False):
+            raise RepeatedQueriesError(f"{view} repeated queries:\n" + '\n'.join(
+                f"{times}x {template}" for template, times in repeated.items()
+            ))
+
+        timing = f'db;dur={recorder.duration * 1000:.2f};desc="{recorder.count} queries"'
+        if repeated:
+            timing += f', db-repeated;desc="{len(repeated)} repeated queries"'
+        response['Server-Timing'] = ', '.join(filter(None, [response.get('Server-Timing'), timing]))
+
+        logger.log(
+            logging.WARNING if repeated else logging.INFO,
+            "%s %s %s %s: %d queries in %.2fms%s",
+            view, request.method, request.path, response.status_code, recorder.count, recorder.duration * 1000,
+            ''.join(f"\n  repeated {times}x: {template}" for template, times in repeated.items()),
+            extra={
+                'view': view,
+                'method': request.method,
+                'path': request.path,
+                'status': response.status_code,
+                'queries': recorder.count,
+                'sql_ms': round(recorder.duration * 1000, 2),
+                'repeated_queries': repeated,
+            },
+        )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.sql_instrumentation_view = view_name(view_func, request.method)
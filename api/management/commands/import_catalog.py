@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+from api.importer import CatalogImporter, detect_format, read_rows
+
+
+class Command(BaseCommand):
+    help = "Bulk loads perfumes from a CSV or JSONL file, with their images from a zip"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="CSV or JSONL file, one perfume per row")
+        parser.add_argument('--images', help="Zip of the image files named in the rows' images column")
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help="Defaults to the file extension")
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        file_format = options['format'] or detect_format(options['path'])
+
+        def progress(importer):
+            self.stdout.write(f"{importer.rows} rows read, {importer.created} created, {importer.failed} failed")
+
+        images = open(options['images'], 'rb') if options['images'] else None
+        try:
+            with open(options['path'], 'rb') as file:
+                importer = CatalogImporter(images_zip=images, chunk_size=options['chunk_size'], on_chunk=progress)
+                report = importer.run(read_rows(file, file_format))
+        except OSError as error:
+            raise CommandError(error)
+        finally:
+            if images:
+                images.close()
+
+        for error in report['errors']:
+            self.stderr.write(f"Row {error['row']}: {error['errors']}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {report['created']} perfumes and {report['images']} images from {report['rows']} rows "
+            f"in {report['seconds']}s ({report['rows_per_second']} rows/s), {report['failed']} rows failed"
+        ))
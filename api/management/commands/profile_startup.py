@@ -0,0 +1,62 @@
+import os
+import re
+import subprocess
+import sys
+from collections import defaultdict
+from django.core.management.base import BaseCommand, CommandError
+
+# What a web worker imports before it can answer a request
+STARTUP = (
+    "import django; django.setup(); "
+    "from django.urls import get_resolver; get_resolver().url_patterns; "
+    "import scenthives.wsgi"
+)
+IMPORT_TIME = re.compile(r'^import time:\s+(?P<self>\d+) \|\s+(?P<cumulative>\d+) \|(?P<indent>\s*)(?P<module>\S+)$')
+
+
+class Command(BaseCommand):
+    help = "Reports the import time of each module at startup, and how long the warm-up takes"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=25, help="Modules listed")
+        parser.add_argument('--sort', choices=['self', 'cumulative'], default='cumulative')
+        parser.add_argument('--packages', action='store_true', help="Sum the import time per top-level package")
+        parser.add_argument('--no-warm-up', action='store_true', help="Skip timing scenthives.warmup")
+
+    def handle(self, *args, **options):
+        # A fresh interpreter, this one already imported most of it
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', STARTUP],
+            env={**os.environ, 'DJANGO_SETTINGS_MODULE': os.environ.get('DJANGO_SETTINGS_MODULE', 'scenthives.settings')},
+            capture_output=True, text=True,
+        )
+        if result.returncode:
+            raise CommandError(result.stderr.strip().splitlines()[-1])
+
+        modules = [match.groupdict() for line in result.stderr.splitlines() if (match := IMPORT_TIME.match(line))]
+        # Only the modules imported by nothing else count towards the total
+        total = sum(int(module['cumulative']) for module in modules if len(module['indent']) == 1)
+        self.stdout.write(f"{len(modules)} modules imported in {total / 1000:.0f}ms")
+
+        if options['packages']:
+            packages = defaultdict(int)
+            for module in modules:
+                packages[module['module'].split('.')[0]] += int(module['self'])
+            rows = sorted(packages.items(), key=lambda row: row[1], reverse=True)
+            self.stdout.write(f"\n{'self':>9}  package")
+        else:
+            key = options['sort']
+            rows = [(module['module'], int(module[key])) for module in sorted(modules, key=lambda module: int(module[key]), reverse=True)]
+            self.stdout.write(f"\n{key:>9}  module")
+        for name, microseconds in rows[:options['limit']]:
+            self.stdout.write(f"{microseconds / 1000:>7.1f}ms  {name}")
+
+        if not options['no_warm_up']:
+            from scenthives.warmup import STEPS
+            import time
+
+            self.stdout.write("\nwarm-up")
+            for name, step in STEPS.items():
+                started = time.perf_counter()
+                step()
+                self.stdout.write(f"{(time.perf_counter() - started) * 1000:>7.1f}ms  {name}")
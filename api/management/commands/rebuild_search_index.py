@@ -0,0 +1,18 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from api.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = "Re-indexes every perfume in the full-text search backend"
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        if backend is None:
+            raise CommandError("No full-text search backend is available for this database")
+
+        started = time.perf_counter()
+        backend.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt the search index with {type(backend).__name__} in {time.perf_counter() - started:.2f}s"
+        ))
@@ -0,0 +1,30 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from api.paystack_stub import PaystackStubServer
+
+
+class Command(BaseCommand):
+    help = "Runs a fake Paystack API locally, set PAYSTACK_BASE_URL to its address to use it"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--latency', type=float, default=0, help="Milliseconds added to every API call")
+        parser.add_argument('--secret-key', default=settings.PAYSTACK_SECRET_KEY or 'sk_test_stub')
+        parser.add_argument('--webhook-url', help="Where to post the charge.success events, e.g http://127.0.0.1:8000/api/paystack-webhook/")
+
+    def handle(self, *args, **options):
+        server = PaystackStubServer(
+            options['host'], options['port'],
+            secret_key=options['secret_key'],
+            latency=options['latency'] / 1000,
+            webhook_url=options['webhook_url'],
+            verbose=options['verbosity'] > 1,
+        )
+        self.stdout.write(f"Fake Paystack listening on {server.url} (secret key {server.secret_key})")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
@@ -0,0 +1,104 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import django
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.db.models import Max
+from api.cache import invalidate
+from api.search import get_search_backend
+from api.seeding import PHASES, reset_user_ids, seed_chunk
+from shop.ratings import rebuild_ratings
+
+
+def _init_worker():
+    # Forked workers inherit the configured Django, spawned ones have to set it up
+    django.setup()
+
+
+class Command(BaseCommand):
+    help = "Generates a large, deterministic synthetic dataset for load and scaling tests"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--categories', type=int, default=50)
+        parser.add_argument('--perfumes', type=int, default=100_000)
+        parser.add_argument('--images-per-perfume', type=int, default=2)
+        parser.add_argument('--users', type=int, default=10_000)
+        parser.add_argument('--reviews', type=int, default=500_000)
+        parser.add_argument('--carts', type=int, default=20_000)
+        parser.add_argument('--orders', type=int, default=50_000)
+        parser.add_argument('--seed', type=int, default=42, help="Same seed, same rows. Use another one to add more data to a seeded database")
+        parser.add_argument('--batch-size', type=int, default=5000, help="Rows per bulk_create")
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count(),
+            help="Processes writing in parallel (default: one per core). SQLite has a single writer, it always uses one",
+        )
+        parser.add_argument('--password', default='password', help="Password of every seeded user")
+
+    def handle(self, *args, **options):
+        if options['perfumes'] and not options['categories']:
+            raise CommandError("Perfumes need at least one category")
+        if (options['reviews'] or options['carts'] or options['orders']) and not options['perfumes']:
+            raise CommandError("Reviews, carts and orders need at least one perfume")
+        if options['orders'] and not options['users']:
+            raise CommandError("Orders need at least one user")
+
+        workers = 1 if connection.vendor == 'sqlite' else max(1, options['workers'])
+        # User ids are auto-incremented, the seeded ones are set explicitly after the existing ones
+        options['first_user_id'] = (User.objects.aggregate(last=Max('id'))['last'] or 0) + 1
+        # Hashing is slow on purpose, every user gets the same hash
+        options['password'] = make_password(options['password'])
+
+        self.stdout.write(f"Seeding with seed {options['seed']} on {workers} {'process' if workers == 1 else 'processes'}")
+        started = time.perf_counter()
+        total = 0
+        if workers == 1:
+            for phase in PHASES:
+                total += self.run_phase(phase, options, lambda tasks: (seed_chunk(*task) for task in tasks))
+        else:
+            # Each worker opens its own connections, they must not share the parent's
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+                def run_tasks(tasks):
+                    futures = [executor.submit(seed_chunk, *task) for task in tasks]
+                    return (future.result() for future in as_completed(futures))
+                for phase in PHASES:
+                    total += self.run_phase(phase, options, run_tasks)
+
+        if options['users']:
+            reset_user_ids()
+        if options['reviews']:
+            # bulk_create skips the signals that keep the perfumes' review counters up to date
+            self.stdout.write("Counting the reviews of the perfumes")
+            for _ in rebuild_ratings(options['batch_size']):
+                pass
+        if get_search_backend() is not None:
+            # Same for the search index
+            self.stdout.write("Rebuilding the search index")
+            get_search_backend().rebuild()
+        invalidate('perfumes', 'categories')
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f"Seeded {total} rows in {elapsed:.1f}s ({total / elapsed:.0f} rows/s)"))
+
+    def run_phase(self, phase, options, run_tasks):
+        # The tasks are tiny (table and index range), the rows are only built in the
+        # worker a batch at a time, so memory stays flat however much is seeded
+        tasks = [
+            (table, options['seed'], start, min(start + options['batch_size'], options[count_option]), options)
+            for table, (_, count_option) in phase.items()
+            for start in range(0, options[count_option], options['batch_size'])
+        ]
+        if not tasks:
+            return 0
+
+        started = time.perf_counter()
+        rows = 0
+        for done, written in enumerate(run_tasks(tasks), 1):
+            rows += written
+            if options['verbosity'] > 1 or done == len(tasks):
+                elapsed = time.perf_counter() - started
+                self.stdout.write(f"{', '.join(phase)}: {rows} rows ({rows / elapsed:.0f} rows/s), {done}/{len(tasks)} batches")
+        return rows
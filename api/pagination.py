@@ -0,0 +1,260 @@
+import base64
+import json
+from collections import OrderedDict
+from django.core.exceptions import ValidationError
+from django.core.paginator import InvalidPage
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.filters import OrderingFilter
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param, remove_query_param
+
+
+class KeysetPagination(BasePagination):
+    # Cursor pagination that seeks with a WHERE clause on the ordering columns instead
+    # of an OFFSET, so every page costs the same however deep it is. The primary key is
+    # always appended to the ordering, which makes the position unique even when the
+    # other columns tie. No COUNT(*) is run, clients just follow the next/previous links.
+    page_size = api_settings.PAGE_SIZE
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    # Used when the view has no OrderingFilter or the client didn't ask for an ordering.
+    # The ordering columns must not be nullable.
+    ordering = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        queryset = self.page_queryset(queryset, request, view)
+        return self.set_page(list(queryset))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        # The same pages through the async ORM (see api/async_views.py)
+        queryset = self.page_queryset(queryset, request, view)
+        return self.set_page([instance async for instance in queryset])
+
+    def page_queryset(self, queryset, request, view):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+
+        position, self.reverse = self.decode_cursor(request)
+        self.has_cursor = position is not None
+
+        ordering = self.reverse_ordering(self.ordering) if self.reverse else self.ordering
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            try:
+                queryset = queryset.filter(self.seek_filter(ordering, position))
+            except (TypeError, ValueError, ValidationError):
+                # A cursor edited by hand, its values don't fit the ordering's fields
+                raise NotFound(self.invalid_cursor_message)
+
+        # One extra row tells us whether there's another page in that direction
+        return queryset[:self.page_size + 1]
+
+    def set_page(self, results):
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+
+        if self.reverse:
+            results.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, self.has_cursor
+
+        self.page = results
+        return results
+
+    def get_ordering(self, request, queryset, view):
+        ordering = None
+        for backend in getattr(view, 'filter_backends', []):
+            if issubclass(backend, OrderingFilter):
+                ordering = backend().get_ordering(request, queryset, view)
+                break
+
+        ordering = list(ordering or self.ordering or queryset.model._meta.ordering)
+        pk_name = queryset.model._meta.pk.name
+        if not any(field.lstrip('-') in (pk_name, 'pk') for field in ordering):
+            # The primary key breaks the ties, in the same direction as the last column
+            # so that a single composite index can serve the whole ordering
+            descending = bool(ordering) and ordering[-1].startswith('-')
+            ordering.append(f"-{pk_name}" if descending else pk_name)
+        return ordering
+
+    def reverse_ordering(self, ordering):
+        return [field[1:] if field.startswith('-') else f"-{field}" for field in ordering]
+
+    def seek_filter(self, ordering, position):
+        # (a, b, c) > (x, y, z) written out as a > x OR (a = x AND b > y) OR ...
+        condition = Q()
+        equal = {}
+        for field, value in zip(ordering, position):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition |= Q(**equal, **{f"{name}__{lookup}": value})
+            equal[name] = value
+
+        # The redundant bound on the first column lets the database seek into the index
+        # instead of scanning it from the start and discarding rows until the position
+        first = ordering[0]
+        bound = 'lte' if first.startswith('-') else 'gte'
+        return Q(**{f"{first.lstrip('-')}__{bound}": position[0]}) & condition
+
+    def get_position(self, instance):
+        return [self.to_cursor_value(getattr(instance, field.lstrip('-'))) for field in self.ordering]
+
+    def to_cursor_value(self, value):
+        if isinstance(value, (int, float, str, bool)):
+            return value
+        if hasattr(value, 'isoformat'):
+            return value.isoformat()
+        return str(value)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+
+        try:
+            cursor = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')))
+            position, reverse = cursor['p'], bool(cursor['r'])
+        except (TypeError, ValueError, KeyError, UnicodeEncodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+        if not isinstance(position, list) or len(position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return position, reverse
+
+    def encode_cursor(self, position, reverse):
+        encoded = base64.urlsafe_b64encode(json.dumps({'p': position, 'r': int(reverse)}).encode('ascii'))
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded.decode('ascii'))
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.get_position(self.page[-1]), reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.get_position(self.page[0]), reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        return [{
+            'name': self.cursor_query_param,
+            'required': False,
+            'in': 'query',
+            'description': 'The pagination cursor value.',
+            'schema': {'type': 'string'},
+        }]
+
+
+class PerfumeKeysetPagination(KeysetPagination):
+    # Backed by the (price, id) index on Perfume
+    ordering = ('price', 'id')
+
+
+class OrderKeysetPagination(KeysetPagination):
+    # Backed by the (user, -created_at, -id) and (status, -created_at, -id) indexes on Order
+    ordering = ('-created_at', '-id')
+
+
+class ReviewKeysetPagination(KeysetPagination):
+    # A perfume's reviews newest first, backed by the (perfume, -date_created, -id) index
+    ordering = ('-date_created', '-id')
+
+
+class AsyncPageNumberPagination(PageNumberPagination):
+    # PageNumberPagination (the DEFAULT_PAGINATION_CLASS) that can also paginate through
+    # the async ORM, for the async views of api/async_views.py. The sync pages are DRF's.
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+
+        paginator = self.django_paginator_class(queryset, page_size)
+        # Counted here, the paginator would run its COUNT(*) synchronously
+        paginator.count = await queryset.acount()
+        page_number = self.get_page_number(request, paginator)
+        try:
+            self.page = paginator.page(page_number)
+        except InvalidPage as exc:
+            msg = self.invalid_page_message.format(page_number=page_number, message=str(exc))
+            raise NotFound(msg)
+
+        self.page.object_list = [instance async for instance in self.page.object_list.aiterator(chunk_size=page_size)]
+        self.request = request
+        return list(self.page)
+
+
+class PerfumePagination(AsyncPageNumberPagination):
+    # Page numbers stay the default so existing clients keep working. Clients that
+    # send ?pagination=cursor (or follow a cursor link) get keyset pages instead,
+    # which skip the COUNT(*) and cost the same on page 10,000 as on page 1.
+    mode_query_param = 'pagination'
+    keyset_class = PerfumeKeysetPagination
+
+    keyset = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.wants_cursor(request):
+            self.keyset = self.keyset_class()
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def wants_cursor(self, request):
+        return (
+            request.query_params.get(self.mode_query_param) == 'cursor'
+            or self.keyset_class.cursor_query_param in request.query_params
+        )
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        if self.wants_cursor(request):
+            self.keyset = self.keyset_class()
+            return await self.keyset.apaginate_queryset(queryset, request, view)
+        return await super().apaginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+    def get_schema_operation_parameters(self, view):
+        return super().get_schema_operation_parameters(view) + [
+            {
+                'name': self.mode_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Set to "cursor" for cursor pages without a total count.',
+                'schema': {'type': 'string', 'enum': ['page', 'cursor']},
+            },
+        ] + self.keyset_class().get_schema_operation_parameters(view)
+
+
+class ReviewPagination(PerfumePagination):
+    # The same opt-in cursor pages for the reviews of a perfume. A bestseller's reviews
+    # run into the tens of thousands, its review_count says how many without a COUNT(*).
+    keyset_class = ReviewKeysetPagination
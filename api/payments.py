@@ -0,0 +1,172 @@
+import hashlib
+import hmac
+import threading
+import time
+from functools import lru_cache
+from urllib.parse import quote
+from django.conf import settings
+
+
+class PaystackError(Exception):
+    # Paystack answered, but turned the request down
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class PaystackUnavailable(PaystackError):
+    # Paystack couldn't be reached, timed out, failed or the circuit breaker is open
+    pass
+
+
+class CircuitBreaker:
+    # Stops calling a failing service for a while instead of tying up a worker on every
+    # request. Opens after `threshold` failures in a row, lets one trial call through
+    # once `reset_timeout` seconds have passed and closes again when that call works.
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half-open'
+
+    def __init__(self, threshold=5, reset_timeout=30, clock=time.monotonic):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return self.CLOSED
+        if self.clock() - self.opened_at >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def allow(self):
+        with self._lock:
+            state = self.state
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self.trial_running:
+                self.trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.trial_running or self.failures >= self.threshold:
+                self.opened_at = self.clock()
+            self.trial_running = False
+
+
+class PaystackClient:
+    # One pooled session shared by every request of the process, so the TCP and TLS
+    # handshakes are paid once per connection instead of once per call. Every call is
+    # bounded by the connect/read timeouts, retried a few times with backoff when that's
+    # safe, and goes through the circuit breaker.
+    #
+    # Only connection failures are retried for POSTs (nothing reached Paystack yet), GETs
+    # are also retried on 429/5xx answers. Read timeouts are never retried, a slow
+    # Paystack doesn't get faster by asking again.
+    retry_statuses = (429, 500, 502, 503, 504)
+
+    def __init__(self, secret_key, base_url='https://api.paystack.co', connect_timeout=3.05, read_timeout=10,
+                 max_retries=2, backoff_factor=0.2, pool_size=10, breaker=None):
+        self.secret_key = secret_key
+        self.base_url = base_url.rstrip('/')
+        self.timeout = (connect_timeout, read_timeout)
+        self.breaker = breaker or CircuitBreaker()
+
+        # requests is only imported by the workers that talk to Paystack, not at startup
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+
+        retry = Retry(
+            total=max_retries,
+            read=0,
+            backoff_factor=backoff_factor,
+            backoff_max=2,
+            status_forcelist=self.retry_statuses,
+            allowed_methods=frozenset(['GET']),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update({
+            'Authorization': f'Bearer {secret_key}',
+            'Content-Type': 'application/json',
+        })
+
+    def request(self, method, path, **kwargs):
+        # Returns the `data` of Paystack's answer
+        if not self.breaker.allow():
+            raise PaystackUnavailable('Paystack is unavailable, try again shortly')
+
+        import requests
+
+        try:
+            response = self.session.request(method, f'{self.base_url}{path}', timeout=self.timeout, **kwargs)
+        except requests.RequestException as error:
+            self.breaker.record_failure()
+            raise PaystackUnavailable(f'Could not reach Paystack: {error}') from error
+
+        if response.status_code in self.retry_statuses:
+            self.breaker.record_failure()
+            raise PaystackUnavailable(f'Paystack answered {response.status_code}', response.status_code)
+        # Anything else means Paystack is up, even when it turns the request down
+        self.breaker.record_success()
+
+        try:
+            payload = response.json()
+        except ValueError:
+            raise PaystackError('Paystack sent an invalid response', response.status_code)
+        if response.status_code != 200 or not payload.get('status'):
+            raise PaystackError(payload.get('message') or 'Paystack turned the request down', response.status_code)
+        return payload.get('data') or {}
+
+    def initialize_transaction(self, email, amount, reference, callback_url=None, metadata=None):
+        # `amount` is in kobo
+        data = {'email': email, 'amount': amount, 'reference': reference}
+        if callback_url:
+            data['callback_url'] = callback_url
+        if metadata:
+            data['metadata'] = metadata
+        return self.request('POST', '/transaction/initialize', json=data)
+
+    def verify_transaction(self, reference):
+        return self.request('GET', f'/transaction/verify/{quote(reference, safe="")}')
+
+    def close(self):
+        self.session.close()
+
+
+def verify_signature(body, signature, secret_key):
+    # Paystack signs the raw body of its webhooks with an HMAC-SHA512 of the secret key
+    if not secret_key or not signature:
+        return False
+    expected = hmac.new(secret_key.encode(), body, hashlib.sha512).hexdigest()
+    return hmac.compare_digest(expected, signature)
+
+
+@lru_cache(maxsize=None)
+def get_paystack_client():
+    # The client of this process, built from the PAYSTACK_* settings
+    return PaystackClient(
+        secret_key=settings.PAYSTACK_SECRET_KEY,
+        base_url=settings.PAYSTACK_BASE_URL,
+        connect_timeout=settings.PAYSTACK_CONNECT_TIMEOUT,
+        read_timeout=settings.PAYSTACK_READ_TIMEOUT,
+        max_retries=settings.PAYSTACK_MAX_RETRIES,
+        pool_size=settings.PAYSTACK_POOL_SIZE,
+        breaker=CircuitBreaker(settings.PAYSTACK_BREAKER_THRESHOLD, settings.PAYSTACK_BREAKER_RESET),
+    )
@@ -0,0 +1,228 @@
+import hashlib
+import hmac
+import json
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlencode, urlsplit
+from urllib.request import Request, urlopen
+
+
+class PaystackStubHandler(BaseHTTPRequestHandler):
+    # Answers the parts of the Paystack API the shop uses, the same way Paystack does
+    protocol_version = 'HTTP/1.1'  # Keep-alive, so pooled clients reuse their connections
+    # Headers and body are separate writes, without this a kept-alive connection waits on
+    # the client's delayed ACK before sending the body
+    disable_nagle_algorithm = True
+
+    verify_path = re.compile(r'^/transaction/verify/(?P<reference>[^/]+)$')
+    checkout_path = re.compile(r'^/checkout/(?P<access_code>[^/]+)$')
+
+    def setup(self):
+        super().setup()
+        self.server.count('connections')
+
+    def do_POST(self):
+        path = urlsplit(self.path).path
+        if path != '/transaction/initialize':
+            return self.send_json(404, {'status': False, 'message': 'Not found'})
+        if not self.start_api_call():
+            return
+
+        try:
+            data = json.loads(self.rfile.read(int(self.headers.get('Content-Length') or 0)) or b'{}')
+        except ValueError:
+            return self.send_json(400, {'status': False, 'message': 'Invalid JSON'})
+        if not data.get('email') or not str(data.get('amount', '')).isdigit():
+            return self.send_json(400, {'status': False, 'message': 'Invalid email or amount'})
+
+        transaction = self.server.create_transaction(data)
+        if transaction is None:
+            return self.send_json(400, {'status': False, 'message': 'Duplicate Transaction Reference'})
+        self.send_json(200, {
+            'status': True,
+            'message': 'Authorization URL created',
+            'data': {
+                'authorization_url': f"{self.server.url}/checkout/{transaction['access_code']}",
+                'access_code': transaction['access_code'],
+                'reference': transaction['reference'],
+            },
+        })
+
+    def do_GET(self):
+        path = urlsplit(self.path).path
+        match = self.checkout_path.match(path)
+        if match:
+            # Stands in for the customer paying on Paystack's checkout page
+            transaction = self.server.pay(match['access_code'])
+            if transaction is None:
+                return self.send_json(404, {'status': False, 'message': 'Not found'})
+            query = urlencode({'trxref': transaction['reference'], 'reference': transaction['reference']})
+            return self.send_empty(302, {'Location': f"{transaction['callback_url']}?{query}"})
+
+        if path == '/_stub/counters':
+            return self.send_json(200, self.server.counters)
+
+        match = self.verify_path.match(path)
+        if not match:
+            return self.send_json(404, {'status': False, 'message': 'Not found'})
+        if not self.start_api_call():
+            return
+
+        transaction = self.server.transactions.get(match['reference'])
+        if transaction is None:
+            return self.send_json(400, {'status': False, 'message': 'Transaction reference not found'})
+        self.send_json(200, {'status': True, 'message': 'Verification successful', 'data': self.server.describe(transaction)})
+
+    def start_api_call(self):
+        # Checks the secret key and plays the latency and failures the server was told to
+        self.server.count('requests')
+        if self.headers.get('Authorization') != f'Bearer {self.server.secret_key}':
+            self.send_json(401, {'status': False, 'message': 'Invalid key'})
+            return False
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        status = self.server.next_failure()
+        if status:
+            self.send_json(status, {'status': False, 'message': 'Stub failure'})
+            return False
+        return True
+
+    def send_json(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_empty(self, status, headers):
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class PaystackStubServer(ThreadingHTTPServer):
+    # A fake Paystack to run the payment flow, its tests and benchmarks offline:
+    #
+    #   with PaystackStubServer(latency=0.05) as stub:
+    #       client = PaystackClient('sk_test_stub', base_url=stub.url)
+    #
+    # `latency` delays every API call, `fail(503, 503)` makes the next calls fail with
+    # those statuses. Visiting a transaction's authorization_url marks it paid and
+    # redirects to its callback_url like the real checkout page, and posts a signed
+    # charge.success event to `webhook_url` when there is one. GET /_stub/counters
+    # returns how many connections and API calls were served.
+    daemon_threads = True
+
+    def __init__(self, host='127.0.0.1', port=0, secret_key='sk_test_stub', latency=0.0, webhook_url=None, verbose=False):
+        super().__init__((host, port), PaystackStubHandler)
+        self.secret_key = secret_key
+        self.webhook_url = webhook_url
+        self.latency = latency
+        self.verbose = verbose
+        self.transactions = {}
+        self.counters = {'connections': 0, 'requests': 0}
+        self.failures = []
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def count(self, counter):
+        with self._lock:
+            self.counters[counter] += 1
+
+    def fail(self, *statuses):
+        with self._lock:
+            self.failures.extend(statuses)
+
+    def next_failure(self):
+        with self._lock:
+            return self.failures.pop(0) if self.failures else None
+
+    def create_transaction(self, data):
+        reference = data.get('reference') or uuid.uuid4().hex
+        with self._lock:
+            if reference in self.transactions:
+                return None
+            transaction = self.transactions[reference] = {
+                'id': len(self.transactions) + 1,
+                'reference': reference,
+                'access_code': uuid.uuid4().hex[:15],
+                'amount': int(data['amount']),
+                'email': data['email'],
+                'callback_url': data.get('callback_url', ''),
+                'metadata': data.get('metadata') or {},
+                'status': 'abandoned',
+                'paid_at': None,
+            }
+        return transaction
+
+    def pay(self, access_code):
+        with self._lock:
+            for transaction in self.transactions.values():
+                if transaction['access_code'] == access_code:
+                    transaction['status'] = 'success'
+                    transaction['paid_at'] = time.strftime('%Y-%m-%dT%H:%M:%S.000Z', time.gmtime())
+                    break
+            else:
+                return None
+
+        if self.webhook_url:
+            # Paystack sends its webhooks on its own schedule, not within the redirect
+            threading.Thread(target=self.send_webhook, args=('charge.success', transaction), daemon=True).start()
+        return transaction
+
+    def send_webhook(self, event, transaction):
+        body = json.dumps({'event': event, 'data': self.describe(transaction)}).encode()
+        signature = hmac.new(self.secret_key.encode(), body, hashlib.sha512).hexdigest()
+        request = Request(self.webhook_url, data=body, method='POST', headers={
+            'Content-Type': 'application/json',
+            'X-Paystack-Signature': signature,
+        })
+        try:
+            with urlopen(request, timeout=10):
+                pass
+        except OSError as error:
+            if self.verbose:
+                print(f'Webhook to {self.webhook_url} failed: {error}')
+
+    def describe(self, transaction):
+        return {
+            'id': transaction['id'],
+            'status': transaction['status'],
+            'reference': transaction['reference'],
+            'amount': transaction['amount'],
+            'currency': 'NGN',
+            'paid_at': transaction['paid_at'],
+            'metadata': transaction['metadata'],
+            'customer': {'email': transaction['email']},
+        }
+
+    def start(self):
+        # Serves from a background thread, for tests and benchmarks
+        self._thread = threading.Thread(target=self.serve_forever, name='paystack-stub', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
@@ -0,0 +1,35 @@
+import threading
+from django.utils import translation
+from drf_spectacular.views import SpectacularAPIView
+from rest_framework.response import Response
+
+
+class CachedSpectacularAPIView(SpectacularAPIView):
+    # The OpenAPI schema only changes with the code, so it's generated once per process
+    # and language instead of on every request. scenthives.warmup builds it in the gunicorn
+    # master, the forked workers then share it.
+    _schemas = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def get_cached_schema(cls, version=None):
+        key = (version, translation.get_language())
+        schema = cls._schemas.get(key)
+        if schema is None:
+            with cls._lock:
+                schema = cls._schemas.get(key)
+                if schema is None:
+                    generator = cls.generator_class(urlconf=cls.urlconf, api_version=version, patterns=cls.patterns)
+                    schema = cls._schemas[key] = generator.get_schema(request=None, public=True)
+        return schema
+
+    def _get_schema_response(self, request):
+        if not self.serve_public or self.custom_settings:
+            # What's in the schema depends on who asks
+            return super()._get_schema_response(request)
+
+        version = self.api_version or request.version or self._get_version_parameter(request)
+        return Response(
+            data=self.get_cached_schema(version),
+            headers={"Content-Disposition": f'inline; filename="{self._get_filename(request, version)}"'}
+        )
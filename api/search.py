@@ -0,0 +1,155 @@
+import re
+from functools import lru_cache
+from django.conf import settings
+from django.db import connection
+from django.db.models import BooleanField, F, FloatField, Value
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+from rest_framework.filters import SearchFilter
+from shop.models import Perfume
+
+
+class BaseSearchBackend:
+    # A search backend keeps a full-text index of the perfume names and descriptions and
+    # turns a search string into a filtered queryset ranked by relevance. The ranking is
+    # exposed as a `search_rank` column so it combines with any other filter.
+
+    def is_available(self):
+        return True
+
+    def search(self, queryset, query):
+        raise NotImplementedError
+
+    def index(self, perfumes):
+        # Called after perfumes are saved
+        pass
+
+    def remove(self, perfume_ids):
+        # Called after perfumes are deleted
+        pass
+
+    def rebuild(self):
+        # Re-index the whole catalog, e.g after a bulk_create that skipped the signals
+        pass
+
+
+class SQLiteSearchBackend(BaseSearchBackend):
+    # Uses an FTS5 virtual table next to shop_perfume (created by the shop migrations).
+    # FTS5 needs an integer rowid and perfumes have UUID keys, so the rowid is derived
+    # from the top 63 bits of the UUID, which makes updates and deletes rowid lookups
+    # instead of scans of the index.
+    table = f'{Perfume._meta.db_table}_fts'
+    # bm25 weights of the (perfume_id, name, description) columns
+    weights = (0.0, 10.0, 1.0)
+    chunk_size = 2000
+
+    def is_available(self):
+        with connection.cursor() as cursor:
+            return self.table in connection.introspection.table_names(cursor)
+
+    def search(self, queryset, query):
+        terms = re.findall(r'\w+', query)
+        if not terms:
+            return queryset
+
+        # Every word must match, as a prefix so that "lav" finds "lavender"
+        match = ' '.join('"%s"*' % term for term in terms)
+        weights = ', '.join(str(weight) for weight in self.weights)
+
+        # An inner join on the FTS5 table (perfume.search_index), driven by the MATCH. A
+        # correlated subquery per perfume would run the MATCH again for every row.
+        return queryset.filter(
+            search_index__document=match,
+            # The ranking function of the rank column, for this query only
+            search_index__rank=Value(f'bm25({weights})'),
+        ).annotate(search_rank=F('search_index__rank')).order_by('search_rank', 'pk')
+
+    def index(self, perfumes):
+        rows = [
+            (self.rowid(perfume.pk), self.db_id(perfume.pk), perfume.name, perfume.description or '')
+            for perfume in perfumes
+        ]
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'INSERT OR REPLACE INTO {self.table} (rowid, perfume_id, name, description) VALUES (%s, %s, %s, %s)',
+                rows,
+            )
+
+    def remove(self, perfume_ids):
+        with connection.cursor() as cursor:
+            cursor.executemany(f'DELETE FROM {self.table} WHERE rowid = %s', [(self.rowid(pk),) for pk in perfume_ids])
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table}')
+
+        perfumes = Perfume.objects.only('id', 'name', 'description').order_by().iterator(chunk_size=self.chunk_size)
+        batch = []
+        for perfume in perfumes:
+            batch.append(perfume)
+            if len(batch) == self.chunk_size:
+                self.index(batch)
+                batch = []
+        if batch:
+            self.index(batch)
+
+    def rowid(self, pk):
+        return pk.int >> 65
+
+    def db_id(self, pk):
+        return Perfume._meta.pk.get_db_prep_value(pk, connection)
+
+
+class PostgresSearchBackend(BaseSearchBackend):
+    # Uses an expression GIN index on the tsvector below (created by the shop migrations).
+    # Postgres maintains that index itself, so there is nothing to do on save or delete.
+    # The expression has to stay identical to the indexed one for the index to be used.
+    config = 'english'
+    vector = (
+        "to_tsvector('english', coalesce({table}.name, '') || ' ' || coalesce({table}.description, ''))"
+    )
+
+    def search(self, queryset, query):
+        if not query.strip():
+            return queryset
+
+        vector = self.vector.format(table=queryset.model._meta.db_table)
+        tsquery = f"websearch_to_tsquery('{self.config}', %s)"
+        return queryset.filter(
+            RawSQL(f'{vector} @@ {tsquery}', [query], output_field=BooleanField())
+        ).annotate(
+            search_rank=RawSQL(f'ts_rank({vector}, {tsquery})', [query], output_field=FloatField())
+        ).order_by('-search_rank', 'pk')
+
+
+BACKENDS = {
+    'sqlite': 'api.search.SQLiteSearchBackend',
+    'postgresql': 'api.search.PostgresSearchBackend',
+}
+
+
+@lru_cache(maxsize=None)
+def get_search_backend():
+    # PERFUME_SEARCH_BACKEND can point at any BaseSearchBackend subclass, by default the
+    # backend is picked from the database vendor. None means there's no full-text index
+    # and the search falls back to DRF's icontains lookups.
+    path = getattr(settings, 'PERFUME_SEARCH_BACKEND', None) or BACKENDS.get(connection.vendor)
+    if not path:
+        return None
+
+    backend = import_string(path)()
+    return backend if backend.is_available() else None
+
+
+class FullTextSearchFilter(SearchFilter):
+    # Drop-in replacement for SearchFilter that goes through the full-text index
+
+    def filter_queryset(self, request, queryset, view):
+        terms = self.get_search_terms(request)
+        if not terms:
+            return queryset
+
+        backend = get_search_backend()
+        if backend is None:
+            return super().filter_queryset(request, queryset, view)
+        return backend.search(queryset, ' '.join(terms))
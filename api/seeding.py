@@ -0,0 +1,170 @@
+import random
+import uuid
+from decimal import Decimal
+from django.contrib.auth.models import User
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from order.models import Order, OrderItem
+from shop.models import Cart, Cartitems, Category, Perfume, PerfumeImage, Review
+
+# Synthetic data for load and scaling tests (python manage.py seed_scale). Every row is
+# a pure function of (seed, table, index): the ids are uuid5 of it and each chunk draws
+# from its own Random, so a run gives the same rows whatever the number of processes and
+# rows can point at other rows (a review at its perfume) without loading them.
+NAMESPACE = uuid.UUID('6f1c3c1e-2b0f-4a52-9d7e-5f1b1f4c0a11')
+
+NOTES = (
+    "oud amber musk vanilla rose jasmine citrus bergamot cedar sandalwood leather tobacco "
+    "vetiver patchouli iris neroli lavender saffron incense fig pear peach coconut tonka"
+).split()
+ADJECTIVES = "royal noir velvet golden midnight wild secret pure smoky crystal".split()
+RATINGS, RATING_WEIGHTS = [None, 1, 2, 3, 4, 5], [10, 5, 5, 15, 30, 35]
+STATUSES = [Order.DELIVERED] * 70 + [Order.SHIPPED] * 10 + [Order.PROCESSING] * 8 + [Order.PENDING] * 8 + [Order.CANCELLED] * 4
+
+
+def row_id(seed, table, index):
+    return uuid.uuid5(NAMESPACE, f'{seed}:{table}:{index}')
+
+
+def popular(rng, count, skew=3.0):
+    # An index in [0, count) where the low ones come up far more often: with the default
+    # skew the top 1% of the perfumes get a fifth of the reviews, carts and orders
+    return min(count - 1, int(count * rng.random() ** skew))
+
+
+def perfume_price(seed, index):
+    # Needed by the order items too, so it's drawn from the perfume's own Random
+    return round(random.Random(f'{seed}:price:{index}').lognormvariate(4.5, 0.6), 2)
+
+
+def seed_categories(seed, start, stop, options):
+    Category.objects.bulk_create([
+        Category(category_id=row_id(seed, 'category', i), title=f"Category {i}", slug=f"category-{i}", gender='MFB'[i % 3])
+        for i in range(start, stop)
+    ])
+    return stop - start
+
+
+def seed_perfumes(seed, start, stop, options):
+    rng = random.Random(f'{seed}:perfume:{start}')
+    perfumes, images = [], []
+    for i in range(start, stop):
+        perfume_id = row_id(seed, 'perfume', i)
+        notes = rng.sample(NOTES, 3)
+        perfumes.append(Perfume(
+            id=perfume_id,
+            name=f"{rng.choice(ADJECTIVES).title()} {notes[0].title()} {i}",
+            description=" ".join(notes + rng.choices(NOTES, k=rng.randint(10, 60))),
+            price=perfume_price(seed, i),
+            inventory=rng.randint(0, 500),
+            category_id=row_id(seed, 'category', popular(rng, options['categories'], skew=1.5)),
+            top_deal=rng.random() < 0.02,
+            flash_sales=rng.random() < 0.01,
+            discount=rng.random() < 0.05,
+        ))
+        images += [
+            PerfumeImage(perfume_id=perfume_id, image=f"img/store/seed/{perfume_id}_{n}.jpg")
+            for n in range(options['images_per_perfume'])
+        ]
+    with transaction.atomic():
+        Perfume.objects.bulk_create(perfumes)
+        PerfumeImage.objects.bulk_create(images)
+    return len(perfumes) + len(images)
+
+
+def seed_users(seed, start, stop, options):
+    User.objects.bulk_create([
+        User(id=options['first_user_id'] + i, username=f"seed{seed}-{i}", email=f"seed{seed}-{i}@example.com", password=options['password'])
+        for i in range(start, stop)
+    ])
+    return stop - start
+
+
+def reset_user_ids():
+    # The seeded users get explicit ids, which don't move the id sequence of auth_user on
+    # Postgres: without this the next signup would be given one of them. SQLite goes on
+    # from the largest id by itself.
+    statements = connection.ops.sequence_reset_sql(no_style(), [User])
+    with connection.cursor() as cursor:
+        for sql in statements:
+            cursor.execute(sql)
+
+
+def seed_reviews(seed, start, stop, options):
+    rng = random.Random(f'{seed}:review:{start}')
+    Review.objects.bulk_create([
+        Review(
+            perfume_id=row_id(seed, 'perfume', popular(rng, options['perfumes'])),
+            customer_name=f"Customer {rng.randrange(options['users'] or 1)}",
+            description=" ".join(rng.choices(NOTES, k=rng.randint(3, 40))),
+            rating=rng.choices(RATINGS, RATING_WEIGHTS)[0],
+        )
+        for _ in range(start, stop)
+    ])
+    return stop - start
+
+
+def distinct_perfumes(rng, options, lines):
+    return {popular(rng, options['perfumes']) for _ in range(lines)}
+
+
+def seed_carts(seed, start, stop, options):
+    rng = random.Random(f'{seed}:cart:{start}')
+    carts, items = [], []
+    for i in range(start, stop):
+        cart_id = row_id(seed, 'cart', i)
+        carts.append(Cart(id=cart_id))
+        items += [
+            Cartitems(cart_id=cart_id, perfume_id=row_id(seed, 'perfume', index), quantity=rng.randint(1, 3))
+            for index in distinct_perfumes(rng, options, rng.randint(1, 5))
+        ]
+    with transaction.atomic():
+        Cart.objects.bulk_create(carts)
+        Cartitems.objects.bulk_create(items)
+    return len(carts) + len(items)
+
+
+def seed_orders(seed, start, stop, options):
+    rng = random.Random(f'{seed}:order:{start}')
+    orders, items = [], []
+    for i in range(start, stop):
+        order_id = row_id(seed, 'order', i)
+        lines = [
+            OrderItem(order_id=order_id, perfume_id=row_id(seed, 'perfume', index), price=Decimal(str(perfume_price(seed, index))), quantity=rng.randint(1, 3))
+            for index in distinct_perfumes(rng, options, rng.randint(1, 4))
+        ]
+        status = rng.choice(STATUSES)
+        orders.append(Order(
+            id=order_id,
+            user_id=options['first_user_id'] + rng.randrange(options['users']),
+            first_name="Seed", last_name=f"Customer {i}", email=f"order{i}@example.com",
+            country="Nigeria", city="Lagos", state="Lagos", additional_info="", address=f"{i} Seed Street", zipcode="100001",
+            order_number=f"SEED-{seed}-{i}",
+            reference=row_id(seed, 'reference', i).hex,
+            total_amount=sum(line.price * line.quantity for line in lines),
+            status=status,
+            is_completed=status != Order.PENDING,
+            is_cancelled=status == Order.CANCELLED,
+        ))
+        items += lines
+    with transaction.atomic():
+        Order.objects.bulk_create(orders)
+        OrderItem.objects.bulk_create(items)
+    return len(orders) + len(items)
+
+
+# Table: (function, count option). The phases run one after the other, the tables of a
+# phase only point at the tables of the earlier phases.
+PHASES = [
+    {'categories': (seed_categories, 'categories')},
+    {'perfumes': (seed_perfumes, 'perfumes'), 'users': (seed_users, 'users')},
+    {'reviews': (seed_reviews, 'reviews'), 'carts': (seed_carts, 'carts'), 'orders': (seed_orders, 'orders')},
+]
+
+
+def seed_chunk(table, seed, start, stop, options):
+    # What a worker runs: one batch of rows of one table, returns the rows written
+    for phase in PHASES:
+        if table in phase:
+            return phase[table][0](seed, start, stop, options)
+    raise ValueError(table)
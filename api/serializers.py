@@ -1,9 +1,17 @@
+from collections import defaultdict
 from django.contrib.auth.models import User
 from django.db import transaction
+from django.db.models import F, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
 from rest_framework import serializers
+from django.core.files.storage import default_storage
+from shop.images import DERIVATIVE_FORMATS, schedule_derivatives
 from shop.models import Perfume, PerfumeImage, Category, Review, Cart, Cartitems
 from order.models import Order, OrderItem
 from userprofile.models import UserProfile
+from .cache import invalidate
+from .cart_store import CartCheckoutInProgress, CartNotFound, PerfumeNotFound, get_cart_store
 
 class UserProfileSerializer(serializers.ModelSerializer):
     class Meta:
@@ -29,9 +37,27 @@ class CategorySerializer(serializers.ModelSerializer):
 
 
 class PerfumeImageSerializer(serializers.ModelSerializer):
+        srcset = serializers.SerializerMethodField()
+
         class Meta:
             model = PerfumeImage
-            fields = ['id', 'perfume', 'image']
+            fields = ['id', 'perfume', 'image', 'srcset']
+
+        def get_srcset(self, perfume_image: PerfumeImage):
+            # {'webp': 'url 150w, url 400w, ...', 'jpeg': ...}, empty until the resized
+            # copies have been generated in the background
+            request = self.context.get('request')
+            srcset = {}
+            for extension in DERIVATIVE_FORMATS:
+                candidates = []
+                for entry in perfume_image.derivatives.values():
+                    url = default_storage.url(entry[extension])
+                    if request is not None:
+                        url = request.build_absolute_uri(url)
+                    candidates.append(f"{url} {entry['width']}w")
+                if candidates:
+                    srcset[extension] = ', '.join(candidates)
+            return srcset
 
 
 class PerfumeSerializer(serializers.ModelSerializer):
@@ -44,7 +70,7 @@ class PerfumeSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Perfume # The images, category uploaded_images field was removed in the fields below since it was commented above
-        fields = ['id', 'name', 'description', 'price', 'inventory', 'images', 'uploaded_images']
+        fields = ['id', 'name', 'description', 'price', 'inventory', 'review_count', 'rating_avg', 'images', 'uploaded_images']
     
     # Serializing the category field to have more context 
     # category = CategorySerializer()
@@ -58,8 +84,9 @@ class PerfumeSerializer(serializers.ModelSerializer):
         uploaded_images = validated_data.pop("uploaded_images") # Removes the uploaded images from the list of data
         perfume = Perfume.objects.create(**validated_data) #unpacks the validated data
 
-        for image in uploaded_images:
-            new_perfume_image = PerfumeImage.objects.create(perfume=perfume, image=image)
+        new_images = [PerfumeImage.objects.create(perfume=perfume, image=image) for image in uploaded_images]
+        # The resized copies are made in the background, not while the client waits
+        schedule_derivatives(perfume_image.pk for perfume_image in new_images)
 
         return perfume
 
@@ -74,18 +101,42 @@ class PerfumeSerializer(serializers.ModelSerializer):
 
         if uploaded_images:
             instance.images.all().delete()
-            for image in uploaded_images:
-                PerfumeImage.objects.create(perfume=instance, image=image)
+            new_images = [PerfumeImage.objects.create(perfume=instance, image=image) for image in uploaded_images]
+            schedule_derivatives(perfume_image.pk for perfume_image in new_images)
 
         return instance
 
 
+class PerfumeImportRowSerializer(serializers.Serializer):
+    # One row of a bulk catalog import (see api/importer.py)
+    name = serializers.CharField(max_length=200)
+    description = serializers.CharField(required=False, allow_blank=True)
+    price = serializers.FloatField(required=False, min_value=0)
+    inventory = serializers.IntegerField(required=False, min_value=0)
+    slug = serializers.SlugField(required=False)
+    category = serializers.CharField(required=False, max_length=200)  # Slug or title, created when missing
+    discount = serializers.BooleanField(required=False)
+    top_deal = serializers.BooleanField(required=False)
+    flash_sales = serializers.BooleanField(required=False)
+    images = serializers.CharField(required=False)  # File names in the images zip, separated by ;
+
+
 class SimplePerfumeSerializer(serializers.ModelSerializer):
     class Meta:
         model = Perfume
         fields = ['id','name', 'price']
 
 
+def line_total_expression(prefix=''):
+    # quantity * price of a cart line, computed by the database
+    return F(f'{prefix}quantity') * F(f'{prefix}perfume__price')
+
+
+def cart_total_expression(prefix=''):
+    # Sum of all the line totals of a cart, 0 for an empty cart
+    return Coalesce(Sum(line_total_expression(prefix)), Value(0.0))
+
+
 class CartItemSerializer(serializers.ModelSerializer):
     perfume = SimplePerfumeSerializer(many=False)
     sub_total = serializers.SerializerMethodField(method_name="total")
@@ -95,6 +146,9 @@ class CartItemSerializer(serializers.ModelSerializer):
             fields = ['id', 'perfume', 'quantity', 'sub_total']
 
     def total(self,cartitem:Cartitems):
+         # The viewsets annotate sub_total in SQL, this is only a fallback for plain instances
+         if hasattr(cartitem, 'sub_total'):
+              return cartitem.sub_total
          return cartitem.quantity * cartitem.perfume.price
 
 
@@ -104,33 +158,44 @@ class AddCartItemSerializer(serializers.ModelSerializer):
           model = Cartitems
           fields = ['id', 'perfume_id', 'quantity']
     
-    def validate_perfume_id(self, value):
-        # Methd to check if there's a perfume in the database with the received id
-        # Since we cant add a non existent product to cart
-         if not Perfume.objects.filter(pk=value).exists():
-              raise serializers.ValidationError('There is no perfume associated with the given ID')
-         
-         return value
-    
     def save(self, **kwargs):
         cart_id = self.context['cart_id'] # This was passed through the cartitemviewset
         perfume_id = self.validated_data['perfume_id']
         quantity = self.validated_data['quantity'] 
 
-        # We want to only save the cart item if it was received from the client, else we create it
+        # The cart store adds to the line of that perfume if it's already in the cart,
+        # else creates it. It also checks the perfume exists, we cant add a non existent
+        # product to cart.
         try:
-            #  This block will update the item in the cart if it exists already
-             cartitem = Cartitems.objects.get(perfume_id=perfume_id, cart_id=cart_id)
-             cartitem.quantity += quantity
-             cartitem.save()
+            self.instance = get_cart_store().add_item(cart_id, perfume_id, quantity)
+        except PerfumeNotFound:
+            raise serializers.ValidationError({'perfume_id': ['There is no perfume associated with the given ID']})
+        return self.instance  
 
-             self.instance = cartitem
-        except:
-            #  This block will create the item in the cart if it wasnt there already
-            # self.instance = Cartitems.objects.create(perfume_id=perfume_id, cart_id=cart_id, quantity=quantity)
-            self.instance = Cartitems.objects.create(cart_id=cart_id, **self.validated_data)
 
-        return self.instance  
+class BulkCartItemSerializer(serializers.Serializer):
+    perfume_id = serializers.UUIDField()
+    quantity = serializers.IntegerField(min_value=1, max_value=32767)
+
+
+class BulkCartItemsSerializer(serializers.Serializer):
+    # Sets the quantity of many lines at once: perfumes already in the cart get the new
+    # quantity, the others are added
+    items = BulkCartItemSerializer(many=True, allow_empty=False, max_length=100)
+
+    def validate_items(self, value):
+        perfume_ids = [item['perfume_id'] for item in value]
+        if len(set(perfume_ids)) != len(perfume_ids):
+            raise serializers.ValidationError('Each perfume can only be listed once')
+        return value
+
+    def save(self, **kwargs):
+        quantities = {item['perfume_id']: item['quantity'] for item in self.validated_data['items']}
+        try:
+            get_cart_store().set_items(self.context['cart_id'], quantities)
+        except PerfumeNotFound as error:
+            missing = ', '.join(str(perfume_id) for perfume_id in error.args)
+            raise serializers.ValidationError({'items': [f'There is no perfume associated with the IDs {missing}']})
 
 
 class UpdateCartItemSerializer(serializers.ModelSerializer):
@@ -150,20 +215,29 @@ class CartSerializer(serializers.ModelSerializer):
             fields = ['id', 'items', 'grand_total']
 
     def cart_total(self, cart: Cart):
-         items = cart.items.all()
-         total = sum([item.quantity * item.perfume.price for item in items])
-         return total
+         # The cart viewset annotates grand_total in SQL, newly created carts don't have it
+         if hasattr(cart, 'grand_total'):
+              return cart.grand_total
+         return Cartitems.objects.filter(cart=cart).aggregate(total=cart_total_expression())['total']
     
 
 class ReviewSerializer(serializers.ModelSerializer):
     class Meta:
             model = Review
-            fields = ['id', 'perfume', 'date_created', 'description', 'customer_name']
+            fields = ['id', 'perfume', 'date_created', 'description', 'customer_name', 'rating']
+            read_only_fields = ['perfume']  # Set from the URL, see create()
 
     # Overiding the create method for review so as to use the context passed from the view class
     def create(self, validated_data):
         perfume_id = self.context["perfume_id"] # This was passed through the Reviewviewset
         return Review.objects.create(perfume_id = perfume_id, **validated_data)
+
+
+class ReviewListSerializer(serializers.ModelSerializer):
+    # The rows of a perfume's review list, the perfume is already in the URL
+    class Meta:
+        model = Review
+        fields = ['id', 'date_created', 'description', 'customer_name', 'rating']
     
 
 
@@ -194,37 +268,69 @@ class CreateOrderSerilaizer(serializers.Serializer):
      cart_id = serializers.UUIDField()
 
      def validate_cart_id(self, cart_id):
-          if not Cart.objects.filter(pk=cart_id).exists():
+          lines = get_cart_store().item_count(cart_id)
+          if lines is None:
                raise serializers.ValidationError("No cart with the given ID was found")
-          if Cartitems.objects.filter(cart_id=cart_id).count() == 0:
+          if lines == 0:
                raise serializers.ValidationError("The given cart is empty")
           return cart_id
 
      def save(self, **kwargs):
         #   Wrapping all the code in transaction so they can be excuted at once to avoid
-        # inconsistencies in the cases of a failure
-          with transaction.atomic():
-            cart_id = self.validated_data['cart_id']
-        #   print(self.validated_data['cart_id'])
-        #   print(self.context['user_id'])
-
+        # inconsistencies in the cases of a failure. A failed reservation rolls the whole order back.
+          cart_id = self.validated_data['cart_id']
+
+          try:
+               with transaction.atomic(), get_cart_store().checkout(cart_id):
+                    return self.place_order(cart_id)
+          except CartNotFound:
+               raise serializers.ValidationError({'cart_id': ["No cart with the given ID was found"]})
+          except CartCheckoutInProgress:
+               raise serializers.ValidationError({'cart_id': ["This cart is already being checked out"]})
+
+     def place_order(self, cart_id):
+          # Runs in the checkout transaction, once the cart store has the cart in the tables
           (user, created) = User.objects.get_or_create(id=self.context['user_id'])
           order = Order.objects.create(user=user)
 
-          cart_items = Cartitems.objects.select_related('perfume').filter(cart_id=cart_id)
+          cart_items = [item for item in Cartitems.objects.select_related('perfume').filter(cart_id=cart_id) if item.quantity]
 
           order_items = [
-                OrderItem(
+               OrderItem(
                     order = order,
                     perfume = item.perfume,
                     price = item.perfume.price,
                     quantity = item.quantity
-                ) for item in cart_items
+               ) for item in cart_items
           ]
 
           OrderItem.objects.bulk_create(order_items)
 
-        #   Delete the cart after the order has been placed
-          Cart.objects.filter(pk=cart_id).delete()
-
-          return order
\ No newline at end of file
+          # Delete the cart after the order has been placed. Only one checkout of a
+          # given cart can delete it, a concurrent double submit gets nothing here
+          (deleted, counts) = Cart.objects.filter(pk=cart_id).delete()
+          if not counts.get(Cart._meta.label):
+               raise serializers.ValidationError({'cart_id': ["No cart with the given ID was found"]})
+
+          # Last, so the perfume rows stay locked for as short a time as possible
+          self.reserve_inventory(cart_items)
+          return order
+
+     def reserve_inventory(self, cart_items):
+          quantities = defaultdict(int)
+          for item in cart_items:
+               quantities[item.perfume_id] += item.quantity
+
+          # One conditional UPDATE per perfume: the database checks and decrements the stock
+          # in a single step, so concurrent checkouts can never take more than there is.
+          # Sorted so that concurrent checkouts lock the rows in the same order.
+          for perfume_id in sorted(quantities, key=str):
+               quantity = quantities[perfume_id]
+               reserved = Perfume.objects.filter(pk=perfume_id, inventory__gte=quantity).update(
+                    inventory=F('inventory') - quantity, updated_at=timezone.now()
+               )
+               if not reserved:
+                    raise serializers.ValidationError({'cart_id': [f"Not enough stock left for perfume {perfume_id}"]})
+
+          # update() skips the signals, the cached perfume pages show the inventory
+          invalidate('perfumes', *(f'perfume:{perfume_id}' for perfume_id in quantities))
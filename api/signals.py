@@ -0,0 +1,43 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from shop.models import Category, Perfume, PerfumeImage, Review
+from .cache import invalidate
+from .search import get_search_backend
+
+
+# Keeping the full-text search index in sync with the catalog
+@receiver(post_save, sender=Perfume)
+def index_perfume(sender, instance, **kwargs):
+    backend = get_search_backend()
+    if backend is not None:
+        backend.index([instance])
+
+
+@receiver(post_delete, sender=Perfume)
+def unindex_perfume(sender, instance, **kwargs):
+    backend = get_search_backend()
+    if backend is not None:
+        backend.remove([instance.pk])
+
+
+# Invalidating the cached responses that show the changed rows
+@receiver([post_save, post_delete], sender=Perfume)
+def invalidate_perfume(sender, instance, **kwargs):
+    invalidate('perfumes', f'perfume:{instance.pk}')
+
+
+@receiver([post_save, post_delete], sender=PerfumeImage)
+def invalidate_perfume_image(sender, instance, **kwargs):
+    invalidate('perfumes', f'perfume:{instance.perfume_id}')
+
+
+@receiver([post_save, post_delete], sender=Category)
+def invalidate_category(sender, instance, **kwargs):
+    # Deleting a category also takes its perfumes out of the category filter
+    invalidate('categories', 'perfumes')
+
+
+@receiver([post_save, post_delete], sender=Review)
+def invalidate_review(sender, instance, **kwargs):
+    # The perfume shows the review count and the average rating
+    invalidate(f'reviews:{instance.perfume_id}', 'perfumes', f'perfume:{instance.perfume_id}')
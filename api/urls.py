@@ -1,6 +1,5 @@
 from django.urls import path, include, re_path
-from . import views
-from pprint import pprint
+from . import async_views, views
 # Importing router for the modelviewset
 # from rest_framework.routers import DefaultRouter
 # We now make use of the router that comes nested router, no more the one from restframework above
@@ -17,8 +16,6 @@ router.register('perfumes', views.PerfumesViewSet)
 router.register('carts', views.CartViewSet)
 router.register('orders', views.OrderViewSet, basename='order')
 
-pprint(router.urls) #Printing the url patterns on the terminal to check whats expectected
-
 # The lines below registers the child routers
 
 # Notice that we pass three arguments which are the parent router (router), the parent
@@ -39,7 +36,15 @@ urlpatterns = [
     path("", include(cart_router.urls)),   # Gives access to the cart child
     # Paystack urls
     path("orders/<uuid:pk>/initiate-payment/", views.OrderViewSet.as_view({"get": "initiate_payment"}), name="initiate-payment"),
-    path("paystack-callback/", views.OrderViewSet.as_view({"get": "paystack_callback"}), name="paystack-callback"),
+    path("paystack-callback/", views.paystack_callback, name="paystack-callback"),
+    path("paystack-webhook/", views.paystack_webhook, name="paystack-webhook"),
+    path("cache-stats/", views.cache_stats, name="cache-stats"),
+    # Async read-only copies of the catalog endpoints, for ASGI servers
+    path("async/perfumes/", async_views.perfume_list, name="async-perfume-list"),
+    path("async/perfumes/<uuid:pk>/", async_views.perfume_detail, name="async-perfume-detail"),
+    path("async/perfumes/<uuid:perfume_pk>/reviews/", async_views.review_list, name="async-perfume-reviews"),
+    path("async/categories/", async_views.category_list, name="async-category-list"),
+    path("async/categories/<uuid:pk>/", async_views.category_detail, name="async-category-detail"),
    
     # path('categories/', views.category_list),
     # path('category_detail/<int:id>/', views.category_detail),
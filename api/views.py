@@ -1,21 +1,26 @@
 from django.shortcuts import get_object_or_404
+from django.db.models import Count, Max, Prefetch
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.mixins import CreateModelMixin, RetrieveModelMixin, DestroyModelMixin
 from rest_framework.viewsets import ModelViewSet, GenericViewSet, ReadOnlyModelViewSet
-from rest_framework.decorators import api_view
+from rest_framework.decorators import api_view, authentication_classes, permission_classes
 from rest_framework.response import Response
 from rest_framework import status
+from rest_framework.exceptions import NotFound
 from rest_framework.decorators import action
 from django.contrib.auth.models import User
 from django.contrib.auth import login
-from rest_framework.permissions import IsAuthenticated, IsAdminUser
+from rest_framework.permissions import AllowAny, IsAuthenticated, IsAdminUser
+from rest_framework.parsers import MultiPartParser
 from userprofile.models import UserProfile
 from shop.models import Category, Perfume, Cart, Cartitems, Review
-from order.models import Order
-from .serializers import UserProfileSerializer, UserSerializer, CategorySerializer, PerfumeSerializer, ReviewSerializer, CartSerializer, CartItemSerializer, AddCartItemSerializer, UpdateCartItemSerializer, OrderSerializer, CreateOrderSerilaizer, UpdateOrderSerializer
+from order.models import Order, OrderItem
+from order.payments import amount_due, enqueue_event, find_order, start_attempt
+from .serializers import UserProfileSerializer, UserSerializer, CategorySerializer, PerfumeSerializer, ReviewSerializer, ReviewListSerializer, CartSerializer, CartItemSerializer, AddCartItemSerializer, BulkCartItemsSerializer, UpdateCartItemSerializer, OrderSerializer, CreateOrderSerilaizer, UpdateOrderSerializer
 
-import requests
-from decouple import config
+import json
+import zipfile
+from django.conf import settings
 from django.shortcuts import redirect
 from django.http import JsonResponse
 from django.urls import reverse 
@@ -25,11 +30,56 @@ from django.shortcuts import render
 from rest_framework.filters import SearchFilter, OrderingFilter
 # Import for pagination
 from rest_framework.pagination import PageNumberPagination
+from api.cache import CachedResponseMixin, response_cache
+from api.cart_store import CartLocked, CartNotFound, get_cart_store
+from api.exporter import CONTENT_TYPES, export_order_items, export_orders
+from api.importer import CatalogImporter, detect_format, read_rows
+from api.payments import PaystackError, PaystackUnavailable, get_paystack_client, verify_signature
+from api.conditional import ConditionalGetMixin, ConditionalRetrieveMixin
+from api.facets import FacetedListMixin
+from api.pagination import OrderKeysetPagination, PerfumePagination, ReviewPagination
+from api.search import FullTextSearchFilter
 # Importing product filters from the filters.py file
-from api.filters import PerfumeFilter
+from api.filters import OrderExportFilter, OrderFilter, PerfumeFilter
 from .import permissions
 
 # Create your views here.
+@api_view()
+@permission_classes([IsAdminUser])
+def cache_stats(request):
+    # Response cache hit/miss counters of the worker that answers
+    return Response(response_cache.stats())
+
+
+@api_view(['POST'])
+@authentication_classes([])
+@permission_classes([AllowAny])
+def paystack_webhook(request):
+    # Paystack posts every payment event here. The event is only queued, the
+    # process_payment_events command applies it to the order, so Paystack gets its 200 right away
+    body = request.body
+    if not verify_signature(body, request.headers.get('X-Paystack-Signature'), settings.PAYSTACK_SECRET_KEY):
+        return Response({'error': 'Invalid signature'}, status=status.HTTP_401_UNAUTHORIZED)
+
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        payload = None
+    if not isinstance(payload, dict):
+        return Response({'error': 'Invalid payload'}, status=status.HTTP_400_BAD_REQUEST)
+
+    enqueue_event(payload)
+    return Response(status=status.HTTP_200_OK)
+
+
+def paystack_callback(request):
+    # Where Paystack sends the customer back after paying. It only shows the order as it is,
+    # the payment itself is confirmed by the webhook
+    reference = request.GET.get('reference') or request.GET.get('trxref')
+    order = find_order(reference) if reference else None
+    return render(request, 'payment_status.html', {'order': order}, status=200 if order else 404)
+
+
 class UserProfileViewSet(ModelViewSet):
     queryset = UserProfile.objects.all()
     serializer_class = UserProfileSerializer
@@ -60,47 +110,128 @@ class UserViewSet(ModelViewSet):
         return Response({"message": "User logged out successfully."}, status=status.HTTP_200_OK)
 
 
-class CategoryViewSet(ModelViewSet):
+class CategoryViewSet(ConditionalGetMixin, CachedResponseMixin, ModelViewSet):
     # Instantiate the category object from models
     
     queryset = Category.objects.all()
     # Serialize the category object so we can render its data in a json format
     serializer_class = CategorySerializer
+    cache_namespaces = ['categories']
 
 
-class PerfumesViewSet(ModelViewSet):
-    queryset = Perfume.objects.all()
+class PerfumesViewSet(ConditionalGetMixin, CachedResponseMixin, FacetedListMixin, ModelViewSet):
+    # The category is joined in and the images are fetched in a single extra query,
+    # so a page of perfumes costs the same number of queries however big it is
+    queryset = Perfume.objects.select_related('category').prefetch_related('images')
     serializer_class = PerfumeSerializer
 
     # Implementing filter and search
-    filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
+    filter_backends = [DjangoFilterBackend, FullTextSearchFilter, OrderingFilter]
     filterset_class = PerfumeFilter
-    # pagination_class = PageNumberPagination # Global pagination setting was activated, hence; we don't need again at the view level
-    search_fields = ['name', 'description']
-    ordering_fields = ['price']
+    # Page numbers like the global setting, plus keyset pages with ?pagination=cursor.
+    # ?facets=true adds the counts of the filter sidebar, see api/facets.py
+    pagination_class = PerfumePagination
+    search_fields = ['name', 'description']  # Only used when there's no full-text index
+    ordering_fields = ['price', 'rating_avg']
+
+    def get_cache_namespaces(self):
+        # A perfume page only changes with that perfume, the list changes with any of them
+        if self.action == 'retrieve':
+            return [f"perfume:{self.kwargs['pk']}"]
+        return ['perfumes']
+
+    def get_conditional_state(self, queryset):
+        state = super().get_conditional_state(queryset)
+        if state['count'] and self.action == 'list' and self.wants_facets(self.request):
+            # The facets show the titles and genders of the categories. All of them are
+            # checked, that's a read of their updated_at index where joining them to the
+            # perfumes would read every perfume row.
+            categories = Category.objects.aggregate(last_modified=Max('updated_at'), count=Count('*'))
+            if categories['count']:
+                state['last_modified'] = max(state['last_modified'], categories['last_modified'])
+                state['count'] += categories['count']
+        return state
+
+    @action(detail=False, methods=['post'], url_path='import', permission_classes=[IsAdminUser], parser_classes=[MultiPartParser])
+    def bulk_import(self, request):
+        # Loads a CSV or JSONL file of perfumes, plus an optional zip of their images
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({"error": "A CSV or JSONL file is required."}, status=status.HTTP_400_BAD_REQUEST)
+
+        file_format = request.data.get('file_format') or detect_format(upload.name)
+        if file_format not in ('csv', 'jsonl'):
+            return Response({"error": "file_format must be csv or jsonl."}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            importer = CatalogImporter(images_zip=request.FILES.get('images'))
+        except zipfile.BadZipFile:
+            return Response({"error": "images must be a zip file."}, status=status.HTTP_400_BAD_REQUEST)
+
+        report = importer.run(read_rows(upload, file_format))
+        return Response(report, status=status.HTTP_200_OK)
 
     def update(self, request, *args, **kwargs):
         instance = self.get_object()
         serializer = self.get_serializer(instance, data=request.data, partial=True)
         serializer.is_valid(raise_exception=True)
         self.perform_update(serializer)
+
+        # The update may have replaced the images, so the prefetched ones are stale now
+        if getattr(instance, '_prefetched_objects_cache', None):
+            instance._prefetched_objects_cache = {}
+
         return Response(serializer.data)
 
 
-class CartViewSet(CreateModelMixin, RetrieveModelMixin, DestroyModelMixin, GenericViewSet):
+class CartViewSet(ConditionalRetrieveMixin, CreateModelMixin, RetrieveModelMixin, DestroyModelMixin, GenericViewSet):
+    # The carts live in the configured cart store, database rows or cache entries
+    # (see api/cart_store.py). The API is the same either way.
     queryset = Cart.objects.all()
     serializer_class = CartSerializer
 
+    def get_object(self):
+        cart = get_cart_store().get(self.kwargs['pk'])
+        if cart is None:
+            raise NotFound()
+        return cart
+
+    def perform_create(self, serializer):
+        serializer.instance = get_cart_store().create()
+
+    def perform_destroy(self, instance):
+        get_cart_store().delete(instance.pk)
+
+    def get_conditional_queryset(self):
+        # Without the grand total, which would join in every line just to check the date.
+        # Carts of the cache store have no rows to validate against.
+        if get_cart_store().uses_database:
+            return Cart.objects.all()
+        return Cart.objects.none()
+
+    def get_related_modified_fields(self):
+        # The lines show the perfumes' current names and prices
+        return ['items__perfume__updated_at']
+
 
 class CartItemViewSet(ModelViewSet):
     http_method_names = ['get', 'post', 'patch', 'delete']
     # queryset = Cartitems.objects.all()  #Need to apply some logic so we use get_queryset method instead
     # serializer_class = CartItemSerializer
     def get_queryset(self):
-        return Cartitems.objects.filter(cart_id=self.kwargs['cart_pk'])
+        return get_cart_store().items(self.kwargs['cart_pk'])
+
+    def get_object(self):
+        item = get_cart_store().get_item(self.kwargs['cart_pk'], self.kwargs['pk'])
+        if item is None:
+            raise NotFound()
+        return item
 
     def get_serializer_class(self):
-        if self.request.method == 'POST':
+        if self.action == 'bulk':
+            return BulkCartItemsSerializer
+
+        elif self.request.method == 'POST':
             return AddCartItemSerializer
         
         elif self.request.method == 'PATCH':
@@ -108,18 +239,63 @@ class CartItemViewSet(ModelViewSet):
         
         return CartItemSerializer
     
+    def handle_exception(self, exc):
+        if isinstance(exc, CartLocked):
+            # Another change to the same cart took too long, the client can try again
+            return Response(
+                {"error": "The cart is being updated, please try again."},
+                status=status.HTTP_409_CONFLICT, headers={'Retry-After': '1'},
+            )
+        return super().handle_exception(exc)
+
     def get_serializer_context(self):
          return {'cart_id': self.kwargs['cart_pk']}  # Here we're retrieving the id of the
     # particular cart and passing it to the serializer, so we can use it to add items to the cart
 
+    def perform_create(self, serializer):
+        try:
+            serializer.save()
+        except CartNotFound:
+            raise NotFound("No cart with the given ID was found")
+
+    def perform_update(self, serializer):
+        serializer.instance = get_cart_store().update_item(
+            self.kwargs['cart_pk'], serializer.instance.pk, serializer.validated_data['quantity']
+        )
 
-class ReviewViewSet(ModelViewSet):
+    def perform_destroy(self, instance):
+        get_cart_store().remove_item(self.kwargs['cart_pk'], instance.pk)
+
+    @action(detail=False, methods=['post'])
+    def bulk(self, request, cart_pk):
+        # Adds or replaces many lines in one request and returns the whole cart
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            serializer.save()
+        except CartNotFound:
+            raise NotFound("No cart with the given ID was found")
+        return Response(CartSerializer(get_cart_store().get(cart_pk)).data)
+
+
+class ReviewViewSet(CachedResponseMixin, ModelViewSet):
     # queryset = Review.objects.all() # fetched all reviews despite the product
     serializer_class = ReviewSerializer
+    # Page numbers like the global setting, plus keyset pages with ?pagination=cursor
+    pagination_class = ReviewPagination
 
-    # Fetches reviews based on a particular product
+    # Fetches reviews based on a particular product, newest first. The id breaks ties
+    # between reviews of the same instant, both come from the (perfume, -date_created, -id) index
     def get_queryset(self):
-        return Review.objects.filter(perfume_id=self.kwargs['perfume_pk']) 
+        return Review.objects.filter(perfume_id=self.kwargs['perfume_pk']).order_by('-date_created', '-id')
+
+    def get_serializer_class(self):
+        if self.action == 'list':
+            return ReviewListSerializer
+        return ReviewSerializer
+
+    def get_cache_namespaces(self):
+        return [f"reviews:{self.kwargs['perfume_pk']}"]
 
     def get_serializer_context(self):
         return {"perfume_id": self.kwargs["perfume_pk"]}  # Retrieving the id of the particular
@@ -133,18 +309,24 @@ class OrderViewSet(ModelViewSet):
     # permission_classes = [IsAuthenticated, permissions.IsOrderOwnerOrAdmin]
 
     http_method_names = ['get', 'post', 'patch', 'delete', 'head', 'options']
+    pagination_class = OrderKeysetPagination
+    filter_backends = [DjangoFilterBackend]
+    filterset_class = OrderFilter
 
     def get_permissions(self):
-        if self.request.method in ['PATCH', 'DELETE']:
+        if self.request.method in ['PATCH', 'DELETE'] or self.action == 'export':
             return [IsAdminUser()]
         return [IsAuthenticated()]
     
     def get_queryset(self):
+        # Every item and its perfume come in one extra query for the whole page
+        queryset = Order.objects.prefetch_related(
+            Prefetch('items', queryset=OrderItem.objects.select_related('perfume').order_by('pk'))
+        )
         user = self.request.user
         if user.is_staff:
-            return Order.objects.all()
-        (user_id, created) = User.objects.only('id').get_or_create(user_id=user.id)
-        return Order.objects.filter(user_id=user_id)
+            return queryset
+        return queryset.filter(user_id=user.id)
 
     def create(self, request, *args, **kwargs):
         serilizer = CreateOrderSerilaizer(data=request.data, context={"user_id": self.request.user.id})
@@ -156,6 +338,24 @@ class OrderViewSet(ModelViewSet):
 
     # def get_serializer_context(self):
     #     return {"user_id": self.request.user.id}
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        # Streams all the orders matching ?created_after=, ?created_before= and ?status=
+        # (or ?status__in=) as CSV or JSONL, or their items with ?rows=items, see api/exporter.py.
+        # Not `format`, DRF picks the renderer with that one.
+        file_format = request.query_params.get('file_format', 'csv')
+        if file_format not in CONTENT_TYPES:
+            return Response({"error": "file_format must be csv or jsonl."}, status=status.HTTP_400_BAD_REQUEST)
+        rows = request.query_params.get('rows', 'orders')
+        if rows not in ('orders', 'items'):
+            return Response({"error": "rows must be orders or items."}, status=status.HTTP_400_BAD_REQUEST)
+
+        filterset = OrderExportFilter(request.query_params, queryset=Order.objects.all())
+        if not filterset.is_valid():
+            return Response(filterset.errors, status=status.HTTP_400_BAD_REQUEST)
+        export = export_order_items if rows == 'items' else export_orders
+        return export(filterset.qs, file_format)
     
     def get_serializer_class(self):
         if self.request.method == "POST":
@@ -168,63 +368,23 @@ class OrderViewSet(ModelViewSet):
     # Integrating paystack payment gateway
     @action(detail=True, methods=['get'])
     def initiate_payment(self, request, pk):
-
-        PAYSTACK_SECRET_KEY = config('PAYSTACK_SECRET_KEY')
-
         order = self.get_object()  # Retrieve the order
-        amount_in_kobo = int(order.total_amount * 100)  # Convert to kobo
-
-        # Prepare data for initiating payment
-        data = {
-            "email": order.email,
-            "amount": amount_in_kobo,
-            "order_id": order.id, #any other unique identifyer should work
-            "callback_url": request.build_absolute_uri(reverse('paystack_callback')),  # Use your callback URL
-            # Add any other required fields
-        }
-
-        headers = {
-            "Authorization": f"Bearer {PAYSTACK_SECRET_KEY}",
-            "Content-Type": "application/json"
-        }
-
-        # Send a POST request to Paystack to initialize the payment
-        response = requests.post("https://api.paystack.co/transaction/initialize", json=data, headers=headers)
-
-        if response.status_code == 200:
-            payment_info = response.json()
-            return redirect(payment_info['data']['authorization_url'])
-        else:
+        if order.is_completed or order.is_cancelled:
+            return JsonResponse({'error': 'This order is already paid for or cancelled'}, status=400)
+
+        try:
+            transaction = get_paystack_client().initialize_transaction(
+                email=order.email or request.user.email,
+                amount=amount_due(order),  # In kobo
+                reference=start_attempt(order),
+                callback_url=request.build_absolute_uri(reverse('paystack-callback')),
+                metadata={'order_id': str(order.id)},
+            )
+        except PaystackUnavailable:
+            return JsonResponse({'error': 'The payment service is unavailable, please try again shortly'}, status=503)
+        except PaystackError:
             return JsonResponse({'error': 'Payment initiation failed'}, status=400)
-        
-    # Callback method
-    def paystack_callback(request):
-        PAYSTACK_SECRET_KEY = config('PAYSTACK_SECRET_KEY')
-        reference = request.GET.get('reference')
-        # Verify the payment with the reference using Paystack API
-
-        data = {
-            "reference": reference,
-            "authorization_code": request.GET.get('authorization_code')
-        }
-
-        headers = {
-            "Authorization": f"Bearer {PAYSTACK_SECRET_KEY}",
-            "Content-Type": "application/json"
-        }
-
-        response = requests.post("https://api.paystack.co/transaction/verify", json=data, headers=headers)
-
-        if response.status_code == 200:
-            payment_info = response.json()
-            if payment_info['data']['status'] == 'success':
-                # Payment was successful, update your order's status
-                order = Order.objects.get(id=payment_info['data']['metadata']['order_id'])
-                order.is_completed = True
-                order.save()
-                return render(request, 'payment_success.html')
-            else:
-                return render(request, 'payment_failed.html', {'error': 'Payment verification failed'})
+        return redirect(transaction['authorization_url'])
 
 
    
@@ -0,0 +1,211 @@
+"""
+Times the API hot paths in-process with the test client against a seeded database.
+
+    python -m benchmarks.bench_api --perfumes 5000 --requests 200 --output before.json
+    python -m benchmarks.bench_api --baseline before.json --threshold 0.2
+
+Reports the p50/p95/p99 latency, the requests per second and the queries per request of
+each scenario, and saves them as JSON with --output. With --baseline the run fails
+(exit status 1) when a scenario's p95 is more than --threshold slower than in the
+baseline, or when it makes more queries per request.
+"""
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+from datetime import datetime, timezone
+from benchmarks.utils import setup_django, benchmark_database, summarize
+
+NOTES = "oud amber musk vanilla rose jasmine citrus bergamot cedar sandalwood leather tobacco".split()
+
+
+def seed(perfumes, orders, batch_size=2000):
+    from django.contrib.auth.models import User
+    from api.search import get_search_backend
+    from order.models import Order, OrderItem
+    from shop.models import Category, Perfume
+
+    rng = random.Random(42)
+    categories = Category.objects.bulk_create([
+        Category(title=f"Category {i}", slug=f"category-{i}") for i in range(10)
+    ])
+    for start in range(0, perfumes, batch_size):
+        Perfume.objects.bulk_create([
+            Perfume(
+                name=" ".join(rng.sample(NOTES, 2)).title() + f" {start + i}",
+                description=" ".join(rng.choices(NOTES, k=30)),
+                price=round(rng.uniform(10, 500), 2),
+                inventory=1_000_000,
+                category=rng.choice(categories),
+                top_deal=rng.random() < 0.05,
+            )
+            for i in range(min(batch_size, perfumes - start))
+        ])
+    # bulk_create skips the signals that keep the search index up to date
+    if get_search_backend() is not None:
+        get_search_backend().rebuild()
+
+    user = User.objects.create_user('benchmark', password='benchmark')
+    sample = list(Perfume.objects.order_by('?')[:50])
+    history = Order.objects.bulk_create([Order(user=user, status=Order.DELIVERED) for _ in range(orders)])
+    OrderItem.objects.bulk_create([
+        OrderItem(order=order, perfume=perfume, price=perfume.price, quantity=1)
+        for order in history
+        for perfume in rng.sample(sample, 3)
+    ])
+    return {
+        'user': user,
+        'category': categories[0].pk,
+        'perfumes': [str(perfume.pk) for perfume in sample],
+    }
+
+
+def new_cart(client, context, lines=0):
+    cart_id = client.post('/api/carts/').json()['id']
+    for perfume in random.sample(context['perfumes'], lines):
+        client.post(f'/api/carts/{cart_id}/items/', {'perfume_id': perfume, 'quantity': 1})
+    return cart_id
+
+
+# name: (setup, request). setup(client, context) runs untimed before each request and
+# returns what request(client, context, prepared) needs.
+SCENARIOS = {
+    'perfume list': (None, lambda client, context, _: client.get('/api/perfumes/')),
+    'perfume search': (None, lambda client, context, _: client.get('/api/perfumes/', {'search': 'oud amber'})),
+    'perfume filter': (None, lambda client, context, _: client.get(
+        '/api/perfumes/', {'category': context['category'], 'price__lt': 200, 'ordering': 'price'}
+    )),
+    'perfume detail': (
+        lambda client, context: random.choice(context['perfumes']),
+        lambda client, context, perfume: client.get(f'/api/perfumes/{perfume}/'),
+    ),
+    'cart add': (
+        lambda client, context: (new_cart(client, context), random.choice(context['perfumes'])),
+        lambda client, context, prepared: client.post(
+            f'/api/carts/{prepared[0]}/items/', {'perfume_id': prepared[1], 'quantity': 1}
+        ),
+    ),
+    'cart get': (
+        lambda client, context: new_cart(client, context, lines=5),
+        lambda client, context, cart_id: client.get(f'/api/carts/{cart_id}/'),
+    ),
+    'order create': (
+        lambda client, context: new_cart(client, context, lines=3),
+        lambda client, context, cart_id: client.post('/api/orders/', {'cart_id': cart_id}, format='json'),
+    ),
+    'order list': (None, lambda client, context, _: client.get('/api/orders/')),
+}
+
+
+def run(name, client, context, requests, warmup):
+    from django.db import connections
+    from api.instrumentation import QueryRecorder
+
+    setup, request = SCENARIOS[name]
+    timings, queries = [], []
+    for i in range(warmup + requests):
+        prepared = setup(client, context) if setup else None
+        recorder = QueryRecorder()
+        with connections['default'].execute_wrapper(recorder):
+            started = time.perf_counter()
+            response = request(client, context, prepared)
+            elapsed = time.perf_counter() - started
+        if response.status_code >= 400:
+            raise SystemExit(f"{name}: {response.status_code} {response.content[:500]!r}")
+        if i >= warmup:
+            timings.append(elapsed * 1000)
+            queries.append(recorder.count)
+
+    stats = summarize(timings)
+    return {
+        'p50': round(stats['p50'], 3),
+        'p95': round(stats['p95'], 3),
+        'p99': round(stats['p99'], 3),
+        'mean': round(stats['mean'], 3),
+        'requests_per_second': round(requests / (sum(timings) / 1000), 1),
+        'queries_per_request': max(queries),
+    }
+
+
+def regressions(results, baseline, threshold):
+    found = []
+    for name, result in results.items():
+        before = baseline['results'].get(name)
+        if before is None:
+            continue
+        if result['p95'] > before['p95'] * (1 + threshold):
+            found.append(f"{name}: p95 {before['p95']:.2f}ms -> {result['p95']:.2f}ms")
+        if result['queries_per_request'] > before['queries_per_request']:
+            found.append(f"{name}: {before['queries_per_request']} -> {result['queries_per_request']} queries per request")
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--perfumes', type=int, default=5000)
+    parser.add_argument('--orders', type=int, default=50, help="Orders in the history of the benchmark user")
+    parser.add_argument('--requests', type=int, default=200, help="Timed requests per scenario")
+    parser.add_argument('--warmup', type=int, default=20, help="Untimed requests per scenario before the timed ones")
+    parser.add_argument('--scenario', action='append', choices=SCENARIOS, help="Only run these scenarios (repeatable)")
+    parser.add_argument('--output', help="Save the results to this JSON file")
+    parser.add_argument('--baseline', help="JSON file of an earlier run to compare with")
+    parser.add_argument('--threshold', type=float, default=0.2, help="Allowed p95 slowdown over the baseline (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    setup_django()
+    import django
+    from django.conf import settings
+    from django.db import connection
+    from rest_framework.test import APIClient
+
+    # The views are measured, not the response cache or the per-request instrumentation
+    settings.API_CACHE_ENABLED = False
+    settings.SQL_INSTRUMENTATION = False
+    random.seed(42)
+
+    with benchmark_database():
+        print(f"Seeding {args.perfumes} perfumes and {args.orders} orders...")
+        context = seed(args.perfumes, args.orders)
+        client = APIClient()
+        client.force_authenticate(context['user'])
+
+        results = {}
+        print(f"{'scenario':<16}{'p50':>10}{'p95':>10}{'p99':>10}{'req/s':>9}{'queries':>9}")
+        for name in args.scenario or SCENARIOS:
+            result = results[name] = run(name, client, context, args.requests, args.warmup)
+            print(
+                f"{name:<16}{result['p50']:>8.2f}ms{result['p95']:>8.2f}ms{result['p99']:>8.2f}ms"
+                f"{result['requests_per_second']:>9.0f}{result['queries_per_request']:>9}"
+            )
+        vendor = connection.vendor
+
+    report = {
+        'meta': {
+            'date': datetime.now(timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': vendor,
+            'perfumes': args.perfumes,
+            'orders': args.orders,
+            'requests': args.requests,
+        },
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=2)
+        print(f"Saved to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            found = regressions(results, json.load(file), args.threshold)
+        if found:
+            print("Regressions against " + args.baseline + ":\n  " + "\n  ".join(found))
+            sys.exit(1)
+        print(f"No regressions against {args.baseline}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,195 @@
+"""
+Compares the sync catalog endpoints with their async copies at a given concurrency.
+
+    python -m benchmarks.bench_async --concurrency 1 10 50 --db-latency 2
+
+Three ways of serving GET /api/perfumes/, all in-process:
+
+  sync-threads  the WSGI handler on a pool of threads, one per in-flight request, like
+                gunicorn's gthread workers
+  sync-asgi     the ASGI handler with the sync viewset, which Django runs in a thread
+  async-asgi    the ASGI handler with the async view of /api/async/perfumes/
+
+For each it reports the requests per second, the latencies, the threads that were
+running and the Python memory allocated per in-flight request (tracemalloc, a separate
+pass, thread stacks aren't included). --db-latency adds a sleep to every query, like
+the round trip to a database server would.
+"""
+import argparse
+import asyncio
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from wsgiref.util import setup_testing_defaults
+from benchmarks.utils import setup_django, benchmark_database, summarize
+
+PATHS = {
+    'sync-threads': '/api/perfumes/',
+    'sync-asgi': '/api/perfumes/',
+    'async-asgi': '/api/async/perfumes/',
+}
+
+
+def wsgi_get(handler, path):
+    environ = {'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': 'ordering=price', 'wsgi.input': BytesIO()}
+    setup_testing_defaults(environ)
+    statuses = []
+    body = b''.join(handler(environ, lambda status, headers, exc_info=None: statuses.append(status)))
+    assert statuses[0].startswith('200'), (statuses, body[:300])
+
+
+async def asgi_get(handler, path):
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+        'path': path, 'raw_path': path.encode(), 'query_string': b'ordering=price', 'root_path': '',
+        'headers': [(b'host', b'testserver')], 'client': ('127.0.0.1', 50000), 'server': ('testserver', 80),
+    }
+    disconnected = asyncio.Event()
+    requested = False
+    messages = []
+
+    async def receive():
+        nonlocal requested
+        if not requested:
+            requested = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        # Django listens for the client going away while the view runs
+        await disconnected.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        messages.append(message)
+
+    await handler(scope, receive, send)
+    disconnected.set()
+    assert messages[0]['status'] == 200, messages
+
+
+def run_threads(path, concurrency, requests, timings):
+    from django.core.handlers.wsgi import WSGIHandler
+
+    handler = WSGIHandler()
+
+    def one(_):
+        started = time.perf_counter()
+        wsgi_get(handler, path)
+        timings.append((time.perf_counter() - started) * 1000)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(one, range(requests)))
+
+
+def run_asgi(path, concurrency, requests, timings):
+    from django.core.handlers.asgi import ASGIHandler
+
+    handler = ASGIHandler()
+
+    async def worker(queue):
+        while True:
+            try:
+                queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            started = time.perf_counter()
+            await asgi_get(handler, path)
+            timings.append((time.perf_counter() - started) * 1000)
+
+    async def main():
+        queue = asyncio.Queue()
+        for i in range(requests):
+            queue.put_nowait(i)
+        await asyncio.gather(*(worker(queue) for _ in range(concurrency)))
+
+    asyncio.run(main())
+
+
+def run(mode, concurrency, requests):
+    runner = run_threads if mode == 'sync-threads' else run_asgi
+    timings = []
+    threads = [threading.active_count()]
+    sampling = True
+
+    def sample():
+        while sampling:
+            threads.append(threading.active_count())
+            time.sleep(0.005)
+
+    sampler = threading.Thread(target=sample, daemon=True)
+    sampler.start()
+    started = time.perf_counter()
+    runner(PATHS[mode], concurrency, requests, timings)
+    elapsed = time.perf_counter() - started
+    sampling = False
+    sampler.join()
+
+    # One wave of `concurrency` requests with the allocations traced
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    runner(PATHS[mode], concurrency, concurrency, [])
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    stats = summarize(timings)
+    return {
+        'requests_per_second': requests / elapsed,
+        'p50': stats['p50'],
+        'p95': stats['p95'],
+        'threads': max(threads) - 1,  # Not counting the sampler
+        'kib_per_request': (peak - baseline) / concurrency / 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--perfumes', type=int, default=2000)
+    parser.add_argument('--requests', type=int, default=300, help="Requests per mode and concurrency")
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 10, 50])
+    parser.add_argument('--db-latency', type=float, default=0, help="Milliseconds added to every query")
+    parser.add_argument('--mode', action='append', choices=PATHS, help="Only run these modes (repeatable)")
+    args = parser.parse_args()
+
+    setup_django()
+    from django.conf import settings
+    from django.db import connection
+    from django.db.backends.signals import connection_created
+    from shop.models import Category, Perfume, PerfumeImage
+
+    settings.API_CACHE_ENABLED = False
+    settings.SQL_INSTRUMENTATION = False
+
+    if args.db_latency:
+        def slow(execute, sql, params, many, context):
+            time.sleep(args.db_latency / 1000)
+            return execute(sql, params, many, context)
+
+        def add_latency(sender, connection, **kwargs):
+            connection.execute_wrappers.append(slow)
+
+        # Every thread gets its own connection, each of them is slowed down
+        connection_created.connect(add_latency, weak=False)
+
+    with benchmark_database():
+        category = Category.objects.create(title="Woody", slug="woody")
+        perfumes = Perfume.objects.bulk_create([
+            Perfume(name=f"Perfume {i}", description="A benchmark perfume", price=10 + i % 500, category=category)
+            for i in range(args.perfumes)
+        ])
+        PerfumeImage.objects.bulk_create([PerfumeImage(perfume=perfume, image=f"img/store/{perfume.pk}.jpg") for perfume in perfumes])
+        if args.db_latency:
+            # The connection of this thread was opened before the wrapper was connected
+            connection.execute_wrappers.append(slow)
+
+        print(f"{'mode':<14}{'in flight':>10}{'req/s':>9}{'p50':>10}{'p95':>10}{'threads':>9}{'KiB/req':>9}")
+        for concurrency in args.concurrency:
+            for mode in args.mode or PATHS:
+                result = run(mode, concurrency, args.requests)
+                print(
+                    f"{mode:<14}{concurrency:>10}{result['requests_per_second']:>9.0f}"
+                    f"{result['p50']:>8.1f}ms{result['p95']:>8.1f}ms{result['threads']:>9}{result['kib_per_request']:>9.0f}"
+                )
+
+
+if __name__ == '__main__':
+    main()
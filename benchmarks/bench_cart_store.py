@@ -0,0 +1,67 @@
+"""
+Compares add-to-cart through the API with the database cart store and the cache one.
+
+    python -m benchmarks.bench_cart_store --carts 200 --adds 10
+
+Runs against the test database, which for SQLite lives in memory: the gap is bigger on a
+database that has to reach the disk or the network on every write.
+"""
+import argparse
+import random
+import time
+from benchmarks.utils import setup_django, benchmark_database, summarize
+
+
+def run(store, perfumes, carts, adds):
+    from django.test import override_settings
+    from rest_framework.test import APIClient
+    from api.cart_store import get_cart_store
+
+    rng = random.Random(42)
+    client = APIClient()
+    timings = []
+    with override_settings(CART_STORE=store):
+        get_cart_store.cache_clear()
+        try:
+            started = time.perf_counter()
+            for _ in range(carts):
+                cart_id = client.post('/api/carts/').json()['id']
+                for perfume in rng.choices(perfumes, k=adds):
+                    add_started = time.perf_counter()
+                    response = client.post(f'/api/carts/{cart_id}/items/', {'perfume_id': perfume, 'quantity': 1})
+                    timings.append((time.perf_counter() - add_started) * 1000)
+                    assert response.status_code == 201, response.content
+            elapsed = time.perf_counter() - started
+        finally:
+            get_cart_store.cache_clear()
+    return timings, carts * adds / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--carts', type=int, default=200)
+    parser.add_argument('--adds', type=int, default=10, help="Add-to-cart calls per cart")
+    parser.add_argument('--perfumes', type=int, default=500)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.conf import settings
+    from shop.models import Perfume
+
+    # Measure the stores, not the response cache or the image pipeline
+    settings.API_CACHE_ENABLED = False
+    with benchmark_database():
+        perfumes = [
+            str(perfume.pk) for perfume in
+            Perfume.objects.bulk_create([Perfume(name=f'Perfume {i}', price=50 + i) for i in range(args.perfumes)])
+        ]
+
+        print(f"{'store':<10}{'p50':>10}{'p95':>10}{'adds/s':>10}")
+        for store in ('database', 'cache'):
+            timings, throughput = run(store, perfumes, args.carts, args.adds)
+            stats = summarize(timings)
+            print(f"{store:<10}{stats['p50']:>8.2f}ms{stats['p95']:>8.2f}ms{throughput:>10.0f}")
+
+
+if __name__ == '__main__':
+    main()
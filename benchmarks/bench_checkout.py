@@ -0,0 +1,74 @@
+"""
+Times parallel checkouts (POST /api/orders/) of a flash sale: more buyers than stock, all
+of them after the same perfume.
+
+    python -m benchmarks.bench_checkout --buyers 200 --stock 50 --threads 16
+
+Reports the checkouts per second and the latency percentiles, and checks that exactly
+--stock orders went through.
+"""
+import argparse
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from benchmarks.utils import setup_django, benchmark_database, summarize
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--buyers', type=int, default=200)
+    parser.add_argument('--stock', type=int, default=50)
+    parser.add_argument('--threads', type=int, default=16)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.conf import settings
+    from django.contrib.auth.models import User
+    from django.db import connections
+    from rest_framework.test import APIClient
+    from shop.models import Cart, Cartitems, Perfume
+
+    settings.API_CACHE_ENABLED = False
+    settings.SQL_INSTRUMENTATION = False
+    directory = tempfile.TemporaryDirectory()
+    database = settings.DATABASES['default']
+    if database['ENGINE'] == 'django.db.backends.sqlite3':
+        # Threads can't write to the in-memory test database at the same time, a file
+        # also takes the locks production does (like tests/conftest.py)
+        database.setdefault('TEST', {})['NAME'] = f'{directory.name}/checkout.sqlite3'
+
+    with directory, benchmark_database():
+        perfume = Perfume.objects.create(name="Flash sale", price=100, inventory=args.stock)
+        users = User.objects.bulk_create([User(username=f'buyer{i}') for i in range(args.buyers)])
+        carts = Cart.objects.bulk_create([Cart() for _ in range(args.buyers)])
+        Cartitems.objects.bulk_create([Cartitems(cart=cart, perfume=perfume, quantity=1) for cart in carts])
+
+        def checkout(user_cart):
+            user, cart = user_cart
+            client = APIClient()
+            client.force_authenticate(user)
+            started = time.perf_counter()
+            try:
+                response = client.post('/api/orders/', {'cart_id': str(cart.pk)}, format='json')
+                return response.status_code, (time.perf_counter() - started) * 1000
+            finally:
+                connections.close_all()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.threads) as executor:
+            results = list(executor.map(checkout, zip(users, carts)))
+        elapsed = time.perf_counter() - started
+
+        statuses = [status for status, _ in results]
+        stats = summarize([timing for _, timing in results])
+        print(f"{'buyers':>8}{'sold':>6}{'refused':>9}{'checkouts/s':>13}{'p50':>10}{'p95':>10}{'p99':>10}")
+        print(
+            f"{args.buyers:>8}{statuses.count(200):>6}{statuses.count(400):>9}{args.buyers / elapsed:>13.0f}"
+            f"{stats['p50']:>8.1f}ms{stats['p95']:>8.1f}ms{stats['p99']:>8.1f}ms"
+        )
+        if statuses.count(200) != min(args.stock, args.buyers):
+            raise SystemExit(f"Expected {min(args.stock, args.buyers)} orders, {statuses.count(200)} went through")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+"""
+Times the streaming order export (GET /api/orders/export/) against walking the paginated
+order list, which is how finance exported before.
+
+    python -m benchmarks.bench_export --orders 10000 50000 200000
+
+Seeds the synthetic orders of seed_scale (api/seeding.py) and, for each size, reports the
+time to the first byte and to the last, the rows per second and the peak Python memory
+of the export (tracemalloc, a separate pass) for the orders and the items in CSV and
+JSONL. The paginated list is only walked up to --pages-limit orders, it's extrapolated.
+"""
+import argparse
+import time
+import tracemalloc
+from benchmarks.utils import setup_django, benchmark_database
+
+EXPORTS = [('orders', 'csv'), ('orders', 'jsonl'), ('items', 'csv'), ('items', 'jsonl')]
+
+
+def seed(orders, start, perfumes, batch_size, first_user_id):
+    from api.seeding import reset_user_ids, seed_chunk
+
+    options = {
+        'categories': 10, 'perfumes': perfumes, 'images_per_perfume': 0,
+        'users': 100, 'orders': orders, 'first_user_id': first_user_id, 'password': '!',
+    }
+    if start == 0:
+        for table, count in (('categories', 10), ('perfumes', perfumes), ('users', 100)):
+            for chunk in range(0, count, batch_size):
+                seed_chunk(table, 42, chunk, min(chunk + batch_size, count), options)
+        reset_user_ids()
+    for chunk in range(start, orders, batch_size):
+        seed_chunk('orders', 42, chunk, min(chunk + batch_size, orders), options)
+
+
+def stream(client, rows, file_format):
+    started = time.perf_counter()
+    response = client.get('/api/orders/export/', {'rows': rows, 'file_format': file_format})
+    assert response.status_code == 200, response
+    chunks = iter(response.streaming_content)
+    first = next(chunks)
+    first_byte = time.perf_counter() - started
+    size, lines = len(first), first.count(b'\n')
+    for chunk in chunks:
+        size += len(chunk)
+        lines += chunk.count(b'\n')
+    # Not counting the header of the CSV
+    return first_byte, time.perf_counter() - started, lines - (file_format == 'csv'), size
+
+
+def peak_memory(client, rows, file_format):
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    stream(client, rows, file_format)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak - baseline
+
+
+def walk_pages(client, limit):
+    # The paginated list, 9 orders a page with their items, up to `limit` orders
+    started = time.perf_counter()
+    url, orders, requests = '/api/orders/', 0, 0
+    while url and orders < limit:
+        data = client.get(url).json()
+        orders += len(data['results'])
+        requests += 1
+        url = data['next']
+    return time.perf_counter() - started, orders, requests
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--orders', type=int, nargs='+', default=[10_000, 50_000, 200_000])
+    parser.add_argument('--perfumes', type=int, default=5000)
+    parser.add_argument('--batch-size', type=int, default=5000)
+    parser.add_argument('--pages-limit', type=int, default=2000, help="Orders read through the paginated list")
+    args = parser.parse_args()
+
+    setup_django()
+    from django.conf import settings
+    from django.contrib.auth.models import User
+    from rest_framework.test import APIClient
+
+    settings.API_CACHE_ENABLED = False
+    settings.SQL_INSTRUMENTATION = False
+
+    with benchmark_database():
+        staff = User.objects.create_user('finance', is_staff=True)
+        client = APIClient()
+        client.force_authenticate(staff)
+
+        seeded = 0
+        print(f"{'orders':>8} {'export':<14}{'rows':>9}{'MiB':>7}{'first byte':>12}{'total':>9}{'rows/s':>9}{'peak KiB':>10}")
+        for orders in sorted(args.orders):
+            seed(orders, seeded, args.perfumes, args.batch_size, staff.pk + 1)
+            seeded = orders
+            for rows, file_format in EXPORTS:
+                first_byte, total, rows_written, size = stream(client, rows, file_format)
+                peak = peak_memory(client, rows, file_format)
+                print(
+                    f"{orders:>8} {rows + ' ' + file_format:<14}{rows_written:>9}{size / 2**20:>7.1f}"
+                    f"{first_byte * 1000:>10.1f}ms{total:>8.1f}s{rows_written / total:>9.0f}{peak / 1024:>10.0f}"
+                )
+
+        elapsed, walked, requests = walk_pages(client, args.pages_limit)
+        print(
+            f"Paginated list: {walked} orders in {requests} requests, {elapsed:.1f}s "
+            f"({walked / elapsed:.0f} orders/s, {seeded / walked * elapsed:.0f}s for all {seeded})"
+        )
+
+
+if __name__ == '__main__':
+    main()
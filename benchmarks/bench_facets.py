@@ -0,0 +1,113 @@
+"""
+Times the facet counts of the catalog (GET /api/perfumes/?facets=true) at scale.
+
+    python -m benchmarks.bench_facets --perfumes 1000000
+
+Seeds the synthetic catalog of seed_scale (api/seeding.py), then for each filter
+combination compares the one grouped query of api/facets.py with what the storefront did
+before: a COUNT(*) per category, gender, price bucket and flag, like one list call each.
+Reports the milliseconds and the queries of both.
+"""
+import argparse
+import time
+from benchmarks.utils import setup_django, benchmark_database, measure, summarize
+
+# name: filters, in the query parameters of /api/perfumes/
+SCENARIOS = {
+    'whole catalog': {},
+    'one category': {'category': 'first'},
+    'price range': {'price__gt': 50, 'price__lt': 150},
+    'discounts': {'discount': 'true'},
+    'search': {'search': 'oud amber'},
+}
+
+
+def seed(perfumes, categories, batch_size):
+    from api.seeding import seed_chunk
+
+    options = {'categories': categories, 'perfumes': perfumes, 'images_per_perfume': 0}
+    for table, count in (('categories', categories), ('perfumes', perfumes)):
+        for start in range(0, count, batch_size):
+            seed_chunk(table, 42, start, min(start + batch_size, count), options)
+
+
+def filtered_queryset(params):
+    # The rows /api/perfumes/ lists for these parameters, built by the viewset itself
+    from rest_framework.request import Request
+    from rest_framework.test import APIRequestFactory
+    from api.views import PerfumesViewSet
+
+    request = Request(APIRequestFactory().get('/api/perfumes/', params))
+    view = PerfumesViewSet(request=request, args=(), kwargs={}, format_kwarg=None, action='list')
+    return view.filter_queryset(view.get_queryset())
+
+
+def count_per_value(queryset):
+    # The facets as separate list calls, a COUNT(*) for every value of every facet
+    from django.db.models import Q
+    from api.facets import FLAGS, price_range_filter, price_ranges
+    from shop.models import Category
+
+    queryset = queryset.order_by().prefetch_related(None)
+    categories = list(Category.objects.values_list('pk', flat=True))
+    counts = [queryset.filter(category=pk).count() for pk in categories]
+    counts += [queryset.filter(category__gender=gender).count() for gender in 'MFB']
+    counts += [queryset.filter(price_range_filter(*price_range)).count() for price_range in price_ranges()]
+    counts += [queryset.filter(Q(**{flag: True})).count() for flag in FLAGS]
+    return counts
+
+
+def run(func, queryset, repeat):
+    from django.db import connection
+    from api.instrumentation import QueryRecorder
+
+    recorder = QueryRecorder()
+    with connection.execute_wrapper(recorder):
+        func(queryset)
+    return summarize(measure(lambda: func(queryset), repeat)), recorder.count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--perfumes', type=int, default=1_000_000)
+    parser.add_argument('--categories', type=int, default=50)
+    parser.add_argument('--batch-size', type=int, default=10_000)
+    parser.add_argument('--repeat', type=int, default=5, help="Timed runs per scenario and approach")
+    parser.add_argument('--scenario', action='append', choices=SCENARIOS, help="Only run these scenarios (repeatable)")
+    args = parser.parse_args()
+
+    setup_django()
+    from django.conf import settings
+    from api.facets import facet_counts
+    from api.search import get_search_backend
+    from shop.models import Category
+
+    settings.API_CACHE_ENABLED = False
+    settings.SQL_INSTRUMENTATION = False
+    scenarios = args.scenario or list(SCENARIOS)
+
+    with benchmark_database():
+        print(f"Seeding {args.perfumes} perfumes in {args.categories} categories...")
+        started = time.perf_counter()
+        seed(args.perfumes, args.categories, args.batch_size)
+        if 'search' in scenarios and get_search_backend() is not None:
+            get_search_backend().rebuild()
+        print(f"Seeded in {time.perf_counter() - started:.0f}s")
+        # The most popular category, the seeding skews the perfumes towards the first ones
+        first = str(Category.objects.order_by('title').values_list('pk', flat=True)[0])
+
+        print(f"{'scenario':<16}{'rows':>9}{'facets p50':>12}{'queries':>9}{'per value p50':>15}{'queries':>9}")
+        for name in scenarios:
+            params = {key: first if value == 'first' else value for key, value in SCENARIOS[name].items()}
+            queryset = filtered_queryset(params)
+            rows = queryset.order_by().count()
+            facets, facet_queries = run(facet_counts, queryset, args.repeat)
+            per_value, per_value_queries = run(count_per_value, queryset, args.repeat)
+            print(
+                f"{name:<16}{rows:>9}{facets['p50']:>10.0f}ms{facet_queries:>9}"
+                f"{per_value['p50']:>13.0f}ms{per_value_queries:>9}"
+            )
+
+
+if __name__ == '__main__':
+    main()
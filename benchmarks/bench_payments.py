@@ -0,0 +1,88 @@
+"""
+Compares a new connection per Paystack call (the old requests.post) with the pooled
+PaystackClient, against the local Paystack stub.
+
+    python -m benchmarks.bench_payments --calls 2000 --concurrency 16 --latency 20
+
+The stub speaks plain HTTP on localhost, so the gap understates production where every
+new connection also pays a TLS handshake and a real network round trip.
+"""
+import argparse
+import multiprocessing
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from benchmarks.utils import summarize
+
+SECRET_KEY = 'sk_test_stub'
+
+
+def serve_stub(latency, urls):
+    # The stub gets its own process so it doesn't share the GIL with the clients
+    from api.paystack_stub import PaystackStubServer
+
+    server = PaystackStubServer(secret_key=SECRET_KEY, latency=latency)
+    urls.put(server.url)
+    server.serve_forever()
+
+
+def connections_served(base_url):
+    return requests.get(f'{base_url}/_stub/counters').json()['connections']
+
+
+def unpooled_call(base_url):
+    # What initiate_payment used to do: a fresh connection per call, no timeout
+    headers = {'Authorization': f'Bearer {SECRET_KEY}', 'Content-Type': 'application/json'}
+    data = {'email': 'buyer@example.com', 'amount': 150000, 'reference': uuid.uuid4().hex}
+    response = requests.post(f'{base_url}/transaction/initialize', json=data, headers=headers)
+    response.raise_for_status()
+
+
+def pooled_call(client):
+    client.initialize_transaction('buyer@example.com', 150000, uuid.uuid4().hex)
+
+
+def run(call, calls, concurrency):
+    def timed(_):
+        started = time.perf_counter()
+        call()
+        return (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        timings = list(executor.map(timed, range(calls)))
+    return timings, calls / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--calls', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--latency', type=float, default=20, help="Milliseconds the stub takes per call")
+    args = parser.parse_args()
+
+    from api.payments import PaystackClient
+
+    urls = multiprocessing.Queue()
+    stub = multiprocessing.Process(target=serve_stub, args=(args.latency / 1000, urls), daemon=True)
+    stub.start()
+    try:
+        base_url = urls.get(timeout=10)
+        client = PaystackClient(SECRET_KEY, base_url=base_url, pool_size=args.concurrency)
+
+        print(f"{'client':<12}{'p50':>10}{'p95':>10}{'calls/s':>10}{'connections':>13}")
+        for name, call in (('unpooled', lambda: unpooled_call(base_url)), ('pooled', lambda: pooled_call(client))):
+            connections = connections_served(base_url)
+            timings, throughput = run(call, args.calls, args.concurrency)
+            stats = summarize(timings)
+            # Minus the connection of the counters request itself
+            opened = connections_served(base_url) - connections - 1
+            print(f"{name:<12}{stats['p50']:>8.1f}ms{stats['p95']:>8.1f}ms{throughput:>10.0f}{opened:>13}")
+        client.close()
+    finally:
+        stub.terminate()
+
+
+if __name__ == '__main__':
+    main()
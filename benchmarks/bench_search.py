@@ -0,0 +1,86 @@
+"""
+Compares the full-text search backend with DRF's icontains SearchFilter.
+
+    python -m benchmarks.bench_search --rows 100000
+"""
+import argparse
+import random
+from benchmarks.utils import setup_django, benchmark_database, measure, summarize
+
+NOTES = (
+    "oud amber musk vanilla rose jasmine citrus bergamot cedar sandalwood leather tobacco "
+    "vetiver patchouli iris neroli lavender saffron incense fig pear peach coconut tonka"
+).split()
+SYLLABLES = "ka lo mi ne ra su ti vo ze bel dor fin gal hem jur kel mor nis pal qua ren sol".split()
+
+QUERIES = ["oud", "rose jasmine", "smoky leather tobacco", "sandal", "nothing-matches-this"]
+
+
+def vocabulary(rng, size=5000):
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choices(SYLLABLES, k=rng.randint(2, 4))))
+    return sorted(words)
+
+
+def seed(rows, batch_size=5000):
+    from shop.models import Perfume
+
+    rng = random.Random(42)
+    words = vocabulary(rng)
+    # Zipf-like word frequencies, like real product copy
+    weights = [1 / rank for rank in range(1, len(words) + 1)]
+    for start in range(0, rows, batch_size):
+        Perfume.objects.bulk_create([
+            Perfume(
+                name=" ".join(rng.sample(NOTES, 2) + rng.choices(words, weights, k=1)).title(),
+                description=" ".join(rng.sample(NOTES, 3) + rng.choices(words, weights, k=20) + ["smoky"] * (rng.random() < 0.2)),
+                price=round(rng.uniform(10, 500), 2),
+            )
+            for _ in range(min(batch_size, rows - start))
+        ])
+
+
+def run_list(filter_backend, query):
+    from rest_framework.pagination import PageNumberPagination
+    from rest_framework.request import Request
+    from rest_framework.test import APIRequestFactory
+    from api.views import PerfumesViewSet
+
+    request = Request(APIRequestFactory().get("/api/perfumes/", {"search": query}))
+    view = PerfumesViewSet(request=request, format_kwarg=None, kwargs={}, action="list")
+    queryset = filter_backend().filter_queryset(request, PerfumesViewSet.queryset.all(), view)
+    # What the list endpoint does: a count and the first page
+    list(PageNumberPagination().paginate_queryset(queryset, request, view) or [])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    setup_django()
+    from rest_framework.filters import SearchFilter
+    from api.search import FullTextSearchFilter, get_search_backend
+
+    with benchmark_database():
+        print(f"Seeding {args.rows} perfumes...")
+        seed(args.rows)
+        backend = get_search_backend()
+        if backend is None:
+            raise SystemExit("No full-text search backend is available for this database")
+        backend.rebuild()
+
+        print(f"{'query':<25}{'icontains p50':>15}{'fts p50':>10}{'icontains p95':>15}{'fts p95':>10}{'speedup':>9}")
+        for query in QUERIES:
+            like = summarize(measure(lambda: run_list(SearchFilter, query), args.repeat))
+            fts = summarize(measure(lambda: run_list(FullTextSearchFilter, query), args.repeat))
+            print(
+                f"{query:<25}{like['p50']:>13.1f}ms{fts['p50']:>8.1f}ms"
+                f"{like['p95']:>13.1f}ms{fts['p95']:>8.1f}ms{like['p50'] / fts['p50']:>8.1f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+import os
+import statistics
+import sys
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+
+def setup_django():
+    # The benchmarks run as plain scripts (python -m benchmarks.<name>) from the repo root
+    if str(BASE_DIR) not in sys.path:
+        sys.path.insert(0, str(BASE_DIR))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'scenthives.settings')
+    os.environ.setdefault('SECRET_KEY', 'benchmark')
+
+    import django
+    django.setup()
+
+
+@contextmanager
+def benchmark_database():
+    # Runs against a freshly migrated test database, never against db.sqlite3
+    from django.db import connection
+
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        yield connection
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+def measure(func, repeat):
+    # Returns the latencies of `repeat` calls, in milliseconds
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+def summarize(timings):
+    timings = sorted(timings)
+    return {
+        'p50': statistics.median(timings),
+        'p95': timings[min(len(timings) - 1, int(len(timings) * 0.95))],
+        'p99': timings[min(len(timings) - 1, int(len(timings) * 0.99))],
+        'mean': statistics.fmean(timings),
+    }
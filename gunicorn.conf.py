@@ -0,0 +1,39 @@
+# gunicorn -c gunicorn.conf.py scenthives.wsgi
+# GUNICORN_WORKER_CLASS=uvicorn.workers.UvicornWorker gunicorn -c gunicorn.conf.py scenthives.asgi
+#
+# The app is loaded once in the master (preload_app) and warmed up there, the workers are
+# forked from it and share the imported code, the URL resolvers, the serializer fields and
+# the OpenAPI schema copy-on-write instead of each building them on its first requests.
+import multiprocessing
+from decouple import config
+
+bind = config('GUNICORN_BIND', default='0.0.0.0:8000')
+workers = config('WEB_CONCURRENCY', default=multiprocessing.cpu_count() * 2 + 1, cast=int)
+timeout = config('GUNICORN_TIMEOUT', default=30, cast=int)
+preload_app = config('GUNICORN_PRELOAD', default=True, cast=bool)
+# "sync" serves scenthives.wsgi, "uvicorn.workers.UvicornWorker" serves scenthives.asgi and
+# with it the async catalog endpoints under /api/async/ (see api/async_views.py)
+worker_class = config('GUNICORN_WORKER_CLASS', default='sync')
+# Recycles the workers now and then, a slow leak can't grow forever
+max_requests = config('GUNICORN_MAX_REQUESTS', default=2000, cast=int)
+max_requests_jitter = max_requests // 10
+
+
+def when_ready(server):
+    if not server.cfg.preload_app:
+        return
+    from scenthives.warmup import warm_up
+
+    timings = warm_up()
+    server.log.info("Warmed up in %.0fms (%s)", sum(timings.values()) * 1000, ", ".join(
+        f"{name} {seconds * 1000:.0f}ms" for name, seconds in timings.items()
+    ))
+
+
+def pre_fork(server, worker):
+    # A database connection opened in the master would be shared by every worker
+    if not server.cfg.preload_app:
+        return
+    from django.db import connections
+
+    connections.close_all()
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Order, OrderItem
+from .models import Order, OrderItem, PaymentAttempt, PaymentEvent
 
 # Register your models here.
 class OrderAdmin(admin.ModelAdmin):
@@ -11,3 +11,18 @@ class OrderItemAdmin(admin.ModelAdmin):
     list_display = ['order', 'perfume', 'price', 'quantity']
 
 admin.site.register(OrderItem, OrderItemAdmin)
+
+
+class PaymentAttemptAdmin(admin.ModelAdmin):
+    list_display = ['reference', 'order', 'created_at']
+    search_fields = ['reference']
+
+admin.site.register(PaymentAttempt, PaymentAttemptAdmin)
+
+
+class PaymentEventAdmin(admin.ModelAdmin):
+    list_display = ['event', 'reference', 'received_at', 'processed_at', 'error']
+    list_filter = ['event']
+    search_fields = ['reference']
+
+admin.site.register(PaymentEvent, PaymentEventAdmin)
@@ -0,0 +1,30 @@
+import time
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from order.payments import process_events
+
+
+class Command(BaseCommand):
+    help = "Applies the queued Paystack webhook events to the orders"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100, help="Events applied per transaction")
+        parser.add_argument('--watch', action='store_true', help="Keep polling the queue instead of exiting once it's empty")
+        parser.add_argument('--interval', type=float, default=1.0, help="Seconds between polls of an empty queue")
+
+    def handle(self, *args, **options):
+        total = 0
+        try:
+            while True:
+                processed = process_events(options['batch_size'])
+                total += processed
+                if processed:
+                    continue
+                if not options['watch']:
+                    break
+                # A long-running worker must not hold on to a connection the database dropped
+                close_old_connections()
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(f"Processed {total} payment events"))
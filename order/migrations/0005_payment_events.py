@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('order', '0004_rename_product_orderitem_perfume'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='order',
+            name='reference',
+            field=models.CharField(db_index=True, max_length=50),
+        ),
+        migrations.CreateModel(
+            name='PaymentEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=100, unique=True)),
+                ('event', models.CharField(max_length=50)),
+                ('reference', models.CharField(blank=True, max_length=50)),
+                ('payload', models.JSONField()),
+                ('received_at', models.DateTimeField(auto_now_add=True)),
+                ('processed_at', models.DateTimeField(blank=True, null=True)),
+                ('error', models.TextField(blank=True)),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('processed_at__isnull', True)), fields=['id'], name='order_paymentevent_pending_idx')],
+            },
+        ),
+    ]
@@ -41,7 +41,7 @@ class Order(models.Model):
     order_number = models.CharField(max_length=25, null=True, unique=True)
     total_amount = models.DecimalField(max_digits=8, decimal_places=2, blank=True, null=True)
     #payment_mode = models.CharField(max_length=250)
-    reference = models.CharField(max_length=50)
+    reference = models.CharField(max_length=50, db_index=True)
     #payment_gateway_token = models.CharField(max_length=250)
     is_completed = models.BooleanField(default=False)
     is_cancelled = models.BooleanField(default=False)
@@ -49,6 +49,14 @@ class Order(models.Model):
 
     class Meta:
         ordering = ['-created_at',]
+        indexes = [
+            # A user's order history and the staff's status filters, newest first. The id
+            # breaks the ties of the cursor pagination (see api/pagination.py)
+            models.Index(fields=['user', '-created_at', '-id'], name='order_order_user_created_idx'),
+            models.Index(fields=['status', '-created_at', '-id'], name='order_order_status_created_idx'),
+            # The staff's unfiltered list
+            models.Index(fields=['-created_at', '-id'], name='order_order_created_idx'),
+        ]
     
     def __str__(self):
         return self.first_name
@@ -70,3 +78,37 @@ class OrderItem(models.Model):
 
     def __str__(self):
         return '%s' % self.id
+
+
+class PaymentAttempt(models.Model):
+    # Every reference an order was sent to Paystack with. Paystack won't initialize the
+    # same reference twice, so each attempt gets a new one (the latest is also the order's
+    # reference), and a customer can still pay an earlier one from a tab left open.
+    order = models.ForeignKey(Order, related_name='payment_attempts', on_delete=models.CASCADE)
+    reference = models.CharField(max_length=50, unique=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.reference
+
+
+class PaymentEvent(models.Model):
+    # Paystack webhook events, queued as they arrive and applied to the orders by the
+    # process_payment_events command. Paystack resends an event until it gets a 200, the
+    # unique key makes every redelivery a no-op.
+    key = models.CharField(max_length=100, unique=True)
+    event = models.CharField(max_length=50)
+    reference = models.CharField(max_length=50, blank=True)
+    payload = models.JSONField()
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [
+            # The worker only ever scans the pending events, oldest first
+            models.Index(fields=['id'], condition=models.Q(processed_at__isnull=True), name='order_paymentevent_pending_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.event} {self.reference}'
@@ -0,0 +1,126 @@
+import uuid
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+from .models import Order, PaymentAttempt, PaymentEvent
+
+# The events that settle an order, anything else is recorded and skipped
+SUCCESS_EVENTS = ('charge.success',)
+
+
+def start_attempt(order):
+    # A new reference for every attempt, Paystack refuses to initialize the same one twice.
+    # The earlier ones are kept, the customer may still pay one of them.
+    with transaction.atomic():
+        order.reference = uuid.uuid4().hex
+        order.save(update_fields=['reference', 'updated_at'])
+        PaymentAttempt.objects.create(order=order, reference=order.reference)
+    return order.reference
+
+
+def amount_due(order):
+    # What the customer pays for an order, in kobo: its total, or the sum of its items when
+    # no total was stored. process_events annotates that sum as items_total.
+    amount = order.total_amount
+    if amount is None:
+        if hasattr(order, 'items_total'):
+            amount = order.items_total
+        else:
+            amount = order.items.aggregate(total=Sum(F('price') * F('quantity')))['total']
+    return round((amount or 0) * 100)
+
+
+def find_order(reference):
+    # The order of a payment reference, from its latest attempt or an earlier one
+    order = Order.objects.filter(reference=reference).first()
+    if order is None:
+        order = Order.objects.filter(payment_attempts__reference=reference).first()
+    return order
+
+
+def enqueue_event(payload):
+    # Stores one webhook event, a redelivery of an event that's already queued is ignored
+    data = payload.get('data') or {}
+    event = str(payload.get('event', ''))[:50]
+    reference = str(data.get('reference') or '')[:50]
+    key = f"{event}:{data.get('id') or reference}"[:100]
+
+    PaymentEvent.objects.bulk_create(
+        [PaymentEvent(key=key, event=event, reference=reference, payload=payload)],
+        ignore_conflicts=True,
+    )
+
+
+def process_events(batch_size=100):
+    # Applies one batch of pending events, returns how many were processed. Every event is
+    # applied with a conditional update on the order, so running an event twice (or two
+    # events of the same payment) changes nothing the second time.
+    with transaction.atomic():
+        pending = PaymentEvent.objects.filter(processed_at__isnull=True).order_by('id')
+        if connection.features.has_select_for_update_skip_locked:
+            # Lets several workers drain the queue side by side
+            pending = pending.select_for_update(skip_locked=True)
+        events = list(pending[:batch_size])
+        if not events:
+            return 0
+
+        payments = [event for event in events if event.event in SUCCESS_EVENTS]
+        found = order_ids(payments)
+        orders = Order.objects.filter(pk__in=set(found.values())).annotate(
+            items_total=Sum(F('items__price') * F('items__quantity')),
+        ).only('pk', 'total_amount', 'is_cancelled').in_bulk()
+
+        errors = {event.pk: payment_error(event, orders.get(found.get(event.pk))) for event in payments}
+        paid = {found[pk] for pk, error in errors.items() if not error}
+
+        now = timezone.now()
+        Order.objects.filter(pk__in=paid, is_completed=False, is_cancelled=False).update(
+            is_completed=True, status=Order.PROCESSING, updated_at=now,
+        )
+
+        for event in events:
+            event.processed_at = now
+            event.error = errors.get(event.pk, '')
+        PaymentEvent.objects.bulk_update(events, ['processed_at', 'error'])
+    return len(events)
+
+
+def payment_error(event, order):
+    # Why a charge.success doesn't settle its order, '' when it does. The event is signed
+    # by Paystack but the customer picks what is paid, so the amount and currency must be
+    # the order's.
+    if order is None:
+        return 'No order with this reference'
+    data = event.payload.get('data') or {}
+    amount, currency = data.get('amount'), str(data.get('currency') or '').upper()
+    if amount != amount_due(order) or currency != settings.PAYSTACK_CURRENCY:
+        return f'Paid {amount} {currency}, the order is {amount_due(order)} {settings.PAYSTACK_CURRENCY}'
+    if order.is_cancelled:
+        return 'The order is cancelled'
+    return ''
+
+
+def order_ids(events):
+    # {event pk: order id} of the events whose order is found. The reference may be the
+    # order's latest or an earlier attempt's. A reference that's unknown here (an attempt
+    # older than the attempts table) falls back on the order id that initiate_payment
+    # sends in the metadata. The customer can set that metadata themselves, payment_error
+    # still checks the amount against the order it names.
+    references = {event.reference for event in events if event.reference}
+    orders = dict(Order.objects.filter(reference__in=references).values_list('reference', 'pk'))
+    orders.update(PaymentAttempt.objects.filter(reference__in=references - set(orders)).values_list('reference', 'order_id'))
+
+    metadata_ids = {}
+    for event in events:
+        if event.reference not in orders:
+            metadata = (event.payload.get('data') or {}).get('metadata')
+            try:
+                metadata_ids[event.pk] = uuid.UUID(str(metadata.get('order_id')))
+            except (AttributeError, ValueError):
+                pass
+    existing = set(Order.objects.filter(pk__in=set(metadata_ids.values())).values_list('pk', flat=True))
+
+    found = {event.pk: orders[event.reference] for event in events if event.reference in orders}
+    found.update({pk: order_id for pk, order_id in metadata_ids.items() if order_id in existing})
+    return found
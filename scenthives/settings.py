@@ -63,6 +63,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'api.instrumentation.SQLInstrumentationMiddleware',
 ]
 
 ROOT_URLCONF = 'scenthives.urls'
@@ -93,6 +94,12 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Checkouts write concurrently: wait for the lock instead of failing right away, and
+        # take it when the transaction starts so two writers can't deadlock upgrading to it
+        'OPTIONS': {
+            'timeout': 20,
+            'transaction_mode': 'IMMEDIATE',
+        },
     }
 }
 
@@ -101,6 +108,36 @@ DATABASES = {
 # }
 
 
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+# CACHE_BACKEND picks local memory (per process), file (shared by the workers of a host)
+# or redis (shared by every host, any Redis compatible server works)
+
+CACHE_BACKENDS = {
+    'locmem': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'scenthives',
+    },
+    'file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': config('CACHE_LOCATION', default=str(BASE_DIR / '.cache')),
+    },
+    'redis': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': config('CACHE_LOCATION', default='redis://127.0.0.1:6379'),
+    },
+}
+
+CACHES = {
+    'default': CACHE_BACKENDS[config('CACHE_BACKEND', default='locmem')],
+}
+
+# Response cache of the catalog read endpoints, see api/cache.py
+API_CACHE_ENABLED = config('API_CACHE_ENABLED', default=True, cast=bool)
+API_CACHE_ALIAS = 'default'
+API_CACHE_TIMEOUT = config('API_CACHE_TIMEOUT', default=300, cast=int)
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -148,7 +185,7 @@ REST_FRAMEWORK = {
         'rest_framework_simplejwt.authentication.JWTAuthentication',
     ],
     'COERCE_DECIMAL_TO_STRING': False, # Renders numbers as decimal values, not as strings
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    'DEFAULT_PAGINATION_CLASS': 'api.pagination.AsyncPageNumberPagination',  # DRF's, usable by the async views too
     'PAGE_SIZE': 9,
     'COERCE_DECIMAL_TO_STRING': False,
 
@@ -156,6 +193,64 @@ REST_FRAMEWORK = {
 }
 
 
+# Where the carts live (see api/cart_store.py): "database" (Cart/Cartitems rows) or "cache",
+# entries of the CART_STORE_CACHE cache that expire CART_STORE_TTL seconds after their last
+# change and only become rows at checkout. The cache must be shared by every worker
+# (file or redis) for carts to follow their users around.
+CART_STORE = config('CART_STORE', default='database')
+CART_STORE_CACHE = config('CART_STORE_CACHE', default='default')
+CART_STORE_TTL = config('CART_STORE_TTL', default=3 * 24 * 60 * 60, cast=int)
+# Database carts nobody changed for this many days are deleted by
+# python manage.py sweep_carts (cache carts just expire)
+ABANDONED_CART_DAYS = config('ABANDONED_CART_DAYS', default=30, cast=float)
+
+
+# Per-request query count and SQL time, sent as a Server-Timing header and logged by
+# api.instrumentation with the view and action. A SELECT run SQL_REPEATED_QUERY_THRESHOLD
+# times in one request is logged as an N+1, or raises with SQL_INSTRUMENTATION_STRICT
+# (the tests turn it on)
+SQL_INSTRUMENTATION = config('SQL_INSTRUMENTATION', default=False, cast=bool)
+SQL_INSTRUMENTATION_STRICT = config('SQL_INSTRUMENTATION_STRICT', default=False, cast=bool)
+SQL_REPEATED_QUERY_THRESHOLD = config('SQL_REPEATED_QUERY_THRESHOLD', default=3, cast=int)
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'api.instrumentation': {'handlers': ['console'], 'level': 'INFO'},
+    },
+}
+
+
+# Resized copies of the perfume images, generated on a thread pool after the upload is
+# committed (see shop/images.py). Turn IMAGE_DERIVATIVES_ASYNC off to generate them inline
+IMAGE_DERIVATIVES_ASYNC = config('IMAGE_DERIVATIVES_ASYNC', default=True, cast=bool)
+IMAGE_PIPELINE_WORKERS = config('IMAGE_PIPELINE_WORKERS', default=2, cast=int)
+
+
+# Full-text search backend for the perfume search, picked from the database vendor when
+# empty (SQLite FTS5 or Postgres tsvector). See api/search.py
+PERFUME_SEARCH_BACKEND = config('PERFUME_SEARCH_BACKEND', default='')
+
+
+# Paystack API client (see api/payments.py). Point PAYSTACK_BASE_URL at the local stub
+# (python manage.py run_paystack_stub) to work offline. Timeouts are in seconds
+PAYSTACK_SECRET_KEY = config('PAYSTACK_SECRET_KEY', default='')
+PAYSTACK_BASE_URL = config('PAYSTACK_BASE_URL', default='https://api.paystack.co')
+# The currency of the orders, a payment in any other doesn't complete them
+PAYSTACK_CURRENCY = config('PAYSTACK_CURRENCY', default='NGN')
+PAYSTACK_CONNECT_TIMEOUT = config('PAYSTACK_CONNECT_TIMEOUT', default=3.05, cast=float)
+PAYSTACK_READ_TIMEOUT = config('PAYSTACK_READ_TIMEOUT', default=10, cast=float)
+PAYSTACK_MAX_RETRIES = config('PAYSTACK_MAX_RETRIES', default=2, cast=int)
+PAYSTACK_POOL_SIZE = config('PAYSTACK_POOL_SIZE', default=10, cast=int)
+# After this many failed calls in a row Paystack isn't called for PAYSTACK_BREAKER_RESET seconds
+PAYSTACK_BREAKER_THRESHOLD = config('PAYSTACK_BREAKER_THRESHOLD', default=5, cast=int)
+PAYSTACK_BREAKER_RESET = config('PAYSTACK_BREAKER_RESET', default=30, cast=float)
+
+
 SPECTACULAR_SETTINGS = {
     'TITLE': 'ScentHives Ecom API Service',
     'VERSION': '1.0.0',
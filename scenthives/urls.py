@@ -19,7 +19,8 @@ from django.urls import path, include
 from django.shortcuts import render
 from django.conf import settings
 from django.conf.urls.static import static
-from drf_spectacular.views import SpectacularAPIView, SpectacularRedocView, SpectacularSwaggerView
+from drf_spectacular.views import SpectacularRedocView, SpectacularSwaggerView
+from api.schema import CachedSpectacularAPIView
 
 
 def home(request):
@@ -30,7 +31,7 @@ urlpatterns = [
 
     path('', home),
 
-    path('api/schema/', SpectacularAPIView.as_view(), name='schema'),
+    path('api/schema/', CachedSpectacularAPIView.as_view(), name='schema'),
     # Optional: Include Swagger UI view
     # path('api/docs/', SpectacularSwaggerView.as_view(url_name='schema'), name='swagger-ui'),
     path('api/docs/', SpectacularSwaggerView.as_view(url_name='schema'), name='swagger-ui'),
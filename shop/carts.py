@@ -0,0 +1,37 @@
+import time
+from datetime import timedelta
+from django.db import transaction
+from django.utils import timezone
+from .models import Cart, Cartitems
+
+
+def abandoned_carts(max_age, now=None):
+    # Carts nobody changed for max_age (a timedelta). updated_at is touched whenever the
+    # items change, so a cart that's still being filled is never abandoned.
+    return Cart.objects.filter(updated_at__lt=(now or timezone.now()) - max_age)
+
+
+def count_abandoned_carts(max_age, now=None):
+    # (carts, items) a sweep would delete right now
+    carts = abandoned_carts(max_age, now)
+    return carts.count(), Cartitems.objects.filter(cart__in=carts.values('pk')).count()
+
+
+def sweep_abandoned_carts(max_age, chunk_size=500, now=None, pause=0):
+    # Deletes the abandoned carts and their items a chunk of primary keys at a time, each
+    # chunk in its own short transaction, so a sweep never holds its locks for long or
+    # builds one huge cascade. Yields (carts, items) deleted by each chunk.
+    stale = abandoned_carts(max_age, now)
+    while True:
+        with transaction.atomic():
+            pks = list(stale.values_list('pk', flat=True)[:chunk_size])
+            if not pks:
+                return
+            # The cutoff is checked again, a cart touched since it was picked is kept
+            (deleted, counts) = stale.filter(pk__in=pks).delete()
+        yield counts.get(Cart._meta.label, 0), counts.get(Cartitems._meta.label, 0)
+        if len(pks) < chunk_size:
+            return
+        if pause:
+            # Leaves room for the requests between chunks on a busy database
+            time.sleep(pause)
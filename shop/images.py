@@ -0,0 +1,140 @@
+import io
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+
+logger = logging.getLogger(__name__)
+
+# Longest side in pixels of each derivative, images are never upscaled
+DERIVATIVE_SIZES = {
+    'thumbnail': 150,
+    'card': 400,
+    'detail': 1000,
+}
+
+# Pillow format and save options of each derivative file type
+DERIVATIVE_FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+DERIVATIVES_DIR = 'img/store/derivatives'
+
+_executor = None
+
+
+def render_derivatives(source_name, prefix):
+    # Resizes one stored image into every size and format and stores the results.
+    # Only touches the storage, not the database, so it can run in a worker process.
+    # Returns {size: {'width': ..., 'height': ..., 'webp': name, 'jpeg': name}}
+    # Pillow is imported here, not at startup: shop.signals loads this module in every
+    # process but only the pipeline resizes anything
+    from PIL import Image, ImageOps
+
+    with default_storage.open(source_name, 'rb') as source:
+        original = Image.open(source)
+        original.load()
+
+    # Apply the EXIF orientation before the metadata is dropped
+    original = ImageOps.exif_transpose(original)
+    has_alpha = original.mode in ('RGBA', 'LA') or (original.mode == 'P' and 'transparency' in original.info)
+    original = original.convert('RGBA' if has_alpha else 'RGB')
+
+    derivatives = {}
+    for size_name, size in DERIVATIVE_SIZES.items():
+        resized = original.copy()
+        resized.thumbnail((size, size), Image.LANCZOS)
+        entry = {'width': resized.width, 'height': resized.height}
+
+        for extension, (image_format, options) in DERIVATIVE_FORMATS.items():
+            image = resized
+            if image_format == 'JPEG' and image.mode == 'RGBA':
+                # JPEG has no alpha channel, flatten onto white
+                image = Image.new('RGB', resized.size, 'white')
+                image.paste(resized, mask=resized.getchannel('A'))
+
+            # Saving a fresh image without passing exif/icc_profile strips the metadata
+            buffer = io.BytesIO()
+            image.save(buffer, image_format, **options)
+            name = f'{DERIVATIVES_DIR}/{prefix}_{size_name}.{extension}'
+            entry[extension] = default_storage.save(name, ContentFile(buffer.getvalue()))
+
+        derivatives[size_name] = entry
+    return derivatives
+
+
+def derivative_prefix(perfume_image):
+    stem = os.path.splitext(os.path.basename(perfume_image.image.name))[0]
+    return f'{stem}_{perfume_image.pk}'
+
+
+def derivative_names(derivatives):
+    return [
+        entry[extension]
+        for entry in (derivatives or {}).values()
+        for extension in DERIVATIVE_FORMATS
+        if entry.get(extension)
+    ]
+
+
+def delete_derivatives(derivatives):
+    for name in derivative_names(derivatives):
+        default_storage.delete(name)
+
+
+def generate_derivatives(image_id):
+    from .models import PerfumeImage
+
+    perfume_image = PerfumeImage.objects.filter(pk=image_id).first()
+    if perfume_image is None or not perfume_image.image:
+        return
+
+    previous = perfume_image.derivatives
+    perfume_image.derivatives = render_derivatives(perfume_image.image.name, derivative_prefix(perfume_image))
+    # A real save so the signals refresh the perfume's updated_at and cached responses
+    perfume_image.save(update_fields=['derivatives'])
+    delete_derivatives(previous)
+
+
+def generate_all(image_ids):
+    for image_id in image_ids:
+        try:
+            generate_derivatives(image_id)
+        except Exception:
+            logger.exception("Could not generate the derivatives of perfume image %s", image_id)
+
+
+def _run_in_thread(image_ids):
+    # The pipeline's threads get their own database connections, which must not leak
+    close_old_connections()
+    try:
+        generate_all(image_ids)
+    finally:
+        close_old_connections()
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, 'IMAGE_PIPELINE_WORKERS', 2),
+            thread_name_prefix='image-derivatives',
+        )
+    return _executor
+
+
+def schedule_derivatives(image_ids):
+    # Generates the derivatives off the request thread once the images are committed.
+    # With IMAGE_DERIVATIVES_ASYNC off (e.g in tests) they're generated right away.
+    image_ids = list(image_ids)
+    if not image_ids:
+        return
+
+    if not getattr(settings, 'IMAGE_DERIVATIVES_ASYNC', True):
+        transaction.on_commit(lambda: generate_all(image_ids))
+        return
+    transaction.on_commit(lambda: get_executor().submit(_run_in_thread, image_ids))
@@ -0,0 +1,95 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections, transaction
+from django.utils import timezone
+from api.cache import invalidate
+from shop.images import delete_derivatives, derivative_prefix, render_derivatives
+from shop.models import Perfume, PerfumeImage
+
+
+def _init_worker():
+    # Forked workers inherit the configured Django, spawned ones have to set it up
+    django.setup()
+
+
+class Command(BaseCommand):
+    help = "Generates the resized copies of the perfume images that don't have them yet, on every core"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count(), help="Worker processes (default: one per core)")
+        parser.add_argument('--batch-size', type=int, default=200, help="Images saved per database write")
+        parser.add_argument('--force', action='store_true', help="Regenerate images that already have derivatives")
+
+    def handle(self, *args, **options):
+        images = PerfumeImage.objects.exclude(image='').exclude(image__isnull=True).order_by('pk')
+        if not options['force']:
+            images = images.filter(derivatives={})
+
+        total = images.count()
+        self.stdout.write(f"Generating derivatives for {total} images with {options['workers']} workers")
+        if not total:
+            return
+
+        # The workers only resize files, the database writes stay in this process. Its
+        # connections must not be shared with the forked workers.
+        connections.close_all()
+
+        started = time.perf_counter()
+        done = failed = 0
+        with ProcessPoolExecutor(max_workers=options['workers'], initializer=_init_worker) as executor:
+            # Submitted a batch at a time so memory stays flat however many images there are
+            for batch in self.batches(images, options['batch_size']):
+                futures = {
+                    executor.submit(render_derivatives, image.image.name, derivative_prefix(image)): image
+                    for image in batch
+                }
+                rendered, previous = [], []
+                for future in as_completed(futures):
+                    image = futures[future]
+                    try:
+                        derivatives = future.result()
+                    except Exception as error:
+                        failed += 1
+                        self.stderr.write(f"Image {image.pk} ({image.image.name}): {error}")
+                        continue
+
+                    previous.append(image.derivatives)
+                    image.derivatives = derivatives
+                    rendered.append(image)
+
+                self.save(rendered, previous)
+                done += len(rendered)
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated derivatives for {done} images in {elapsed:.1f}s ({done / elapsed:.1f} images/s), {failed} failed"
+        ))
+
+    def batches(self, images, size):
+        # Keyset batches on the primary key, so the writes never run under an open cursor
+        last_pk = 0
+        while True:
+            batch = list(images.filter(pk__gt=last_pk)[:size])
+            if not batch:
+                return
+            yield batch
+            last_pk = batch[-1].pk
+
+    def save(self, images, previous):
+        # bulk_update skips the signals: the perfumes are touched by hand so their ETags
+        # change, and their cached responses invalidated
+        perfume_ids = {image.perfume_id for image in images}
+        with transaction.atomic():
+            PerfumeImage.objects.bulk_update(images, ['derivatives'])
+            Perfume.objects.filter(pk__in=perfume_ids).update(updated_at=timezone.now())
+            invalidate('perfumes', *(f'perfume:{pk}' for pk in perfume_ids))
+
+            def delete_previous():
+                # The old files go once nothing points at them any more, like generate_derivatives
+                for derivatives in previous:
+                    delete_derivatives(derivatives)
+
+            transaction.on_commit(delete_previous)
@@ -0,0 +1,30 @@
+import time
+from django.core.management.base import BaseCommand
+from api.cache import invalidate
+from shop.ratings import rebuild_ratings
+
+
+class Command(BaseCommand):
+    help = "Recounts the review counts and average ratings of the perfumes from their reviews"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000, help="Perfumes checked per transaction")
+        parser.add_argument('--pause', type=float, default=0, help="Seconds to wait between chunks")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        checked = fixed = 0
+        for chunk_checked, chunk_fixed in rebuild_ratings(options['chunk_size'], pause=options['pause']):
+            checked += chunk_checked
+            fixed += len(chunk_fixed)
+            if chunk_fixed:
+                invalidate(*(f'perfume:{pk}' for pk in chunk_fixed))
+            if options['verbosity'] > 1:
+                self.stdout.write(f"Checked {chunk_checked} perfumes, fixed {len(chunk_fixed)}")
+        if fixed:
+            invalidate('perfumes')
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Checked {checked} perfumes and fixed {fixed} in {elapsed:.1f}s ({checked / elapsed:.0f} perfumes/s)"
+        ))
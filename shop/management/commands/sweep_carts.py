@@ -0,0 +1,55 @@
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from shop.carts import count_abandoned_carts, sweep_abandoned_carts
+
+
+class Command(BaseCommand):
+    help = "Deletes the carts nobody changed for a while, with their items"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=float, default=settings.ABANDONED_CART_DAYS,
+            help="Age in days since a cart's last change after which it's abandoned (default: ABANDONED_CART_DAYS)",
+        )
+        parser.add_argument('--chunk-size', type=int, default=500, help="Carts deleted per transaction")
+        parser.add_argument('--pause', type=float, default=0, help="Seconds to wait between chunks")
+        parser.add_argument('--dry-run', action='store_true', help="Only count what would be deleted")
+        parser.add_argument(
+            '--every', type=float, default=0,
+            help="Keep running and sweep again every this many seconds, instead of a cron job",
+        )
+
+    def handle(self, *args, **options):
+        max_age = timedelta(days=options['days'])
+        try:
+            while True:
+                if options['dry_run']:
+                    carts, items = count_abandoned_carts(max_age)
+                    self.stdout.write(f"Would delete {carts} carts and {items} cart items older than {options['days']:g} days")
+                else:
+                    self.sweep(max_age, options)
+                if not options['every']:
+                    break
+                # A long-running sweeper must not hold on to a connection the database dropped
+                close_old_connections()
+                time.sleep(options['every'])
+        except KeyboardInterrupt:
+            pass
+
+    def sweep(self, max_age, options):
+        started = time.perf_counter()
+        carts = items = 0
+        for chunk_carts, chunk_items in sweep_abandoned_carts(max_age, options['chunk_size'], pause=options['pause']):
+            carts += chunk_carts
+            items += chunk_items
+            if options['verbosity'] > 1:
+                self.stdout.write(f"Deleted {chunk_carts} carts and {chunk_items} cart items")
+
+        elapsed = time.perf_counter() - started
+        rows = carts + items
+        self.stdout.write(self.style.SUCCESS(
+            f"Deleted {carts} carts and {items} cart items in {elapsed:.1f}s ({rows / elapsed:.0f} rows/s)"
+        ))
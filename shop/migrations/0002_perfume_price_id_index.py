@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='perfume',
+            options={'ordering': ['price', 'id']},
+        ),
+        migrations.AddIndex(
+            model_name='perfume',
+            index=models.Index(fields=['price', 'id'], name='shop_perfume_price_id_idx'),
+        ),
+    ]
@@ -0,0 +1,57 @@
+import uuid
+from django.db import migrations, OperationalError
+
+
+FTS_TABLE = 'shop_perfume_fts'
+GIN_INDEX = 'shop_perfume_search_idx'
+
+
+def create_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+
+    if connection.vendor == 'sqlite':
+        try:
+            schema_editor.execute(
+                f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+                "perfume_id UNINDEXED, name, description, tokenize='unicode61 remove_diacritics 2')"
+            )
+        except OperationalError:
+            # SQLite was built without FTS5, search falls back to icontains lookups
+            return
+
+        # Same rowid as api.search.SQLiteSearchBackend
+        Perfume = apps.get_model('shop', 'Perfume')
+        rows = [
+            (uuid.UUID(str(pk)).int >> 65, uuid.UUID(str(pk)).hex, name, description or '')
+            for pk, name, description in Perfume.objects.values_list('id', 'name', 'description').iterator()
+        ]
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f"INSERT INTO {FTS_TABLE} (rowid, perfume_id, name, description) VALUES (%s, %s, %s, %s)", rows
+            )
+
+    elif connection.vendor == 'postgresql':
+        # Same expression as api.search.PostgresSearchBackend
+        schema_editor.execute(
+            f"CREATE INDEX {GIN_INDEX} ON shop_perfume USING GIN ("
+            "to_tsvector('english', coalesce(name, '') || ' ' || coalesce(description, '')))"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+    elif vendor == 'postgresql':
+        schema_editor.execute(f"DROP INDEX IF EXISTS {GIN_INDEX}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0002_perfume_price_id_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0004_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='perfumeimage',
+            name='derivatives',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:00
+
+from django.db import migrations, models
+from django.db.models import Count, Min, Sum
+
+
+def merge_duplicate_cart_items(apps, schema_editor):
+    # Lines added twice for the same perfume become one line with the summed quantity,
+    # otherwise the unique constraint can't be created
+    Cartitems = apps.get_model('shop', 'Cartitems')
+    duplicates = (
+        Cartitems.objects.filter(cart__isnull=False, perfume__isnull=False)
+        .values('cart_id', 'perfume_id')
+        .annotate(lines=Count('id'), keep=Min('id'), total=Sum('quantity'))
+        .filter(lines__gt=1)
+    )
+    for duplicate in duplicates:
+        lines = Cartitems.objects.filter(cart_id=duplicate['cart_id'], perfume_id=duplicate['perfume_id'])
+        lines.filter(pk=duplicate['keep']).update(quantity=min(duplicate['total'], 32767))
+        lines.exclude(pk=duplicate['keep']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0005_perfumeimage_derivatives'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='category',
+            index=models.Index(fields=['title'], name='shop_category_title_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='category',
+            index=models.Index(fields=['updated_at'], name='shop_category_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='perfume',
+            index=models.Index(fields=['category', 'price', 'id'], name='shop_perfume_cat_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='perfume',
+            index=models.Index(condition=models.Q(('top_deal', True)), fields=['price', 'id'], name='shop_perfume_top_deal_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='perfume',
+            index=models.Index(condition=models.Q(('flash_sales', True)), fields=['price', 'id'], name='shop_perfume_flash_sales_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='perfume',
+            index=models.Index(condition=models.Q(('discount', True)), fields=['price', 'id'], name='shop_perfume_discount_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='perfume',
+            index=models.Index(fields=['updated_at'], name='shop_perfume_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['perfume', '-date_created', '-id'], name='shop_review_perfume_date_idx'),
+        ),
+        migrations.RunPython(merge_duplicate_cart_items, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='cartitems',
+            constraint=models.UniqueConstraint(fields=('cart', 'perfume'), name='shop_cartitems_cart_perfume_uniq'),
+        ),
+    ]
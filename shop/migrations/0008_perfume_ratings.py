@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:36
+
+import django.core.validators
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_existing_reviews(apps, schema_editor):
+    # The existing reviews have no rating, only their number has to be filled in
+    Perfume = apps.get_model('shop', 'Perfume')
+    Review = apps.get_model('shop', 'Review')
+    reviews = Review.objects.filter(perfume=OuterRef('pk')).order_by().values('perfume').annotate(n=Count('pk')).values('n')
+    Perfume.objects.filter(pk__in=Review.objects.values('perfume')).update(review_count=Coalesce(Subquery(reviews), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0007_cart_updated_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='perfume',
+            name='rating_avg',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='perfume',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='perfume',
+            name='review_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='review',
+            name='rating',
+            field=models.PositiveSmallIntegerField(blank=True, null=True, validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(5)]),
+        ),
+        migrations.AddIndex(
+            model_name='perfume',
+            index=models.Index(fields=['rating_avg', 'id'], name='shop_perfume_rating_idx'),
+        ),
+        migrations.RunPython(count_existing_reviews, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0008_perfume_ratings'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='perfume',
+            index=models.Index(fields=['category', 'price', 'discount', 'top_deal', 'flash_sales'], name='shop_perfume_facets_idx'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0009_perfume_facets_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PerfumeSearchIndex',
+            fields=[
+                ('rowid', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('name', models.TextField()),
+                ('description', models.TextField()),
+                ('document', models.TextField(db_column='shop_perfume_fts')),
+                ('rank', models.FloatField()),
+            ],
+            options={
+                'db_table': 'shop_perfume_fts',
+                'managed': False,
+            },
+        ),
+    ]
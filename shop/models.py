@@ -1,4 +1,5 @@
-from django.db import models
+from django.core.validators import MaxValueValidator, MinValueValidator
+from django.db import models, transaction
 
 # Create your models here.
 from django.db import models
@@ -19,9 +20,15 @@ class Category(models.Model):
     featured_product = models.OneToOneField('Perfume', on_delete=models.CASCADE, blank=True, null=True, related_name='featured_product')
     icon = models.CharField(max_length=100, default=None, blank=True, null=True)
     gender = models.CharField(max_length=1, choices=GENDER_CHOICES, default='B')
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['title']
+        indexes = [
+            models.Index(fields=['title'], name='shop_category_title_idx'),
+            # The ETag aggregate of the list (see api/conditional.py)
+            models.Index(fields=['updated_at'], name='shop_category_updated_idx'),
+        ]
 
     def __str__(self):
         return self.title
@@ -40,9 +47,33 @@ class Perfume(models.Model):
     inventory = models.IntegerField(default=5)
     top_deal=models.BooleanField(default=False)
     flash_sales = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)  # Also touched when its images change
+    # Denormalized from the reviews, kept up to date by shop/ratings.py. rating_count is
+    # the number of reviews with a rating, the older reviews don't have one.
+    review_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_avg = models.FloatField(default=0, editable=False)  # 0 until the first rating
 
     class Meta:
-        ordering = ['price']  # Default pagination field for perfumes
+        # Default pagination field for perfumes, the id breaks ties between equal prices
+        # so that pages stay stable
+        ordering = ['price', 'id']
+        indexes = [
+            models.Index(fields=['price', 'id'], name='shop_perfume_price_id_idx'),
+            # PerfumeFilter's category filter, in the default order
+            models.Index(fields=['category', 'price', 'id'], name='shop_perfume_cat_price_idx'),
+            # The merchandising flags are set on a handful of perfumes, partial indexes only
+            # hold those rows and stay tiny however big the catalog gets
+            models.Index(fields=['price', 'id'], condition=models.Q(top_deal=True), name='shop_perfume_top_deal_idx'),
+            models.Index(fields=['price', 'id'], condition=models.Q(flash_sales=True), name='shop_perfume_flash_sales_idx'),
+            models.Index(fields=['price', 'id'], condition=models.Q(discount=True), name='shop_perfume_discount_idx'),
+            # The ETag aggregate of the list (see api/conditional.py)
+            models.Index(fields=['updated_at'], name='shop_perfume_updated_idx'),
+            # Ordering and filtering by rating, best rated first or not
+            models.Index(fields=['rating_avg', 'id'], name='shop_perfume_rating_idx'),
+            # Covers the grouped facet counts of api/facets.py
+            models.Index(fields=['category', 'price', 'discount', 'top_deal', 'flash_sales'], name='shop_perfume_facets_idx'),
+        ]
     
     def __str__(self):
         return self.name
@@ -51,12 +82,40 @@ class Perfume(models.Model):
 class PerfumeImage(models.Model):
     perfume = models.ForeignKey(Perfume, related_name="images", on_delete=models.CASCADE)
     image = models.ImageField(upload_to="img/store", default="", null=True, blank=True)
+    # Resized copies made by shop/images.py, {size: {'width', 'height', 'webp', 'jpeg'}}
+    derivatives = models.JSONField(default=dict, blank=True)
+
+
+class PerfumeSearchIndex(models.Model):
+    # The FTS5 table of api.search.SQLiteSearchBackend, created by the shop migrations on
+    # SQLite only. It's never read on its own: it's here so the search can join it to the
+    # perfumes with the ORM (perfume.search_index) and read its hidden columns.
+    rowid = models.BigIntegerField(primary_key=True)
+    perfume = models.OneToOneField(
+        Perfume, on_delete=models.DO_NOTHING, db_constraint=False, related_name='search_index'
+    )
+    name = models.TextField()
+    description = models.TextField()
+    # FTS5's hidden columns: the one named after the table takes the MATCH query (= is
+    # the same as MATCH), rank is the relevance of the row for that query
+    document = models.TextField(db_column='shop_perfume_fts')
+    rank = models.FloatField()
+
+    class Meta:
+        managed = False
+        db_table = 'shop_perfume_fts'
 
 
 class Cart(models.Model):
     id = models.UUIDField(default=uuid.uuid4, primary_key=True)
     created = models.DateTimeField(auto_now_add=True)
-    
+    updated_at = models.DateTimeField(auto_now=True)  # Also touched when its items change
+
+    class Meta:
+        indexes = [
+            # The abandoned carts swept by shop/carts.py
+            models.Index(fields=['updated_at'], name='shop_cart_updated_idx'),
+        ]
 
     def __str__(self):
         return str(self.id)
@@ -66,6 +125,12 @@ class Cartitems(models.Model):
     perfume = models.ForeignKey(Perfume, on_delete=models.CASCADE, blank=True, null=True, related_name='cartitems')
     quantity = models.PositiveSmallIntegerField(default=0)
 
+    class Meta:
+        constraints = [
+            # One line per perfume in a cart, adding a perfume again raises its quantity
+            models.UniqueConstraint(fields=['cart', 'perfume'], name='shop_cartitems_cart_perfume_uniq'),
+        ]
+
 
 class Review(models.Model):
     perfume = models.ForeignKey("Perfume", on_delete=models.CASCADE, related_name = "reviews")
@@ -74,6 +139,28 @@ class Review(models.Model):
     customer_name = models.CharField(max_length=50) 
     # The name field refers to the name of the person dropping the review
     # This should actually be grabbed from the logged in user
+    rating = models.PositiveSmallIntegerField(blank=True, null=True, validators=[MinValueValidator(1), MaxValueValidator(5)])
+
+    class Meta:
+        indexes = [
+            # A perfume's reviews, newest first
+            models.Index(fields=['perfume', '-date_created', '-id'], name='shop_review_perfume_date_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # The rating as saved, a change to it is applied to the perfume's average on save
+        rating = dict(zip(field_names, values)).get('rating', models.DEFERRED)
+        if rating is not models.DEFERRED:
+            instance._saved_rating = rating
+        return instance
+
+    def save(self, *args, **kwargs):
+        # The perfume's counters are updated by the post_save receiver (shop/signals.py),
+        # in the same transaction as the review
+        with transaction.atomic():
+            super().save(*args, **kwargs)
     
     def __str__(self):
         return self.description
\ No newline at end of file
@@ -0,0 +1,38 @@
+from django.db.models.signals import post_save, post_delete
+from django.db import transaction
+from django.dispatch import receiver
+from django.utils import timezone
+from .images import delete_derivatives
+from .models import Perfume, PerfumeImage, Review
+from .ratings import review_change, update_ratings
+
+
+# The images are part of a perfume, changing them changes the perfume's updated_at
+@receiver([post_save, post_delete], sender=PerfumeImage)
+def touch_perfume(sender, instance, **kwargs):
+    Perfume.objects.filter(pk=instance.perfume_id).update(updated_at=timezone.now())
+
+
+@receiver(post_delete, sender=PerfumeImage)
+def delete_image_derivatives(sender, instance, **kwargs):
+    derivatives = instance.derivatives
+    transaction.on_commit(lambda: delete_derivatives(derivatives))
+
+
+# The review counters of the perfume follow its reviews, deletes included (cascades and
+# queryset deletes send post_delete too). bulk_create doesn't, see rebuild_ratings.
+@receiver(post_save, sender=Review)
+def count_review(sender, instance, created, update_fields=None, **kwargs):
+    if update_fields is not None and 'rating' not in update_fields:
+        return
+    # A review that wasn't loaded from the database has no known previous rating
+    if created or hasattr(instance, '_saved_rating'):
+        change = review_change(instance.rating, getattr(instance, '_saved_rating', None), created=created)
+        if any(change.values()):
+            update_ratings(instance.perfume_id, **change)
+    instance._saved_rating = instance.rating
+
+
+@receiver(post_delete, sender=Review)
+def uncount_review(sender, instance, **kwargs):
+    update_ratings(instance.perfume_id, **review_change(instance.rating, deleted=True))
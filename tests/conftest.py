@@ -0,0 +1,55 @@
+import pytest
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.test import APIClient
+from api.search import get_search_backend
+from shop.models import Category, Perfume, PerfumeImage
+
+
+@pytest.fixture(autouse=True)
+def no_response_cache(settings):
+    # Most tests look at what the views do, test_response_cache.py turns the cache back on
+    settings.API_CACHE_ENABLED = False
+    cache.clear()
+
+
+@pytest.fixture(autouse=True)
+def strict_sql_instrumentation(settings):
+    # Every request the tests make fails on a query repeated per row (an N+1)
+    settings.SQL_INSTRUMENTATION = True
+    settings.SQL_INSTRUMENTATION_STRICT = True
+
+
+@pytest.fixture
+def api_client():
+    return APIClient()
+
+
+@pytest.fixture
+def category(db):
+    return Category.objects.create(title="Woody", gender="B", slug="woody")
+
+
+def create_perfumes(count, images_per_perfume=0, category=None, price=50.0):
+    perfumes = Perfume.objects.bulk_create([
+        Perfume(name=f"Perfume {i}", description="A test perfume", price=price + i, category=category)
+        for i in range(count)
+    ])
+    # bulk_create skips the signals that keep the search index up to date
+    if get_search_backend() is not None:
+        get_search_backend().index(perfumes)
+    PerfumeImage.objects.bulk_create([
+        PerfumeImage(perfume=perfume, image=f"img/store/perfume_{i}_{n}.jpg")
+        for i, perfume in enumerate(perfumes)
+        for n in range(images_per_perfume)
+    ])
+    return perfumes
+
+
+@pytest.fixture(scope='session')
+def django_db_modify_db_settings(django_db_modify_db_settings, tmp_path_factory):
+    # The in-memory SQLite test database can't be shared by threads that write at the same
+    # time, the concurrency tests need a real file (which is what production runs on too)
+    database = settings.DATABASES['default']
+    if database['ENGINE'] == 'django.db.backends.sqlite3':
+        database.setdefault('TEST', {})['NAME'] = str(tmp_path_factory.mktemp('db') / 'test.sqlite3')
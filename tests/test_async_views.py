@@ -0,0 +1,82 @@
+import pytest
+from asgiref.sync import async_to_sync
+from django.test import AsyncClient
+from django.utils.module_loading import import_string
+from shop.models import Perfume, Review
+from conftest import create_perfumes
+from test_perfume_pagination import tampered_cursor
+
+
+def async_get(path, params=None):
+    return async_to_sync(AsyncClient().get)(path, params)
+
+
+def same_json(response, expected):
+    # The page links point at the endpoint that was asked
+    return response.content.decode().replace('/api/async/', '/api/') == expected.content.decode()
+
+
+@pytest.fixture
+def catalog(category):
+    perfumes = create_perfumes(12, images_per_perfume=2, category=category)
+    Perfume.objects.filter(pk=perfumes[0].pk).update(name="Oud Royal", top_deal=True)
+    Review.objects.bulk_create([Review(perfume=perfumes[0], customer_name=f"Customer {i}") for i in range(3)])
+    return perfumes
+
+
+@pytest.mark.parametrize('path, params', [
+    ('perfumes/', None),
+    ('perfumes/', {'page': 2}),
+    ('perfumes/', {'search': 'oud'}),
+    ('perfumes/', {'price__gt': 52, 'price__lt': 60, 'ordering': '-price'}),
+    ('perfumes/', {'top_deal': True}),
+    ('perfumes/', {'pagination': 'cursor'}),
+    ('perfumes/', {'facets': 'true', 'price__lt': 58}),
+    ('categories/', None),
+])
+def test_async_lists_match_the_viewsets(catalog, api_client, path, params):
+    expected = api_client.get(f'/api/{path}', params)
+    response = async_get(f'/api/async/{path}', params)
+
+    assert response.status_code == expected.status_code == 200
+    assert same_json(response, expected)
+
+
+def test_async_cursor_pages_follow_on(catalog, api_client):
+    first = async_get('/api/async/perfumes/', {'pagination': 'cursor'}).json()
+    second = async_get(first['next'].replace('http://testserver', '')).json()
+
+    assert second['results'] == api_client.get(first['next'].replace('/api/async/', '/api/')).json()['results']
+
+
+def test_async_details_match_the_viewsets(catalog, category, api_client):
+    perfume = catalog[0]
+
+    for path in [f'perfumes/{perfume.pk}/', f'categories/{category.pk}/', f'perfumes/{perfume.pk}/reviews/']:
+        assert async_get(f'/api/async/{path}').json() == api_client.get(f'/api/{path}').json()
+
+
+def test_async_errors_match_the_viewsets(catalog, api_client):
+    missing = '00000000-0000-0000-0000-000000000000'
+
+    perfume = catalog[0].pk
+    for path, params in [
+        (f'perfumes/{missing}/', None), ('perfumes/', {'page': 99}), ('perfumes/', {'category': 'nope'}),
+        (f'perfumes/{perfume}/', {'price__lt': 'abc'}),
+        ('perfumes/', {'cursor': tampered_cursor([1.0, 'not-a-uuid'])}),
+    ]:
+        expected = api_client.get(f'/api/{path}', params)
+        response = async_get(f'/api/async/{path}', params)
+        assert (response.status_code, response.json()) == (expected.status_code, expected.json())
+
+
+@pytest.mark.django_db
+def test_async_endpoints_are_read_only():
+    assert async_to_sync(AsyncClient().post)('/api/async/perfumes/', {}).status_code == 405
+
+
+def test_every_middleware_can_run_async(settings):
+    # A single sync-only middleware makes Django run the whole stack, and so the async
+    # views, in a thread under ASGI
+    for path in settings.MIDDLEWARE:
+        assert getattr(import_string(path), 'async_capable', False), path
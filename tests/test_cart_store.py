@@ -0,0 +1,250 @@
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection, connections
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from api.cart_store import get_cart_store
+from order.models import Order
+from shop.models import Cart, Cartitems, Perfume
+from conftest import create_perfumes
+
+
+@pytest.fixture(params=['database', 'cache'])
+def store(request, settings):
+    settings.CART_STORE = request.param
+    get_cart_store.cache_clear()
+    yield request.param
+    get_cart_store.cache_clear()
+
+
+@pytest.fixture
+def cache_store(settings):
+    settings.CART_STORE = 'cache'
+    get_cart_store.cache_clear()
+    yield get_cart_store()
+    get_cart_store.cache_clear()
+
+
+def writes(queries):
+    return [query['sql'] for query in queries if not query['sql'].lstrip().upper().startswith('SELECT')]
+
+
+@pytest.mark.django_db
+def test_cart_api_is_the_same_for_every_store(store, api_client):
+    first, second = create_perfumes(2, price=10.0)
+
+    cart = api_client.post('/api/carts/').json()
+    assert cart['items'] == [] and cart['grand_total'] == 0
+    items_url = f"/api/carts/{cart['id']}/items/"
+
+    added = api_client.post(items_url, {'perfume_id': first.pk, 'quantity': 1}).json()
+    assert api_client.post(items_url, {'perfume_id': first.pk, 'quantity': 2}).json() == {**added, 'quantity': 3}
+    other = api_client.post(items_url, {'perfume_id': second.pk, 'quantity': 1}).json()
+
+    response = api_client.patch(f"{items_url}{other['id']}/", {'quantity': 4})
+    assert response.json() == {'quantity': 4}
+
+    data = api_client.get(f"/api/carts/{cart['id']}/").json()
+    assert [(item['perfume']['id'], item['quantity'], item['sub_total']) for item in data['items']] == [
+        (str(first.pk), 3, 30.0), (str(second.pk), 4, 44.0),
+    ]
+    assert data['grand_total'] == 74.0
+    assert api_client.get(items_url).json()['count'] == 2
+    assert api_client.get(f"{items_url}{added['id']}/").json()['quantity'] == 3
+
+    assert api_client.delete(f"{items_url}{added['id']}/").status_code == 204
+    assert api_client.get(f"{items_url}{added['id']}/").status_code == 404
+    assert api_client.delete(f"/api/carts/{cart['id']}/").status_code == 204
+    assert api_client.get(f"/api/carts/{cart['id']}/").status_code == 404
+
+
+@pytest.mark.django_db
+def test_unknown_carts_are_not_found(store, api_client):
+    perfume, = create_perfumes(1)
+
+    assert api_client.get('/api/carts/00000000-0000-0000-0000-000000000000/').status_code == 404
+    assert api_client.get('/api/carts/not-a-uuid/').status_code == 404
+    if store == 'cache':
+        response = api_client.post('/api/carts/00000000-0000-0000-0000-000000000000/items/', {'perfume_id': perfume.pk, 'quantity': 1})
+        assert response.status_code == 404
+
+
+@pytest.mark.django_db
+def test_cache_carts_dont_write_to_the_database(cache_store, api_client):
+    perfume, = create_perfumes(1)
+
+    with CaptureQueriesContext(connection) as queries:
+        cart = api_client.post('/api/carts/').json()
+        item = api_client.post(f"/api/carts/{cart['id']}/items/", {'perfume_id': perfume.pk, 'quantity': 1}).json()
+        api_client.patch(f"/api/carts/{cart['id']}/items/{item['id']}/", {'quantity': 5})
+        api_client.get(f"/api/carts/{cart['id']}/")
+
+    assert writes(queries.captured_queries) == []
+    assert not Cart.objects.exists()
+
+
+@pytest.mark.django_db
+def test_checkout_writes_the_cache_cart_once(cache_store, django_capture_on_commit_callbacks):
+    perfume = Perfume.objects.create(name="Oud", price=100, inventory=5)
+    cart = cache_store.create()
+    cache_store.add_item(cart.pk, perfume.pk, 2)
+    user = User.objects.create_user('buyer', password='pass')
+    client = APIClient()
+    client.force_authenticate(user)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        response = client.post('/api/orders/', {'cart_id': str(cart.pk)}, format='json')
+
+    assert response.status_code == 200
+    assert Order.objects.get().items.get().quantity == 2
+    assert Perfume.objects.get(pk=perfume.pk).inventory == 3
+    # The rows only lived for the checkout, and the cart is gone from the cache
+    assert not Cart.objects.exists() and not Cartitems.objects.exists()
+    assert cache_store.get(cart.pk) is None
+
+
+@pytest.mark.django_db
+def test_failed_checkout_keeps_the_cache_cart(cache_store):
+    perfume = Perfume.objects.create(name="Oud", price=100, inventory=1)
+    cart = cache_store.create()
+    cache_store.add_item(cart.pk, perfume.pk, 2)
+    user = User.objects.create_user('buyer', password='pass')
+    client = APIClient()
+    client.force_authenticate(user)
+
+    response = client.post('/api/orders/', {'cart_id': str(cart.pk)}, format='json')
+
+    assert response.status_code == 400
+    assert not Cart.objects.exists() and not Order.objects.exists()
+    assert cache_store.get(cart.pk).items[0].quantity == 2
+    # and it can be checked out again once there's stock
+    Perfume.objects.filter(pk=perfume.pk).update(inventory=2)
+    assert client.post('/api/orders/', {'cart_id': str(cart.pk)}, format='json').status_code == 200
+
+
+@pytest.mark.django_db
+def test_cache_carts_expire(cache_store):
+    cart = cache_store.create()
+    cache.delete(cache_store.key(cart.pk))  # What the cache does after CART_STORE_TTL
+
+    assert cache_store.get(cart.pk) is None
+    assert cache_store.item_count(cart.pk) is None
+
+
+@pytest.mark.django_db
+def test_a_held_cart_lock_is_a_retryable_conflict(cache_store, api_client, monkeypatch):
+    perfume, = create_perfumes(1)
+    cart = cache_store.create()
+    lock_key = f'{cache_store.key(cart.pk)}:lock'
+    monkeypatch.setattr(cache_store, 'lock_timeout', 0.05)
+    cache.add(lock_key, 'other request')
+
+    response = api_client.post(f"/api/carts/{cart.pk}/items/", {'perfume_id': perfume.pk, 'quantity': 1})
+
+    assert response.status_code == 409
+    assert response['Retry-After']
+    assert cache.get(lock_key) == 'other request'
+    assert cache_store.get(cart.pk).items == []
+
+
+@pytest.mark.django_db
+def test_an_expired_cart_lock_is_not_released_by_its_old_holder(cache_store):
+    cart = cache_store.create()
+    lock_key = f'{cache_store.key(cart.pk)}:lock'
+
+    with cache_store.lock(cart.pk):
+        # Ours expired and another request took the lock
+        cache.set(lock_key, 'other request')
+
+    assert cache.get(lock_key) == 'other request'
+
+
+@pytest.mark.django_db
+def test_adding_an_unknown_perfume_is_rejected(store, api_client):
+    cart = api_client.post('/api/carts/').json()
+
+    response = api_client.post(f"/api/carts/{cart['id']}/items/", {'perfume_id': '00000000-0000-0000-0000-000000000000', 'quantity': 1})
+
+    assert response.status_code == 400
+    assert 'perfume_id' in response.data
+    assert api_client.get(f"/api/carts/{cart['id']}/").json()['items'] == []
+
+
+@pytest.mark.django_db
+def test_adding_to_a_line_is_a_single_update(api_client):
+    perfume, = create_perfumes(1)
+    cart = Cart.objects.create()
+    Cartitems.objects.create(cart=cart, perfume=perfume, quantity=1)
+
+    with CaptureQueriesContext(connection) as queries:
+        response = api_client.post(f"/api/carts/{cart.pk}/items/", {'perfume_id': perfume.pk, 'quantity': 2})
+
+    assert response.json()['quantity'] == 3
+    # The cart's updated_at and one upsert of the line, nothing is read first
+    statements = [sql for sql in writes(queries.captured_queries) if 'SAVEPOINT' not in sql]
+    assert len(statements) == 2
+    assert statements[0].startswith('UPDATE')
+    assert statements[1].startswith('INSERT') and 'ON CONFLICT' in statements[1]
+    assert Cartitems.objects.get().quantity == 3
+
+
+@pytest.mark.django_db(transaction=True)
+def test_concurrent_adds_end_up_on_one_line():
+    perfume, = create_perfumes(1)
+    cart = Cart.objects.create()
+
+    def add(_):
+        try:
+            return APIClient().post(f"/api/carts/{cart.pk}/items/", {'perfume_id': perfume.pk, 'quantity': 1}).status_code
+        finally:
+            connections.close_all()
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        statuses = list(executor.map(add, range(40)))
+
+    assert statuses == [201] * 40
+    assert list(Cartitems.objects.filter(cart=cart).values_list('quantity', flat=True)) == [40]
+
+
+@pytest.mark.django_db
+def test_bulk_adds_and_replaces_lines(store, api_client):
+    first, second, third = create_perfumes(3, price=10.0)
+    cart = api_client.post('/api/carts/').json()
+    items_url = f"/api/carts/{cart['id']}/items/"
+    api_client.post(items_url, {'perfume_id': first.pk, 'quantity': 5})
+    api_client.post(items_url, {'perfume_id': second.pk, 'quantity': 1})
+
+    response = api_client.post(f"{items_url}bulk/", {'items': [
+        {'perfume_id': str(first.pk), 'quantity': 2},
+        {'perfume_id': str(third.pk), 'quantity': 1},
+    ]}, format='json')
+
+    assert response.status_code == 200
+    assert {item['perfume']['id']: item['quantity'] for item in response.json()['items']} == {
+        str(first.pk): 2, str(second.pk): 1, str(third.pk): 1,
+    }
+    assert response.json()['grand_total'] == 20.0 + 11.0 + 12.0
+
+
+@pytest.mark.django_db
+def test_bulk_is_all_or_nothing(store, api_client):
+    perfume, = create_perfumes(1)
+    cart = api_client.post('/api/carts/').json()
+    bulk_url = f"/api/carts/{cart['id']}/items/bulk/"
+
+    unknown = api_client.post(bulk_url, {'items': [
+        {'perfume_id': str(perfume.pk), 'quantity': 1},
+        {'perfume_id': '00000000-0000-0000-0000-000000000000', 'quantity': 1},
+    ]}, format='json')
+    twice = api_client.post(bulk_url, {'items': [
+        {'perfume_id': str(perfume.pk), 'quantity': 1},
+        {'perfume_id': str(perfume.pk), 'quantity': 2},
+    ]}, format='json')
+    no_cart = api_client.post('/api/carts/00000000-0000-0000-0000-000000000000/items/bulk/', {'items': [
+        {'perfume_id': str(perfume.pk), 'quantity': 1},
+    ]}, format='json')
+
+    assert (unknown.status_code, twice.status_code, no_cart.status_code) == (400, 400, 404)
+    assert api_client.get(f"/api/carts/{cart['id']}/").json()['items'] == []
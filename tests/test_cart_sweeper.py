@@ -0,0 +1,69 @@
+from datetime import timedelta
+from io import StringIO
+import pytest
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from shop.carts import sweep_abandoned_carts
+from shop.models import Cart, Cartitems
+from conftest import create_perfumes
+from test_query_plans import full_scans
+
+
+def create_carts(count, age, perfumes):
+    carts = Cart.objects.bulk_create([Cart() for _ in range(count)])
+    Cartitems.objects.bulk_create([Cartitems(cart=cart, perfume=perfume, quantity=1) for cart in carts for perfume in perfumes])
+    Cart.objects.filter(pk__in=[cart.pk for cart in carts]).update(updated_at=timezone.now() - age)
+    return carts
+
+
+def sweep(*args):
+    out = StringIO()
+    call_command('sweep_carts', *args, stdout=out)
+    return out.getvalue()
+
+
+@pytest.mark.django_db
+def test_sweep_deletes_only_the_abandoned_carts():
+    perfumes = create_perfumes(2)
+    create_carts(5, timedelta(days=40), perfumes)
+    kept = create_carts(2, timedelta(days=3), perfumes)
+
+    output = sweep('--days', '30', '--chunk-size', '2')
+
+    assert set(Cart.objects.values_list('pk', flat=True)) == {cart.pk for cart in kept}
+    assert Cartitems.objects.count() == 4
+    assert "Deleted 5 carts and 10 cart items" in output
+    assert "rows/s" in output
+
+
+@pytest.mark.django_db
+def test_dry_run_only_counts():
+    create_carts(3, timedelta(days=40), create_perfumes(2))
+
+    output = sweep('--days', '30', '--dry-run')
+
+    assert "Would delete 3 carts and 6 cart items" in output
+    assert Cart.objects.count() == 3 and Cartitems.objects.count() == 6
+
+
+@pytest.mark.django_db
+def test_sweep_deletes_in_bounded_chunks():
+    create_carts(7, timedelta(days=40), create_perfumes(1))
+
+    chunks = list(sweep_abandoned_carts(timedelta(days=30), chunk_size=3))
+
+    assert chunks == [(3, 3), (3, 3), (1, 1)]
+
+
+@pytest.mark.django_db
+def test_picking_the_abandoned_carts_uses_the_index():
+    create_carts(3, timedelta(days=40), create_perfumes(1))
+
+    with CaptureQueriesContext(connection) as queries:
+        list(sweep_abandoned_carts(timedelta(days=30), chunk_size=2))
+
+    selects = [query['sql'] for query in queries.captured_queries if query['sql'].startswith('SELECT')]
+    assert selects
+    assert [sql for sql in selects if full_scans(sql)] == []
@@ -0,0 +1,54 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from shop.models import Cart, Cartitems
+from conftest import create_perfumes
+
+ENDPOINT = "/api/carts/"
+
+
+def fill_cart(cart, perfumes, quantity=2):
+    Cartitems.objects.bulk_create([
+        Cartitems(cart=cart, perfume=perfume, quantity=quantity) for perfume in perfumes
+    ])
+
+
+def get_cart(client, cart):
+    with CaptureQueriesContext(connection) as context:
+        response = client.get(f"{ENDPOINT}{cart.id}/")
+    assert response.status_code == 200
+    return response.json(), len(context.captured_queries)
+
+
+@pytest.mark.django_db
+def test_cart_totals_are_computed(api_client):
+    cart = Cart.objects.create()
+    fill_cart(cart, create_perfumes(3, price=10.0), quantity=2)
+
+    data, _ = get_cart(api_client, cart)
+
+    assert sorted(item["sub_total"] for item in data["items"]) == [20.0, 22.0, 24.0]
+    assert data["grand_total"] == 66.0
+
+
+@pytest.mark.django_db
+def test_empty_cart_total_is_zero(api_client):
+    response = api_client.post(ENDPOINT)
+    assert response.status_code == 201
+    assert response.json()["grand_total"] == 0
+
+    data, _ = get_cart(api_client, Cart.objects.get())
+    assert data["grand_total"] == 0
+
+
+@pytest.mark.django_db
+def test_cart_query_count_is_flat(api_client):
+    small_cart = Cart.objects.create()
+    fill_cart(small_cart, create_perfumes(1))
+    large_cart = Cart.objects.create()
+    fill_cart(large_cart, create_perfumes(20))
+
+    _, small_queries = get_cart(api_client, small_cart)
+    _, large_queries = get_cart(api_client, large_cart)
+
+    assert small_queries == large_queries <= 3
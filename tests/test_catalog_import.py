@@ -0,0 +1,155 @@
+import io
+import json
+import zipfile
+import pytest
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from PIL import Image
+from api.importer import CatalogImporter
+from shop.models import Category, Perfume, PerfumeImage
+
+CSV = """name,description,price,inventory,category,top_deal,images
+Oud Wood,Smoky,120,3,Woody,true,oud.jpg
+Citrus Splash,Fresh,40,10,Fresh,,
+,No name,10,1,,,
+Lavender Fields,Calm,not-a-price,1,,,
+Vanilla Dream,Sweet,60,2,woody,,vanilla.jpg;missing.jpg
+Rose Garden,Floral,80,4,Floral,false,rose.jpg;oud.jpg
+"""
+
+
+@pytest.fixture(autouse=True)
+def media_root(settings, tmp_path):
+    settings.MEDIA_ROOT = tmp_path
+    settings.IMAGE_DERIVATIVES_ASYNC = False
+
+
+def images_zip(*names):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        for name in names:
+            image = io.BytesIO()
+            Image.new("RGB", (20, 20), "blue").save(image, "JPEG")
+            archive.writestr(name, image.getvalue())
+    buffer.seek(0)
+    return buffer
+
+
+@pytest.mark.django_db
+def test_import_endpoint(api_client, admin_user, category):
+    api_client.force_authenticate(admin_user)
+    response = api_client.post("/api/perfumes/import/", {
+        "file": SimpleUploadedFile("catalog.csv", CSV.encode()),
+        "images": SimpleUploadedFile("images.zip", images_zip("oud.jpg", "rose.jpg", "vanilla.jpg").read()),
+    }, format="multipart")
+
+    assert response.status_code == 200
+    report = response.json()
+    assert (report["rows"], report["created"], report["images"], report["failed"]) == (6, 3, 3, 3)
+    assert [error["row"] for error in report["errors"]] == [3, 4, 5]
+    assert "images" in report["errors"][2]["errors"]
+    assert report["rows_per_second"] > 0
+
+    oud = Perfume.objects.get(name="Oud Wood")
+    assert oud.top_deal and oud.price == 120 and oud.category == category
+    assert Perfume.objects.get(name="Citrus Splash").category.slug == "fresh"
+    assert PerfumeImage.objects.filter(perfume__name="Rose Garden").count() == 2
+    assert Category.objects.count() == 3
+
+    # Imported perfumes are searchable right away
+    results = api_client.get("/api/perfumes/", {"search": "smoky"}).json()["results"]
+    assert [perfume["name"] for perfume in results] == ["Oud Wood"]
+
+
+@pytest.mark.django_db
+def test_import_endpoint_is_admin_only(api_client):
+    response = api_client.post("/api/perfumes/import/", {
+        "file": SimpleUploadedFile("catalog.csv", CSV.encode()),
+    }, format="multipart")
+    assert response.status_code in (401, 403)
+
+
+@pytest.mark.django_db
+def test_import_command_reads_jsonl_in_chunks(tmp_path):
+    path = tmp_path / "catalog.jsonl"
+    rows = [{"name": f"Perfume {i}", "price": 10 + i, "category": "Woody"} for i in range(25)]
+    path.write_text("\n".join(json.dumps(row) for row in rows) + "\n{broken\n")
+    out, err = io.StringIO(), io.StringIO()
+
+    call_command("import_catalog", str(path), chunk_size=10, stdout=out, stderr=err)
+
+    assert Perfume.objects.count() == 25
+    assert Category.objects.count() == 1
+    assert "Row 26" in err.getvalue()
+    assert "rows/s" in out.getvalue()
+
+
+@pytest.mark.django_db
+def test_unreadable_jsonl_lines_are_row_errors(tmp_path):
+    path = tmp_path / "catalog.jsonl"
+    path.write_bytes(b'{"name": "Oud Wood", "price": 120}\n42\n["x"]\n{"name": "Caf\xe9"}\n{"name": "Rose", "price": 80}\n')
+    err = io.StringIO()
+
+    call_command("import_catalog", str(path), stdout=io.StringIO(), stderr=err)
+
+    assert set(Perfume.objects.values_list("name", flat=True)) == {"Oud Wood", "Rose"}
+    assert "Row 2: {'non_field_errors': ['Expected a JSON object.']}" in err.getvalue()
+    assert "Row 3:" in err.getvalue()
+    assert "Row 4: {'non_field_errors': [\"Invalid UTF-8" in err.getvalue()
+
+
+@pytest.mark.django_db
+def test_invalid_utf8_csv_is_reported(tmp_path):
+    path = tmp_path / "catalog.csv"
+    path.write_bytes(b"name,price\nOud Wood,120\nCaf\xe9,10\n")
+    err = io.StringIO()
+
+    call_command("import_catalog", str(path), stdout=io.StringIO(), stderr=err)
+
+    assert "Invalid UTF-8" in err.getvalue()
+
+
+@pytest.mark.django_db
+def test_import_invalidates_the_cached_categories(api_client, admin_user, settings, no_response_cache):
+    settings.API_CACHE_ENABLED = True
+    assert api_client.get("/api/categories/").json()["results"] == []
+
+    api_client.force_authenticate(admin_user)
+    api_client.post("/api/perfumes/import/", {"file": SimpleUploadedFile("catalog.csv", CSV.encode())}, format="multipart")
+
+    # Only the rows without images are imported, their category is new
+    titles = [category["title"] for category in api_client.get("/api/categories/").json()["results"]]
+    assert titles == ["Fresh"]
+
+
+@pytest.fixture
+def refused_names(db):
+    # Makes the database itself refuse the perfumes named "Poison"
+    if connection.vendor != "sqlite":
+        pytest.skip("The trigger is written for SQLite")
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "CREATE TEMP TRIGGER refuse_poison BEFORE INSERT ON shop_perfume WHEN NEW.name = 'Poison' "
+            "BEGIN SELECT RAISE(ABORT, 'refused'); END"
+        )
+    yield
+    with connection.cursor() as cursor:
+        cursor.execute("DROP TRIGGER refuse_poison")
+
+
+def test_database_errors_only_fail_their_rows(refused_names, tmp_path):
+    importer = CatalogImporter(images_zip=images_zip("oud.jpg", "poison.jpg"))
+    report = importer.run([
+        {"name": "Oud Wood", "price": 120, "category": "Woody", "images": "oud.jpg"},
+        {"name": "Poison", "price": 90, "category": "Toxic", "images": "poison.jpg"},
+        {"name": "Rose Garden", "price": 80, "category": "Floral"},
+    ])
+
+    assert (report["created"], report["images"], report["failed"]) == (2, 1, 1)
+    assert [error["row"] for error in report["errors"]] == [2]
+    assert set(Perfume.objects.values_list("name", flat=True)) == {"Oud Wood", "Rose Garden"}
+    # Nothing is left behind of the refused row: its category or its stored image
+    assert set(Category.objects.values_list("title", flat=True)) == {"Woody", "Floral"}
+    assert "Toxic" not in importer.categories
+    assert [path.name for path in (tmp_path / "img/store").iterdir() if path.is_file()] == ["oud.jpg"]
@@ -0,0 +1,82 @@
+import pytest
+from shop.models import Cart, Perfume
+from conftest import create_perfumes
+
+
+def revalidate(client, url, response):
+    return client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("url", ["/api/perfumes/", "/api/perfumes/?price__lt=60", "/api/categories/"])
+def test_unchanged_lists_answer_304(api_client, category, url):
+    create_perfumes(3, category=category)
+    response = api_client.get(url)
+    assert response.status_code == 200
+    assert response["Last-Modified"]
+
+    not_modified = revalidate(api_client, url, response)
+    assert not_modified.status_code == 304
+    assert not_modified["ETag"] == response["ETag"]
+    assert not_modified.content == b""
+
+
+@pytest.mark.django_db
+def test_304_is_decided_without_the_view(api_client, django_assert_num_queries):
+    create_perfumes(3, images_per_perfume=2)
+    response = api_client.get("/api/perfumes/")
+
+    with django_assert_num_queries(1):
+        assert revalidate(api_client, "/api/perfumes/", response).status_code == 304
+
+
+@pytest.mark.django_db
+def test_changes_and_deletions_invalidate_the_etag(api_client):
+    first, second, _ = create_perfumes(3)
+    response = api_client.get("/api/perfumes/")
+
+    Perfume.objects.filter(pk=first.pk).delete()
+    assert revalidate(api_client, "/api/perfumes/", response).status_code == 200
+
+    response = api_client.get("/api/perfumes/")
+    second.images.create(image="img/store/new.jpg")
+    assert revalidate(api_client, "/api/perfumes/", response).status_code == 200
+
+
+@pytest.mark.django_db
+def test_perfume_detail_answers_304(api_client):
+    (perfume,) = create_perfumes(1)
+    url = f"/api/perfumes/{perfume.id}/"
+    response = api_client.get(url)
+
+    assert revalidate(api_client, url, response).status_code == 304
+    assert api_client.get(url, HTTP_IF_MODIFIED_SINCE=response["Last-Modified"]).status_code == 304
+
+
+@pytest.mark.django_db
+def test_cart_etag_follows_its_items(api_client):
+    (perfume,) = create_perfumes(1)
+    cart = Cart.objects.create()
+    url = f"/api/carts/{cart.id}/"
+    response = api_client.get(url)
+    assert revalidate(api_client, url, response).status_code == 304
+
+    api_client.post(f"{url}items/", {"perfume_id": perfume.id, "quantity": 1}, format="json")
+
+    changed = revalidate(api_client, url, response)
+    assert changed.status_code == 200
+    assert changed.json()["grand_total"] == perfume.price
+
+    # A new price shows in the cart without touching it
+    perfume.price += 10
+    perfume.save()
+    repriced = revalidate(api_client, url, changed)
+    assert repriced.status_code == 200
+    assert repriced.json()["grand_total"] == perfume.price
+    assert revalidate(api_client, url, repriced).status_code == 304
+
+
+@pytest.mark.django_db
+def test_missing_objects_still_404(api_client):
+    assert api_client.get("/api/carts/00000000-0000-0000-0000-000000000000/").status_code == 404
+    assert api_client.get("/api/perfumes/not-a-uuid/").status_code == 404
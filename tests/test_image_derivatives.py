@@ -0,0 +1,87 @@
+import io
+import pytest
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from PIL import Image
+from shop.models import Perfume, PerfumeImage
+
+
+@pytest.fixture(autouse=True)
+def media_root(settings, tmp_path):
+    settings.MEDIA_ROOT = tmp_path
+    settings.IMAGE_DERIVATIVES_ASYNC = False
+    return tmp_path
+
+
+def photo(name="photo.jpg", size=(1600, 1200)):
+    image = Image.new("RGB", size, "red")
+    exif = Image.Exif()
+    exif[0x010F] = "Camera maker"
+    buffer = io.BytesIO()
+    image.save(buffer, "JPEG", exif=exif)
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type="image/jpeg")
+
+
+@pytest.mark.django_db
+def test_upload_generates_derivatives(api_client, django_capture_on_commit_callbacks, admin_user):
+    api_client.force_authenticate(admin_user)
+    with django_capture_on_commit_callbacks(execute=True):
+        response = api_client.post("/api/perfumes/", {
+            "name": "Oud Wood", "description": "Smoky", "price": 120, "inventory": 3, "uploaded_images": [photo()],
+        }, format="multipart")
+    assert response.status_code == 201
+
+    perfume_image = PerfumeImage.objects.get()
+    assert set(perfume_image.derivatives) == {"thumbnail", "card", "detail"}
+    assert perfume_image.derivatives["card"]["width"] == 400
+
+    with default_storage.open(perfume_image.derivatives["detail"]["jpeg"]) as derivative:
+        image = Image.open(derivative)
+        assert image.size == (1000, 750)
+        assert not image.getexif()
+
+    data = api_client.get(f"/api/perfumes/{perfume_image.perfume_id}/").json()
+    srcset = data["images"][0]["srcset"]
+    assert set(srcset) == {"webp", "jpeg"}
+    assert srcset["webp"].endswith("1000w")
+
+
+@pytest.mark.django_db(transaction=True)
+def test_backfill_command():
+    perfume = Perfume.objects.create(name="Oud Wood")
+    name = default_storage.save("img/store/old.png", photo("old.png", size=(300, 200)))
+    PerfumeImage.objects.create(perfume=perfume, image=name)
+    PerfumeImage.objects.create(perfume=perfume, image="img/store/missing.jpg")
+
+    call_command("backfill_image_derivatives", workers=2, stdout=io.StringIO(), stderr=io.StringIO())
+
+    backfilled = PerfumeImage.objects.get(image=name)
+    # Small images are never upscaled
+    assert backfilled.derivatives["detail"]["width"] == 300
+    assert backfilled.derivatives["thumbnail"]["width"] == 150
+    assert PerfumeImage.objects.get(image="img/store/missing.jpg").derivatives == {}
+
+
+@pytest.mark.django_db(transaction=True)
+def test_forced_backfill_replaces_files_and_cached_responses(api_client, settings, no_response_cache):
+    settings.API_CACHE_ENABLED = True
+    perfume = Perfume.objects.create(name="Oud Wood")
+    name = default_storage.save("img/store/old.png", photo("old.png", size=(300, 200)))
+    PerfumeImage.objects.create(perfume=perfume, image=name)
+    call_command("backfill_image_derivatives", workers=1, stdout=io.StringIO(), stderr=io.StringIO())
+    old = PerfumeImage.objects.get().derivatives["detail"]["jpeg"]
+
+    url = f"/api/perfumes/{perfume.id}/"
+    assert api_client.get(url)["X-Cache"] == "MISS"
+    assert api_client.get(url)["X-Cache"] == "HIT"
+
+    call_command("backfill_image_derivatives", workers=1, force=True, stdout=io.StringIO(), stderr=io.StringIO())
+    new = PerfumeImage.objects.get().derivatives["detail"]["jpeg"]
+
+    assert new != old
+    assert default_storage.exists(new)
+    assert not default_storage.exists(old)
+    response = api_client.get(url)
+    assert response["X-Cache"] == "MISS"
+    assert default_storage.url(new) in response.json()["images"][0]["srcset"]["jpeg"]
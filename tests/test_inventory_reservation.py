@@ -0,0 +1,77 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from django.contrib.auth.models import User
+from django.db import connections
+from rest_framework.test import APIClient
+from order.models import Order, OrderItem
+from shop.models import Cart, Cartitems, Perfume
+
+
+def checkout(user, cart):
+    client = APIClient()
+    client.force_authenticate(user)
+    return client.post('/api/orders/', {'cart_id': str(cart.pk)}, format='json')
+
+
+@pytest.mark.django_db
+def test_checkout_reserves_the_inventory():
+    user = User.objects.create_user('buyer', password='pass')
+    perfume = Perfume.objects.create(name="Oud", price=100, inventory=5)
+    cart = Cart.objects.create()
+    Cartitems.objects.create(cart=cart, perfume=perfume, quantity=3)
+
+    response = checkout(user, cart)
+
+    assert response.status_code == 200
+    perfume.refresh_from_db()
+    assert perfume.inventory == 2
+    assert not Cart.objects.filter(pk=cart.pk).exists()
+
+
+@pytest.mark.django_db
+def test_short_line_rolls_back_the_whole_order():
+    user = User.objects.create_user('buyer', password='pass')
+    in_stock = Perfume.objects.create(name="Oud", price=100, inventory=5)
+    short = Perfume.objects.create(name="Musk", price=80, inventory=1)
+    cart = Cart.objects.create()
+    Cartitems.objects.create(cart=cart, perfume=in_stock, quantity=2)
+    Cartitems.objects.create(cart=cart, perfume=short, quantity=2)
+
+    response = checkout(user, cart)
+
+    assert response.status_code == 400
+    assert 'cart_id' in response.data
+    assert Perfume.objects.get(pk=in_stock.pk).inventory == 5
+    assert Perfume.objects.get(pk=short.pk).inventory == 1
+    assert not Order.objects.exists()
+    assert not OrderItem.objects.exists()
+    assert Cartitems.objects.filter(cart=cart).count() == 2
+
+
+@pytest.mark.django_db(transaction=True)
+def test_parallel_checkouts_never_oversell():
+    stock, buyers = 50, 200
+    perfume = Perfume.objects.create(name="Flash sale", price=100, inventory=stock)
+    users = User.objects.bulk_create([User(username=f'buyer{i}') for i in range(buyers)])
+    carts = Cart.objects.bulk_create([Cart() for _ in range(buyers)])
+    Cartitems.objects.bulk_create([Cartitems(cart=cart, perfume=perfume, quantity=1) for cart in carts])
+
+    def run(args):
+        try:
+            return checkout(*args).status_code
+        finally:
+            connections.close_all()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        statuses = list(executor.map(run, zip(users, carts)))
+    elapsed = time.perf_counter() - started
+
+    assert statuses.count(200) == stock
+    assert statuses.count(400) == buyers - stock
+    assert Perfume.objects.get(pk=perfume.pk).inventory == 0
+    assert Order.objects.count() == stock
+    assert OrderItem.objects.count() == stock
+    # Generous enough for a slow CI box, a lock convoy or retry storm blows well past it
+    assert elapsed < 30
@@ -0,0 +1,134 @@
+import csv
+import io
+import json
+from functools import partial
+from datetime import timedelta
+import pytest
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from api.exporter import export_order_items
+from order.models import Order
+from test_order_history import buyer, client_for, create_orders
+from test_query_plans import full_scans
+
+EXPORT = '/api/orders/export/'
+
+
+@pytest.fixture
+def staff(db):
+    return User.objects.create_user('finance', password='pass', is_staff=True)
+
+
+def export(user, params=None):
+    response = client_for(user).get(EXPORT, params)
+    assert response.status_code == 200, response.content
+    assert response.streaming
+    return b''.join(response.streaming_content).decode()
+
+
+def read_csv(content):
+    return list(csv.DictReader(io.StringIO(content)))
+
+
+def read_jsonl(content):
+    return [json.loads(line) for line in content.splitlines()]
+
+
+def test_orders_export_as_csv_oldest_first(staff, buyer):
+    orders = create_orders(buyer, 5)
+
+    rows = read_csv(export(staff))
+
+    assert [row['id'] for row in rows] == [str(order.pk) for order in reversed(orders)]
+    assert rows[0]['status'] == Order.PENDING
+    assert rows[0]['user_id'] == str(buyer.pk)
+
+
+def test_order_items_export_as_jsonl(staff, buyer):
+    orders = create_orders(buyer, 3, items_per_order=2)
+
+    rows = read_jsonl(export(staff, {'rows': 'items', 'file_format': 'jsonl'}))
+
+    assert len(rows) == 6
+    assert [row['order_id'] for row in rows] == [str(order.pk) for order in reversed(orders) for _ in range(2)]
+    assert set(rows[0]) == {
+        'id', 'order_id', 'order_number', 'order_created_at', 'order_status',
+        'perfume_id', 'perfume_name', 'price', 'quantity',
+    }
+    assert rows[0]['perfume_name'] == "Perfume 0"
+
+
+def test_export_filters_by_date_range_and_status(staff, buyer):
+    orders = create_orders(buyer, 6)  # Created 0 to 5 minutes ago
+    Order.objects.filter(pk=orders[1].pk).update(status=Order.DELIVERED)
+    now = timezone.now()
+
+    params = {'created_after': (now - timedelta(minutes=3, seconds=30)).isoformat(), 'created_before': now.isoformat()}
+    rows = read_csv(export(staff, params))
+    assert {row['id'] for row in rows} == {str(order.pk) for order in orders[:4]}
+
+    rows = read_csv(export(staff, {**params, 'status': Order.DELIVERED}))
+    assert [row['id'] for row in rows] == [str(orders[1].pk)]
+
+    items = read_jsonl(export(staff, {**params, 'status': Order.DELIVERED, 'rows': 'items', 'file_format': 'jsonl'}))
+    assert {item['order_id'] for item in items} == {str(orders[1].pk)}
+
+
+def test_csv_cells_that_look_like_formulas_are_escaped(staff, buyer):
+    order, = create_orders(buyer, 1, items_per_order=1)
+    Order.objects.filter(pk=order.pk).update(
+        first_name='=HYPERLINK("http://evil.example")', last_name='-2+3', address='@SUM(A1)', city='\tLagos', state='Lagos',
+    )
+
+    row, = read_csv(export(staff))
+
+    assert row['first_name'] == '\'=HYPERLINK("http://evil.example")'
+    assert (row['last_name'], row['address'], row['city']) == ("'-2+3", "'@SUM(A1)", "'\tLagos")
+    assert row['state'] == 'Lagos'
+    # JSONL isn't opened in a spreadsheet, the values stay as they are
+    item, = read_jsonl(export(staff, {'file_format': 'jsonl'}))
+    assert item['first_name'] == '=HYPERLINK("http://evil.example")'
+
+
+def test_export_is_staff_only(buyer):
+    assert client_for(buyer).get(EXPORT).status_code == 403
+
+
+@pytest.mark.parametrize('params', [{'file_format': 'xml'}, {'rows': 'payments'}, {'created_after': 'yesterday'}])
+def test_bad_export_parameters_are_rejected(staff, params):
+    assert client_for(staff).get(EXPORT, params).status_code == 400
+
+
+def test_export_reads_the_rows_in_chunks(staff, buyer, monkeypatch):
+    orders = create_orders(buyer, 5, items_per_order=2)
+    # Smaller chunks than the export, the rows still come out in order
+    monkeypatch.setattr('api.views.export_order_items', partial(export_order_items, chunk_size=2))
+    response = client_for(staff).get(EXPORT, {'rows': 'items', 'file_format': 'jsonl'})
+
+    with CaptureQueriesContext(connection) as queries:
+        rows = read_jsonl(b''.join(response.streaming_content).decode())
+
+    # The order ids, then one query per chunk of two orders, never one per row
+    assert len(queries.captured_queries) == 1 + 3
+    assert [row['order_id'] for row in rows] == [str(order.pk) for order in reversed(orders) for _ in range(2)]
+
+
+@pytest.mark.parametrize('rows', ['orders', 'items'])
+def test_export_queries_use_indexes(staff, buyer, rows):
+    create_orders(buyer, 3)
+    response = client_for(staff).get(EXPORT, {'rows': rows, 'status': Order.PENDING})
+
+    with CaptureQueriesContext(connection) as queries:
+        b''.join(response.streaming_content)
+
+    # The order ids, then the items of each chunk of orders
+    assert len(queries.captured_queries) == (1 if rows == 'orders' else 2)
+    for query in queries.captured_queries:
+        assert not full_scans(query['sql'])
+        if connection.vendor == 'sqlite':
+            # Nor a sort of the whole export before its first row
+            with connection.cursor() as cursor:
+                cursor.execute(f"EXPLAIN QUERY PLAN {query['sql']}")
+                assert not [detail for *_, detail in cursor.fetchall() if 'TEMP B-TREE' in detail]
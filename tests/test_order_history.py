@@ -0,0 +1,95 @@
+from datetime import timedelta
+import pytest
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from order.models import Order, OrderItem
+from shop.models import Perfume
+
+
+@pytest.fixture
+def buyer(db):
+    return User.objects.create_user('buyer', password='pass')
+
+
+def create_orders(user, count, items_per_order=3, status=Order.PENDING):
+    perfumes = Perfume.objects.bulk_create([Perfume(name=f"Perfume {i}", price=10 + i) for i in range(items_per_order)])
+    now = timezone.now()
+    orders = Order.objects.bulk_create([Order(user=user, status=status) for _ in range(count)])
+    OrderItem.objects.bulk_create([
+        OrderItem(order=order, perfume=perfume, price=perfume.price, quantity=1)
+        for order in orders
+        for perfume in perfumes
+    ])
+    # auto_now_add stamps them all at once, spread them out so the order is known
+    for i, order in enumerate(orders):
+        Order.objects.filter(pk=order.pk).update(created_at=now - timedelta(minutes=i))
+    return orders
+
+
+def client_for(user):
+    client = APIClient()
+    client.force_authenticate(user)
+    return client
+
+
+def count_list_queries(client):
+    with CaptureQueriesContext(connection) as queries:
+        response = client.get('/api/orders/')
+    assert response.status_code == 200
+    return len(queries)
+
+
+def test_list_queries_dont_grow_with_orders_or_items(buyer):
+    client = client_for(buyer)
+    create_orders(buyer, 2, items_per_order=1)
+    few = count_list_queries(client)
+
+    create_orders(buyer, 7, items_per_order=5)
+    assert count_list_queries(client) == few == 2
+
+
+def test_list_doesnt_write(buyer):
+    create_orders(buyer, 1)
+    users = User.objects.count()
+
+    response = client_for(buyer).get('/api/orders/')
+
+    assert response.status_code == 200
+    assert User.objects.count() == users
+
+
+def test_users_only_see_their_orders(buyer):
+    other = User.objects.create_user('other', password='pass')
+    mine = create_orders(buyer, 2)
+    create_orders(other, 3)
+
+    response = client_for(buyer).get('/api/orders/')
+
+    assert {order['id'] for order in response.data['results']} == {str(order.pk) for order in mine}
+
+
+def test_cursor_pages_walk_the_history_newest_first(buyer):
+    orders = create_orders(buyer, 20, items_per_order=1)
+    client = client_for(buyer)
+
+    seen, url = [], '/api/orders/'
+    while url:
+        response = client.get(url)
+        assert 'count' not in response.data
+        seen += [order['id'] for order in response.data['results']]
+        url = response.data['next']
+
+    assert seen == [str(order.pk) for order in orders]
+
+
+def test_staff_filter_on_status(buyer):
+    staff = User.objects.create_user('staff', password='pass', is_staff=True)
+    create_orders(buyer, 2, status=Order.PENDING)
+    shipped = create_orders(buyer, 3, status=Order.SHIPPED)
+
+    response = client_for(staff).get('/api/orders/', {'status': Order.SHIPPED})
+
+    assert {order['id'] for order in response.data['results']} == {str(order.pk) for order in shipped}
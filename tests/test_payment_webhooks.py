@@ -0,0 +1,163 @@
+import hashlib
+import hmac
+import io
+import json
+import time
+import pytest
+import requests
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from order.models import Order, OrderItem, PaymentAttempt, PaymentEvent
+from order.payments import process_events
+from api.paystack_stub import PaystackStubServer
+from shop.models import Perfume
+
+SECRET_KEY = 'sk_test_stub'
+
+
+@pytest.fixture(autouse=True)
+def paystack_key(settings):
+    settings.PAYSTACK_SECRET_KEY = SECRET_KEY
+
+
+@pytest.fixture
+def order(db):
+    user = User.objects.create_user('buyer', password='pass')
+    return Order.objects.create(user=user, email='buyer@example.com', reference='ref-1', total_amount=10)
+
+
+def post_event(client, payload, secret_key=SECRET_KEY):
+    body = json.dumps(payload).encode()
+    signature = hmac.new(secret_key.encode(), body, hashlib.sha512).hexdigest()
+    return client.post(
+        '/api/paystack-webhook/', body, content_type='application/json', HTTP_X_PAYSTACK_SIGNATURE=signature,
+    )
+
+
+def charge_success(reference, transaction_id=1, amount=1000, currency='NGN'):
+    return {'event': 'charge.success', 'data': {
+        'id': transaction_id, 'reference': reference, 'status': 'success', 'amount': amount, 'currency': currency,
+    }}
+
+
+def test_webhook_rejects_bad_signatures(client, order):
+    response = post_event(client, charge_success('ref-1'), secret_key='sk_wrong')
+
+    assert response.status_code == 401
+    assert not PaymentEvent.objects.exists()
+
+
+def test_webhook_only_queues_the_event(client, order, django_assert_max_num_queries):
+    with django_assert_max_num_queries(1):
+        response = post_event(client, charge_success('ref-1'))
+
+    assert response.status_code == 200
+    assert PaymentEvent.objects.get().reference == 'ref-1'
+    order.refresh_from_db()
+    assert not order.is_completed
+
+
+def test_redelivered_events_are_queued_once(client, order):
+    post_event(client, charge_success('ref-1'))
+    post_event(client, charge_success('ref-1'))
+
+    assert PaymentEvent.objects.count() == 1
+
+
+def test_processing_completes_the_order_once(client, order):
+    post_event(client, charge_success('ref-1'))
+    post_event(client, charge_success('unknown-ref', transaction_id=2))
+    post_event(client, {'event': 'transfer.success', 'data': {'id': 3, 'reference': 'ref-1'}})
+
+    call_command('process_payment_events', batch_size=2, stdout=io.StringIO())
+
+    order.refresh_from_db()
+    assert order.is_completed
+    assert order.status == Order.PROCESSING
+    assert not PaymentEvent.objects.filter(processed_at__isnull=True).exists()
+    assert PaymentEvent.objects.get(reference='unknown-ref').error
+
+    # A later event of the same payment doesn't touch the order again
+    updated_at = order.updated_at
+    post_event(client, charge_success('ref-1', transaction_id=4))
+    assert process_events() == 1
+    order.refresh_from_db()
+    assert order.updated_at == updated_at
+
+
+def test_callback_page_reads_the_order_state(client, order):
+    response = client.get('/api/paystack-callback/', {'reference': 'ref-1'})
+    assert response.status_code == 200
+    assert b'Confirming your payment' in response.content
+
+    Order.objects.filter(pk=order.pk).update(is_completed=True)
+    response = client.get('/api/paystack-callback/', {'reference': 'ref-1'})
+    assert b'Payment successful' in response.content
+
+    assert client.get('/api/paystack-callback/', {'reference': 'nope'}).status_code == 404
+
+
+@pytest.mark.django_db(transaction=True)
+def test_stub_payment_reaches_the_order(live_server):
+    user = User.objects.create_user('buyer', password='pass')
+    order = Order.objects.create(user=user, email='buyer@example.com', reference='ref-live', total_amount=10)
+
+    with PaystackStubServer(secret_key=SECRET_KEY, webhook_url=f'{live_server.url}/api/paystack-webhook/') as stub:
+        stub.create_transaction({'reference': 'ref-live', 'amount': 1000, 'email': 'buyer@example.com'})
+        requests.get(f"{stub.url}/checkout/{stub.transactions['ref-live']['access_code']}", allow_redirects=False)
+
+        deadline = time.monotonic() + 10
+        while not PaymentEvent.objects.exists() and time.monotonic() < deadline:
+            time.sleep(0.05)
+
+    process_events()
+    order.refresh_from_db()
+    assert order.is_completed
+
+
+def test_earlier_attempts_and_metadata_find_the_order(client, order):
+    earlier = Order.objects.create(user=order.user, email='buyer@example.com', reference='ref-3', total_amount=10)
+    PaymentAttempt.objects.create(order=earlier, reference='ref-2')
+    legacy = Order.objects.create(user=order.user, email='buyer@example.com', reference='ref-5', total_amount=10)
+    # Paid from a tab left open on an earlier attempt
+    post_event(client, charge_success('ref-2'))
+    # An attempt from before the attempts table, only the metadata knows the order
+    payload = charge_success('ref-4', transaction_id=2)
+    payload['data']['metadata'] = {'order_id': str(legacy.pk)}
+    post_event(client, payload)
+
+    assert process_events() == 2
+
+    assert Order.objects.get(pk=earlier.pk).is_completed
+    assert Order.objects.get(pk=legacy.pk).is_completed
+    assert not Order.objects.get(pk=order.pk).is_completed
+    assert not PaymentEvent.objects.exclude(error='').exists()
+
+
+def test_payments_must_cover_the_order(client, order):
+    other = Order.objects.create(user=order.user, email='buyer@example.com', reference='ref-6', total_amount=10)
+    # One kobo paid on an order of one's own, naming someone else's in the metadata
+    payload = charge_success('ref-7', amount=1)
+    payload['data']['metadata'] = {'order_id': str(other.pk)}
+    post_event(client, payload)
+    post_event(client, charge_success('ref-1', transaction_id=2, currency='USD'))
+
+    assert process_events() == 2
+
+    assert not Order.objects.filter(is_completed=True).exists()
+    assert PaymentEvent.objects.get(reference='ref-7').error == 'Paid 1 NGN, the order is 1000 NGN'
+    assert PaymentEvent.objects.get(reference='ref-1').error == 'Paid 1000 USD, the order is 1000 NGN'
+
+
+def test_payments_dont_revive_cancelled_orders(client, order):
+    # No total stored, the items make it up
+    OrderItem.objects.create(order=order, perfume=Perfume.objects.create(name='Oud'), price=2.5, quantity=4)
+    Order.objects.filter(pk=order.pk).update(total_amount=None, is_cancelled=True)
+    post_event(client, charge_success('ref-1'))
+
+    assert process_events() == 1
+
+    order.refresh_from_db()
+    assert not order.is_completed
+    assert order.status != Order.PROCESSING
+    assert PaymentEvent.objects.get().error == 'The order is cancelled'
@@ -0,0 +1,158 @@
+import time
+from urllib.parse import urlsplit
+import pytest
+import requests
+from django.contrib.auth.models import User
+from rest_framework.test import APIClient
+from api.payments import CircuitBreaker, PaystackClient, PaystackError, PaystackUnavailable, get_paystack_client
+from api.paystack_stub import PaystackStubServer
+from order.models import Order, OrderItem
+from shop.models import Perfume
+
+
+@pytest.fixture
+def stub():
+    with PaystackStubServer() as server:
+        yield server
+
+
+def make_client(stub, **kwargs):
+    kwargs.setdefault('backoff_factor', 0)
+    return PaystackClient('sk_test_stub', base_url=stub.url, **kwargs)
+
+
+def test_initialize_and_verify_reuse_one_connection(stub):
+    client = make_client(stub)
+
+    transaction = client.initialize_transaction('buyer@example.com', 150000, 'ref-1', metadata={'order_id': 'abc'})
+    assert transaction['reference'] == 'ref-1'
+    assert client.verify_transaction('ref-1')['status'] == 'abandoned'
+
+    # The customer pays on the checkout page
+    requests.get(transaction['authorization_url'], allow_redirects=False)
+    payment = client.verify_transaction('ref-1')
+    assert payment['status'] == 'success'
+    assert payment['metadata'] == {'order_id': 'abc'}
+
+    assert stub.counters['requests'] == 3
+    # The checkout page visit opened the other connection
+    assert stub.counters['connections'] == 2
+
+
+def test_rejections_raise_without_retrying(stub):
+    client = make_client(stub)
+    client.initialize_transaction('buyer@example.com', 1000, 'ref-1')
+
+    with pytest.raises(PaystackError) as error:
+        client.initialize_transaction('buyer@example.com', 1000, 'ref-1')
+    assert not isinstance(error.value, PaystackUnavailable)
+    assert 'Duplicate' in str(error.value)
+    assert stub.counters['requests'] == 2
+
+
+def test_gets_are_retried_on_server_errors(stub):
+    client = make_client(stub, max_retries=2)
+    client.initialize_transaction('buyer@example.com', 1000, 'ref-1')
+
+    stub.fail(503, 502)
+    assert client.verify_transaction('ref-1')['reference'] == 'ref-1'
+    assert stub.counters['requests'] == 4
+
+
+def test_posts_are_not_retried_once_sent(stub):
+    client = make_client(stub, max_retries=2)
+
+    stub.fail(503)
+    with pytest.raises(PaystackUnavailable):
+        client.initialize_transaction('buyer@example.com', 1000, 'ref-1')
+    assert stub.counters['requests'] == 1
+
+
+def test_slow_answers_time_out(stub):
+    client = make_client(stub, read_timeout=0.05)
+    stub.latency = 0.5
+
+    started = time.perf_counter()
+    with pytest.raises(PaystackUnavailable):
+        client.verify_transaction('ref-1')
+    assert time.perf_counter() - started < 0.4
+
+
+def test_breaker_opens_and_recovers(stub):
+    now = [0.0]
+    breaker = CircuitBreaker(threshold=2, reset_timeout=10, clock=lambda: now[0])
+    client = make_client(stub, max_retries=0, breaker=breaker)
+    client.initialize_transaction('buyer@example.com', 1000, 'ref-1')
+
+    stub.fail(500, 500)
+    for _ in range(2):
+        with pytest.raises(PaystackUnavailable):
+            client.verify_transaction('ref-1')
+    assert breaker.state == CircuitBreaker.OPEN
+
+    # Rejected without calling Paystack
+    requests_before = stub.counters['requests']
+    with pytest.raises(PaystackUnavailable):
+        client.verify_transaction('ref-1')
+    assert stub.counters['requests'] == requests_before
+
+    now[0] += 10
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    client.verify_transaction('ref-1')
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+@pytest.mark.django_db
+def test_initiate_payment_redirects_to_checkout(stub, settings):
+    settings.PAYSTACK_SECRET_KEY = 'sk_test_stub'
+    settings.PAYSTACK_BASE_URL = stub.url
+    get_paystack_client.cache_clear()
+
+    user = User.objects.create_user('admin', email='admin@example.com', password='pass', is_staff=True)
+    perfume = Perfume.objects.create(name="Oud", price=120)
+    order = Order.objects.create(user=user, email='buyer@example.com')
+    OrderItem.objects.create(order=order, perfume=perfume, price=120, quantity=2)
+
+    client = APIClient()
+    client.force_authenticate(user)
+    try:
+        response = client.get(f'/api/orders/{order.pk}/initiate-payment/')
+    finally:
+        get_paystack_client.cache_clear()
+
+    assert response.status_code == 302
+    order.refresh_from_db()
+    transaction = stub.transactions[order.reference]
+    assert transaction['amount'] == 24000
+    assert transaction['metadata'] == {'order_id': str(order.pk)}
+    assert response['Location'].endswith(f"/checkout/{transaction['access_code']}")
+    assert urlsplit(transaction['callback_url']).path == '/api/paystack-callback/'
+
+
+@pytest.mark.django_db
+def test_every_payment_attempt_keeps_its_reference(stub, settings):
+    settings.PAYSTACK_SECRET_KEY = 'sk_test_stub'
+    settings.PAYSTACK_BASE_URL = stub.url
+    get_paystack_client.cache_clear()
+
+    user = User.objects.create_user('buyer', email='buyer@example.com', password='pass')
+    order = Order.objects.create(user=user, email='buyer@example.com', total_amount=50)
+    client = APIClient()
+    client.force_authenticate(user)
+    try:
+        assert client.get(f'/api/orders/{order.pk}/initiate-payment/').status_code == 302
+        assert client.get(f'/api/orders/{order.pk}/initiate-payment/').status_code == 302
+        first, second = order.payment_attempts.order_by('id').values_list('reference', flat=True)
+
+        order.refresh_from_db()
+        assert order.reference == second != first
+        # The customer comes back from the first attempt's checkout page
+        assert client.get('/api/paystack-callback/', {'reference': first}).status_code == 200
+
+        Order.objects.filter(pk=order.pk).update(is_completed=True)
+        response = client.get(f'/api/orders/{order.pk}/initiate-payment/')
+    finally:
+        get_paystack_client.cache_clear()
+
+    assert response.status_code == 400
+    assert order.payment_attempts.count() == 2
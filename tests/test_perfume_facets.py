@@ -0,0 +1,98 @@
+import pytest
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from api.search import get_search_backend
+from shop.models import Category, Perfume
+from conftest import create_perfumes
+
+
+@pytest.fixture
+def catalog(db):
+    woody = Category.objects.create(title="Woody", slug="woody", gender="M")
+    floral = Category.objects.create(title="Floral", slug="floral", gender="F")
+    fresh = Category.objects.create(title="Fresh", slug="fresh", gender="F")
+    # Prices 10, 30, 50, 70 and 90 in each category, one uncategorized perfume at 600
+    for category, count in ((woody, 5), (floral, 3), (fresh, 2)):
+        perfumes = create_perfumes(count, category=category, price=10)
+        for i, perfume in enumerate(perfumes):
+            Perfume.objects.filter(pk=perfume.pk).update(price=10 + 20 * i, name=f"{category.title} {i}")
+    Perfume.objects.filter(name="Woody 0").update(top_deal=True, discount=True)
+    Perfume.objects.filter(name="Floral 1").update(discount=True, flash_sales=True)
+    create_perfumes(1, price=600)
+    # update() skips the signals that keep the search index up to date
+    if get_search_backend() is not None:
+        get_search_backend().index(Perfume.objects.all())
+    return {'woody': woody, 'floral': floral, 'fresh': fresh}
+
+
+def facets(client, params=None):
+    response = client.get('/api/perfumes/', {'facets': 'true', **(params or {})})
+    assert response.status_code == 200, response.content
+    return response.json()['facets']
+
+
+def test_facets_count_the_whole_result_set(api_client, catalog):
+    result = facets(api_client)
+
+    assert result['category'] == [
+        {'value': str(catalog['woody'].pk), 'title': "Woody", 'count': 5},
+        {'value': str(catalog['floral'].pk), 'title': "Floral", 'count': 3},
+        {'value': str(catalog['fresh'].pk), 'title': "Fresh", 'count': 2},
+    ]
+    assert result['gender'] == [{'value': 'F', 'count': 5}, {'value': 'M', 'count': 5}]
+    assert [bucket['count'] for bucket in result['price']] == [3, 3, 4, 0, 0, 1]
+    assert result['price'][0] == {'min': None, 'max': 25, 'count': 3}
+    assert result['price'][-1] == {'min': 500, 'max': None, 'count': 1}
+    assert result['flags'] == {'discount': 2, 'top_deal': 1, 'flash_sales': 1}
+
+
+def test_facets_follow_the_filters_and_search(api_client, catalog):
+    result = facets(api_client, {'price__lt': 60, 'discount': True})
+    assert [facet['title'] for facet in result['category']] == ["Floral", "Woody"]
+    assert result['flags'] == {'discount': 2, 'top_deal': 1, 'flash_sales': 1}
+
+    result = facets(api_client, {'search': 'floral'})
+    assert [(facet['title'], facet['count']) for facet in result['category']] == [("Floral", 3)]
+    assert sum(bucket['count'] for bucket in result['price']) == 3
+
+
+def count_queries(client, params):
+    with CaptureQueriesContext(connection) as context:
+        assert client.get('/api/perfumes/', params).status_code == 200
+    return len(context.captured_queries)
+
+
+def test_facets_are_two_queries(api_client, catalog):
+    params = {'category': catalog['woody'].pk, 'price__gt': 20}
+
+    # The grouped counts, then the categories found, plus the categories' part of the ETag
+    assert count_queries(api_client, {**params, 'facets': 'true'}) == count_queries(api_client, params) + 3
+
+
+def test_facets_are_only_added_on_request(api_client, catalog):
+    assert 'facets' not in api_client.get('/api/perfumes/').json()
+    assert 'facets' not in api_client.get('/api/perfumes/', {'facets': 'false'}).json()
+    assert api_client.get('/api/perfumes/', {'facets': 'maybe'}).status_code == 400
+
+
+def test_facets_are_cached_per_filter_combination(api_client, catalog, settings):
+    settings.API_CACHE_ENABLED = True
+    cache.clear()
+
+    assert api_client.get('/api/perfumes/', {'facets': 'true'})['X-Cache'] == 'MISS'
+    assert api_client.get('/api/perfumes/', {'facets': 'true'})['X-Cache'] == 'HIT'
+    response = api_client.get('/api/perfumes/', {'facets': 'true', 'top_deal': True})
+    assert response['X-Cache'] == 'MISS'
+    assert response.json()['facets']['flags']['top_deal'] == 1
+
+
+def test_renamed_categories_refresh_the_facets(api_client, catalog):
+    response = api_client.get('/api/perfumes/', {'facets': 'true'})
+    catalog['woody'].title = "Woods"
+    catalog['woody'].save()
+
+    response = api_client.get('/api/perfumes/', {'facets': 'true'}, HTTP_IF_NONE_MATCH=response['ETag'])
+    assert response.status_code == 200
+    assert 'Woods' in [facet['title'] for facet in response.json()['facets']['category']]
+    assert api_client.get('/api/perfumes/', {'facets': 'true'}, HTTP_IF_NONE_MATCH=response['ETag']).status_code == 304
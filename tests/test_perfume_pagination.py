@@ -0,0 +1,96 @@
+import base64
+import json
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from shop.models import Perfume
+from conftest import create_perfumes
+
+ENDPOINT = "/api/perfumes/"
+
+
+def walk_pages(client, url):
+    pages = []
+    while url:
+        response = client.get(url)
+        assert response.status_code == 200
+        data = response.json()
+        pages.append(data)
+        url = data["next"]
+    return pages
+
+
+@pytest.fixture
+def tied_perfumes(db):
+    # Lots of equal prices so the id has to break the ties
+    perfumes = []
+    for price in (10.0, 20.0, 30.0):
+        perfumes += create_perfumes(7, price=price)
+    Perfume.objects.update(price=10.0)
+    Perfume.objects.filter(pk__in=[perfume.pk for perfume in perfumes[:5]]).update(price=5.0)
+    return perfumes
+
+
+@pytest.mark.django_db
+def test_cursor_pages_cover_every_perfume_once(api_client, tied_perfumes):
+    pages = walk_pages(api_client, ENDPOINT + "?pagination=cursor")
+
+    ids = [perfume["id"] for page in pages for perfume in page["results"]]
+    assert len(ids) == len(set(ids)) == len(tied_perfumes)
+    assert [len(page["results"]) for page in pages] == [9, 9, 3]
+    assert "count" not in pages[0]
+
+    prices = [perfume["price"] for page in pages for perfume in page["results"]]
+    assert prices == sorted(prices)
+
+
+@pytest.mark.django_db
+def test_cursor_pages_follow_ordering_and_filters(api_client, category):
+    create_perfumes(12, category=category)
+    create_perfumes(5)
+
+    pages = walk_pages(api_client, f"{ENDPOINT}?pagination=cursor&ordering=-price&category={category.pk}")
+
+    prices = [perfume["price"] for page in pages for perfume in page["results"]]
+    assert prices == sorted(prices, reverse=True)
+    assert len(prices) == 12
+
+
+@pytest.mark.django_db
+def test_previous_link_returns_the_same_page(api_client, tied_perfumes):
+    first = api_client.get(ENDPOINT + "?pagination=cursor").json()
+    second = api_client.get(first["next"]).json()
+
+    assert first["previous"] is None
+    back = api_client.get(second["previous"]).json()
+    assert back["results"] == first["results"]
+
+
+@pytest.mark.django_db
+def test_cursor_pages_skip_the_count(api_client, tied_perfumes):
+    first = api_client.get(ENDPOINT + "?pagination=cursor").json()
+
+    with CaptureQueriesContext(connection) as context:
+        api_client.get(first["next"])
+
+    # The paginator's total count, not the aggregate behind the ETag
+    assert not any('"__count"' in query["sql"] for query in context.captured_queries)
+
+
+def tampered_cursor(position):
+    return base64.urlsafe_b64encode(json.dumps({"p": position, "r": 0}).encode()).decode()
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("position", [["abc", "x"], [1.0, "not-a-uuid"], [None, None]])
+def test_invalid_cursor(api_client, position):
+    assert api_client.get(ENDPOINT + "?cursor=garbage").status_code == 404
+
+    response = api_client.get(ENDPOINT, {"cursor": tampered_cursor(position)})
+    assert (response.status_code, response.json()) == (404, {"detail": "Invalid cursor"})
+
+
+@pytest.mark.django_db
+def test_page_numbers_are_still_the_default(api_client, tied_perfumes):
+    data = api_client.get(ENDPOINT).json()
+    assert data["count"] == len(tied_perfumes)
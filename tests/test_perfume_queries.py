@@ -0,0 +1,35 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from conftest import create_perfumes
+
+ENDPOINT = "/api/perfumes/"
+
+
+def count_queries(client, url):
+    with CaptureQueriesContext(connection) as context:
+        response = client.get(url)
+    assert response.status_code == 200
+    return len(context.captured_queries)
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("url", [ENDPOINT, ENDPOINT + "?search=perfume", ENDPOINT + "?price__gt=10"])
+def test_perfume_list_query_count_is_flat(api_client, category, url):
+    create_perfumes(2, images_per_perfume=1, category=category)
+    small_page = count_queries(api_client, url)
+
+    # A full page where every perfume carries several images
+    create_perfumes(7, images_per_perfume=4, category=category, price=80.0)
+    full_page = count_queries(api_client, url)
+
+    assert small_page == full_page
+
+
+@pytest.mark.django_db
+def test_perfume_detail_query_count_is_flat(api_client, category):
+    (few_images,) = create_perfumes(1, images_per_perfume=1, category=category)
+    (many_images,) = create_perfumes(1, images_per_perfume=6, category=category)
+
+    assert count_queries(api_client, f"{ENDPOINT}{few_images.id}/") == \
+        count_queries(api_client, f"{ENDPOINT}{many_images.id}/")
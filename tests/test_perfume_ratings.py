@@ -0,0 +1,138 @@
+from concurrent.futures import ThreadPoolExecutor
+from io import StringIO
+import pytest
+from django.core.management import call_command
+from django.db import connections
+from rest_framework.test import APIClient
+from shop.models import Perfume, Review
+from conftest import create_perfumes
+
+
+def post_review(perfume, rating=None):
+    data = {'description': "Lovely", 'customer_name': "Ada"}
+    if rating is not None:
+        data['rating'] = rating
+    return APIClient().post(f'/api/perfumes/{perfume.pk}/reviews/', data)
+
+
+def counters(perfume):
+    perfume = Perfume.objects.get(pk=perfume.pk)
+    return perfume.review_count, perfume.rating_count, round(perfume.rating_avg, 6)
+
+
+def rebuild(*args):
+    out = StringIO()
+    call_command('rebuild_ratings', *args, stdout=out)
+    return out.getvalue()
+
+
+@pytest.mark.django_db
+def test_creating_reviews_updates_the_counters():
+    perfume, other = create_perfumes(2)
+    before = Perfume.objects.get(pk=perfume.pk).updated_at
+
+    for rating in (5, 4, None, 2):
+        assert post_review(perfume, rating).status_code == 201
+
+    assert counters(perfume) == (4, 3, round(11 / 3, 6))
+    assert counters(other) == (0, 0, 0)
+    # The perfume changed, its ETag has to change too
+    assert Perfume.objects.get(pk=perfume.pk).updated_at > before
+
+    response = APIClient().get(f'/api/perfumes/{perfume.pk}/')
+    assert response.data['review_count'] == 4
+    assert response.data['rating_avg'] == pytest.approx(11 / 3)
+
+
+@pytest.mark.django_db
+def test_rating_out_of_range_is_rejected():
+    perfume = create_perfumes(1)[0]
+
+    response = post_review(perfume, 6)
+
+    assert response.status_code == 400
+    assert 'rating' in response.data
+    assert counters(perfume) == (0, 0, 0)
+
+
+@pytest.mark.django_db
+def test_changing_a_rating_moves_the_average():
+    perfume = create_perfumes(1)[0]
+    review_id = post_review(perfume, 2).data['id']
+    post_review(perfume, 4)
+    url = f'/api/perfumes/{perfume.pk}/reviews/{review_id}/'
+
+    assert APIClient().patch(url, {'rating': 5}).status_code == 200
+    assert counters(perfume) == (2, 2, 4.5)
+
+    # Saving again without a change leaves the counters alone
+    assert APIClient().patch(url, {'description': "Still lovely"}).status_code == 200
+    assert counters(perfume) == (2, 2, 4.5)
+
+    assert APIClient().patch(url, {'rating': None}, format='json').status_code == 200
+    assert counters(perfume) == (2, 1, 4)
+
+
+@pytest.mark.django_db
+def test_deleting_reviews_updates_the_counters():
+    perfume = create_perfumes(1)[0]
+    first = Review.objects.create(perfume=perfume, customer_name="Ada", rating=3)
+    Review.objects.create(perfume=perfume, customer_name="Bola", rating=5)
+    Review.objects.create(perfume=perfume, customer_name="Chi")
+
+    first.delete()
+    assert counters(perfume) == (2, 1, 5)
+
+    # Queryset deletes go through the same receiver
+    Review.objects.filter(perfume=perfume).delete()
+    assert counters(perfume) == (0, 0, 0)
+
+
+@pytest.mark.django_db(transaction=True)
+def test_parallel_reviews_are_all_counted():
+    perfume = create_perfumes(1)[0]
+    ratings = [1, 2, 3, 4, 5] * 20
+
+    def run(rating):
+        try:
+            return post_review(perfume, rating).status_code
+        finally:
+            connections.close_all()
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        statuses = list(executor.map(run, ratings))
+
+    assert statuses == [201] * len(ratings)
+    assert counters(perfume) == (100, 100, 3)
+
+
+@pytest.mark.django_db
+def test_rebuild_fixes_the_counters_of_bulk_created_reviews():
+    perfumes = create_perfumes(5)
+    Review.objects.bulk_create([
+        Review(perfume=perfume, customer_name="Ada", rating=rating)
+        for perfume in perfumes[:3]
+        for rating in (1, 4, None)
+    ])
+    # A counter that drifted the other way
+    Perfume.objects.filter(pk=perfumes[4].pk).update(review_count=7, rating_count=2, rating_avg=3.5)
+
+    output = rebuild('--chunk-size', '2')
+
+    assert "Checked 5 perfumes and fixed 4" in output
+    assert [counters(perfume) for perfume in perfumes] == [(3, 2, 2.5)] * 3 + [(0, 0, 0)] * 2
+    assert "fixed 0" in rebuild()
+
+
+@pytest.mark.django_db
+def test_perfumes_can_be_ordered_and_filtered_by_rating():
+    perfumes = create_perfumes(4)
+    for perfume, rating in zip(perfumes, (3, 5, 1, 4)):
+        Review.objects.create(perfume=perfume, customer_name="Ada", rating=rating)
+
+    response = APIClient().get('/api/perfumes/', {'ordering': '-rating_avg', 'rating_avg__gte': 3})
+
+    assert [row['rating_avg'] for row in response.data['results']] == [5, 4, 3]
+
+    response = APIClient().get('/api/perfumes/', {'ordering': '-rating_avg', 'pagination': 'cursor'})
+    assert [row['rating_avg'] for row in response.data['results']] == [5, 4, 3, 1]
@@ -0,0 +1,80 @@
+import pytest
+from django.db import connection
+from django.db.models import Count
+from django.test.utils import CaptureQueriesContext
+from api.search import get_search_backend
+from shop.models import Perfume
+
+ENDPOINT = "/api/perfumes/"
+
+
+def search(client, query, **params):
+    response = client.get(ENDPOINT, {"search": query, **params})
+    assert response.status_code == 200
+    return [perfume["name"] for perfume in response.json()["results"]]
+
+
+@pytest.fixture
+def catalog(category):
+    return [
+        Perfume.objects.create(name="Oud Wood", description="Smoky and dark", price=120.0, category=category),
+        Perfume.objects.create(name="Citrus Splash", description="Fresh with a hint of oud", price=40.0),
+        Perfume.objects.create(name="Lavender Fields", description="Calm and floral", price=60.0, category=category),
+    ]
+
+
+@pytest.mark.django_db
+def test_search_is_ranked_by_relevance(api_client, catalog):
+    # A match in the name outranks a match in the description, whatever the price
+    assert search(api_client, "oud") == ["Oud Wood", "Citrus Splash"]
+
+
+@pytest.mark.django_db
+def test_search_matches_word_prefixes(api_client, catalog):
+    assert search(api_client, "laven") == ["Lavender Fields"]
+    assert search(api_client, "calm floral") == ["Lavender Fields"]
+    assert search(api_client, "calm smoky") == []
+
+
+@pytest.mark.django_db
+def test_search_combines_with_filters(api_client, catalog, category):
+    assert search(api_client, "oud", category=category.pk) == ["Oud Wood"]
+    assert search(api_client, "oud", price__lt=100) == ["Citrus Splash"]
+
+
+@pytest.mark.django_db
+def test_index_follows_saves_and_deletes(api_client, catalog):
+    oud, citrus, lavender = catalog
+    lavender.name = "Vanilla Dream"
+    lavender.save()
+    oud.delete()
+
+    assert search(api_client, "lavender") == []
+    assert search(api_client, "vanilla") == ["Vanilla Dream"]
+    assert search(api_client, "oud") == ["Citrus Splash"]
+
+
+@pytest.mark.django_db
+def test_search_ignores_query_syntax(api_client, catalog):
+    assert search(api_client, 'oud*"(') == ["Oud Wood", "Citrus Splash"]
+
+
+@pytest.mark.django_db
+@pytest.mark.skipif(connection.vendor != "sqlite", reason="SQLite FTS5 backend")
+def test_search_does_not_scan_with_like(api_client, catalog):
+    with CaptureQueriesContext(connection) as context:
+        search(api_client, "oud")
+
+    assert not any(" LIKE " in query["sql"] for query in context.captured_queries)
+
+
+@pytest.mark.django_db
+def test_search_combines_with_values_and_grouping(catalog, category):
+    backend = get_search_backend()
+    if backend is None:
+        pytest.skip("No full-text index")
+    results = backend.search(Perfume.objects.all(), "oud")
+
+    assert list(results.values_list("name", flat=True)) == ["Oud Wood", "Citrus Splash"]
+    grouped = results.order_by().values("category").annotate(total=Count("*"))
+    assert sorted((row["category"] == category.pk, row["total"]) for row in grouped) == [(False, 1), (True, 1)]
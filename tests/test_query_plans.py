@@ -0,0 +1,123 @@
+import re
+import pytest
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from order.models import Order, OrderItem
+from shop.models import Cart, Cartitems, Category, Perfume, Review
+from conftest import create_perfumes
+
+# Runs every SELECT an endpoint makes through EXPLAIN and fails on a full table scan.
+# Postgres is told to avoid sequential scans, so its plans show whether an index *can*
+# serve the query rather than what it picks for a few test rows.
+SQLITE_FULL_SCAN = re.compile(r'^SCAN (?P<table>[\w"]+)(?: AS \w+)?$')
+
+
+def full_scans(sql):
+    with transaction.atomic(), connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}')
+            return list(postgres_seq_scans(cursor.fetchone()[0][0]['Plan']))
+        if connection.vendor == 'sqlite':
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            return [
+                match['table'] for *_, detail in cursor.fetchall()
+                if (match := SQLITE_FULL_SCAN.match(detail))
+            ]
+    pytest.skip(f"No query plan checks for {connection.vendor}")
+
+
+def postgres_seq_scans(plan):
+    if plan['Node Type'] == 'Seq Scan':
+        yield plan['Relation Name']
+    for child in plan.get('Plans', []):
+        yield from postgres_seq_scans(child)
+
+
+def assert_no_full_scans(request):
+    with CaptureQueriesContext(connection) as queries:
+        response = request()
+    assert response.status_code < 400, response.content
+
+    # The SELECTs, and the INSERT .. SELECTs like the add-to-cart upsert
+    selects = [
+        query['sql'] for query in queries.captured_queries
+        if query['sql'].lstrip().upper().startswith(('SELECT', 'INSERT')) and 'SELECT' in query['sql'].upper()
+    ]
+    assert selects
+    offenders = [(sql, tables) for sql in selects if (tables := full_scans(sql))]
+    assert not offenders, '\n\n'.join(f'Full scan of {", ".join(tables)}:\n{sql}' for sql, tables in offenders)
+
+
+@pytest.fixture
+def shop(db):
+    category = Category.objects.create(title="Woody", slug="woody")
+    perfumes = create_perfumes(5, images_per_perfume=1, category=category)
+    Perfume.objects.filter(pk=perfumes[0].pk).update(top_deal=True, flash_sales=True, discount=True, name="Oud Royal")
+    perfume = perfumes[0]
+    Review.objects.create(perfume=perfume, customer_name="Ada", description="Lovely")
+
+    cart = Cart.objects.create()
+    Cartitems.objects.create(cart=cart, perfume=perfume, quantity=1)
+
+    user = User.objects.create_user('buyer', password='pass')
+    staff = User.objects.create_user('staff', password='pass', is_staff=True)
+    order = Order.objects.create(user=user, reference='ref-1')
+    OrderItem.objects.create(order=order, perfume=perfume, price=perfume.price)
+    return {
+        'category': category, 'perfume': perfume, 'cart': cart,
+        'user': user, 'staff': staff, 'order': order,
+    }
+
+
+def get(path, params=None, user=None):
+    def request():
+        client = APIClient()
+        if user is not None:
+            client.force_authenticate(user)
+        return client.get(path, params)
+    return request
+
+
+ENDPOINTS = {
+    'perfume list': lambda s: get('/api/perfumes/'),
+    'perfume list by category': lambda s: get('/api/perfumes/', {'category': s['category'].pk}),
+    'perfume list by price': lambda s: get('/api/perfumes/', {'price__gt': 10, 'price__lt': 60}),
+    'perfume list by category and price': lambda s: get('/api/perfumes/', {'category': s['category'].pk, 'price__lt': 60}),
+    'perfume list of top deals': lambda s: get('/api/perfumes/', {'top_deal': True}),
+    'perfume list of flash sales': lambda s: get('/api/perfumes/', {'flash_sales': True}),
+    'perfume list of discounts': lambda s: get('/api/perfumes/', {'discount': True}),
+    'perfume list by price descending': lambda s: get('/api/perfumes/', {'ordering': '-price'}),
+    'perfume list by rating': lambda s: get('/api/perfumes/', {'ordering': '-rating_avg', 'rating_avg__gte': 4}),
+    'perfume cursor page': lambda s: get('/api/perfumes/', {'pagination': 'cursor'}),
+    'perfume search': lambda s: get('/api/perfumes/', {'search': 'oud'}),
+    'perfume facets': lambda s: get('/api/perfumes/', {'facets': 'true'}),
+    'perfume facets by category': lambda s: get('/api/perfumes/', {'facets': 'true', 'category': s['category'].pk}),
+    'perfume detail': lambda s: get(f"/api/perfumes/{s['perfume'].pk}/"),
+    'category list': lambda s: get('/api/categories/'),
+    'category detail': lambda s: get(f"/api/categories/{s['category'].pk}/"),
+    'review list': lambda s: get(f"/api/perfumes/{s['perfume'].pk}/reviews/"),
+    'review cursor page': lambda s: get(f"/api/perfumes/{s['perfume'].pk}/reviews/", {'pagination': 'cursor'}),
+    'cart detail': lambda s: get(f"/api/carts/{s['cart'].pk}/"),
+    'cart item list': lambda s: get(f"/api/carts/{s['cart'].pk}/items/"),
+    'order list': lambda s: get('/api/orders/', user=s['user']),
+    'order list for staff': lambda s: get('/api/orders/', user=s['staff']),
+    'order list by status': lambda s: get('/api/orders/', {'status': 'pending'}, user=s['staff']),
+    'order detail': lambda s: get(f"/api/orders/{s['order'].pk}/", user=s['user']),
+}
+
+
+@pytest.mark.parametrize('endpoint', ENDPOINTS)
+def test_endpoint_uses_indexes(shop, endpoint):
+    assert_no_full_scans(ENDPOINTS[endpoint](shop))
+
+
+def test_add_to_cart_uses_indexes(shop):
+    perfume = Perfume.objects.exclude(pk=shop['perfume'].pk).first()
+
+    def request():
+        return APIClient().post(f"/api/carts/{shop['cart'].pk}/items/", {'perfume_id': perfume.pk, 'quantity': 1})
+
+    assert_no_full_scans(request)
@@ -0,0 +1,126 @@
+import threading
+import time
+import pytest
+from django.contrib.auth.models import User
+from api.cache import ResponseCache
+from shop.models import Category, Perfume, Review
+from conftest import create_perfumes
+
+
+@pytest.fixture(autouse=True)
+def response_cache_on(settings, no_response_cache):
+    settings.API_CACHE_ENABLED = True
+
+
+def get(client, url):
+    response = client.get(url)
+    assert response.status_code == 200
+    return response
+
+
+@pytest.mark.django_db
+def test_second_request_is_a_hit(api_client):
+    create_perfumes(3)
+
+    assert get(api_client, "/api/perfumes/")["X-Cache"] == "MISS"
+    assert get(api_client, "/api/perfumes/")["X-Cache"] == "HIT"
+    # The query string is part of the key
+    assert get(api_client, "/api/perfumes/?ordering=-price")["X-Cache"] == "MISS"
+
+
+@pytest.mark.django_db
+def test_saving_a_perfume_invalidates_the_list_and_its_page(api_client):
+    perfume, other = create_perfumes(2)
+    get(api_client, "/api/perfumes/")
+    get(api_client, f"/api/perfumes/{perfume.id}/")
+    get(api_client, f"/api/perfumes/{other.id}/")
+
+    perfume.name = "Renamed"
+    perfume.save()
+
+    response = get(api_client, "/api/perfumes/")
+    assert response["X-Cache"] == "MISS"
+    assert "Renamed" in [item["name"] for item in response.data["results"]]
+    assert get(api_client, f"/api/perfumes/{perfume.id}/")["X-Cache"] == "MISS"
+    assert get(api_client, f"/api/perfumes/{other.id}/")["X-Cache"] == "HIT"
+
+
+@pytest.mark.django_db
+def test_reviews_are_invalidated_per_perfume(api_client):
+    perfume, other = create_perfumes(2)
+    get(api_client, f"/api/perfumes/{perfume.id}/reviews/")
+    get(api_client, f"/api/perfumes/{other.id}/reviews/")
+
+    Review.objects.create(perfume=perfume, customer_name="Ada")
+
+    response = get(api_client, f"/api/perfumes/{perfume.id}/reviews/")
+    assert response["X-Cache"] == "MISS"
+    assert response.data["count"] == 1
+    assert get(api_client, f"/api/perfumes/{other.id}/reviews/")["X-Cache"] == "HIT"
+
+
+@pytest.mark.django_db
+def test_category_changes_invalidate_the_category_list(api_client, category):
+    get(api_client, "/api/categories/")
+    category.title = "Oriental"
+    category.save()
+
+    response = get(api_client, "/api/categories/")
+    assert response["X-Cache"] == "MISS"
+    assert response.data["results"][0]["title"] == "Oriental"
+
+
+@pytest.mark.django_db
+def test_auth_state_is_part_of_the_key(api_client):
+    get(api_client, "/api/categories/")
+    api_client.force_authenticate(User.objects.create_user(username="ada", password="secret"))
+
+    assert get(api_client, "/api/categories/")["X-Cache"] == "MISS"
+
+
+@pytest.mark.django_db
+def test_errors_are_not_cached(api_client):
+    url = "/api/perfumes/00000000-0000-0000-0000-000000000000/"
+    assert api_client.get(url).status_code == 404
+    assert api_client.get(url).status_code == 404
+
+
+def test_concurrent_misses_rebuild_once():
+    response_cache = ResponseCache(wait_interval=0.005)
+    builds = []
+
+    def build():
+        builds.append(1)
+        time.sleep(0.1)
+        return {"results": []}
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(response_cache.get_or_set("dogpile", build)))
+        for _ in range(20)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(builds) == 1
+    assert results == [{"results": []}] * 20
+    assert response_cache.stats()["misses"] == 1
+
+
+@pytest.mark.django_db
+def test_writes_that_skip_the_signals_miss_the_cache(api_client, category):
+    first = get(api_client, "/api/categories/")
+    assert get(api_client, "/api/categories/")["X-Cache"] == "HIT"
+
+    # bulk_create doesn't send post_save, nothing bumps the "categories" namespace
+    Category.objects.bulk_create([Category(title="Imported", slug="imported")])
+
+    response = api_client.get("/api/categories/", HTTP_IF_NONE_MATCH=first["ETag"])
+    assert response.status_code == 200
+    assert response["X-Cache"] == "MISS"
+    assert len(response.json()["results"]) == 2
+    # The body and the ETag it's served under stay together
+    assert api_client.get("/api/categories/", HTTP_IF_NONE_MATCH=response["ETag"]).status_code == 304
+    assert get(api_client, "/api/categories/")["ETag"] == response["ETag"]
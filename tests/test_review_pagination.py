@@ -0,0 +1,73 @@
+import warnings
+from datetime import timedelta
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from shop.models import Review
+from conftest import create_perfumes
+from test_perfume_pagination import walk_pages
+
+
+@pytest.fixture
+def reviews(db):
+    perfume, other = create_perfumes(2)
+    reviews = Review.objects.bulk_create([Review(perfume=perfume, customer_name=f"Customer {i}", rating=5) for i in range(21)])
+    Review.objects.bulk_create([Review(perfume=other, customer_name="Other") for _ in range(4)])
+    # Three reviews per instant so the id has to break the ties
+    now = timezone.now()
+    for i, review in enumerate(reviews):
+        Review.objects.filter(pk=review.pk).update(date_created=now - timedelta(minutes=i // 3))
+    return perfume, reviews
+
+
+def newest_first(reviews):
+    # The fixture made review i (i // 3) minutes old
+    return [review.pk for i, review in sorted(enumerate(reviews), key=lambda row: (row[0] // 3, -row[1].pk))]
+
+
+def test_cursor_pages_cover_every_review_once_newest_first(api_client, reviews):
+    perfume, created = reviews
+
+    pages = walk_pages(api_client, f"/api/perfumes/{perfume.pk}/reviews/?pagination=cursor")
+
+    assert [len(page["results"]) for page in pages] == [9, 9, 3]
+    assert "count" not in pages[0]
+    assert [review["id"] for page in pages for review in page["results"]] == newest_first(created)
+
+    second = api_client.get(pages[0]["next"]).json()
+    assert api_client.get(second["previous"]).json()["results"] == pages[0]["results"]
+
+
+def test_page_numbers_are_newest_first(api_client, reviews):
+    perfume, created = reviews
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")  # No UnorderedObjectListWarning
+        pages = walk_pages(api_client, f"/api/perfumes/{perfume.pk}/reviews/")
+
+    assert pages[0]["count"] == 21
+    assert [review["id"] for page in pages for review in page["results"]] == newest_first(created)
+
+
+def test_list_rows_leave_out_the_perfume(api_client, reviews):
+    perfume, created = reviews
+
+    row = api_client.get(f"/api/perfumes/{perfume.pk}/reviews/").json()["results"][0]
+    assert set(row) == {"id", "date_created", "description", "customer_name", "rating"}
+
+    detail = api_client.get(f"/api/perfumes/{perfume.pk}/reviews/{created[0].pk}/").json()
+    assert detail["perfume"] == str(perfume.pk)
+
+
+@pytest.mark.django_db
+def test_creating_a_review_is_a_single_insert(api_client):
+    perfume = create_perfumes(1)[0]
+
+    with CaptureQueriesContext(connection) as context:
+        response = api_client.post(f"/api/perfumes/{perfume.pk}/reviews/", {"customer_name": "Ada", "rating": 4})
+
+    assert response.status_code == 201
+    statements = [query["sql"].split()[0].upper() for query in context.captured_queries]
+    # Plus the perfume's counters, see shop/ratings.py
+    assert [statement for statement in statements if statement in ("SELECT", "INSERT", "UPDATE", "DELETE")] == ["INSERT", "UPDATE"]
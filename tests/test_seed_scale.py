@@ -0,0 +1,43 @@
+from io import StringIO
+import pytest
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db.models import Count
+from api.seeding import row_id
+from order.models import Order, OrderItem
+from shop.models import Cart, Category, Perfume, PerfumeImage, Review
+
+
+def seed_scale(*args):
+    out = StringIO()
+    call_command(
+        'seed_scale', '--categories', '5', '--perfumes', '300', '--images-per-perfume', '1', '--users', '20',
+        '--reviews', '1000', '--carts', '30', '--orders', '50', '--batch-size', '128', *args, stdout=out,
+    )
+    return out.getvalue()
+
+
+@pytest.mark.django_db
+def test_seeds_every_table_at_the_requested_scale():
+    User.objects.create_user('existing', password='pass')
+
+    output = seed_scale()
+
+    assert (Category.objects.count(), Perfume.objects.count(), PerfumeImage.objects.count()) == (5, 300, 300)
+    assert (User.objects.count(), Review.objects.count(), Cart.objects.count(), Order.objects.count()) == (21, 1000, 30, 50)
+    assert OrderItem.objects.count() >= 50
+    assert "rows/s" in output
+    # The seeded users can log in like any other
+    assert User.objects.get(username='seed42-0').check_password('password')
+    # And the next signup gets an id after theirs
+    assert User.objects.create_user('signup').pk == User.objects.get(username='seed42-19').pk + 1
+
+
+@pytest.mark.django_db
+def test_seeded_rows_are_deterministic_and_skewed():
+    seed_scale('--seed', '7')
+
+    assert set(Perfume.objects.values_list('pk', flat=True)) == {row_id(7, 'perfume', i) for i in range(300)}
+    reviews = list(Review.objects.values('perfume').annotate(n=Count('id')).order_by('-n').values_list('n', flat=True))
+    # A few popular perfumes, a long tail of perfumes with one or two reviews
+    assert reviews[0] > 10 * reviews[len(reviews) // 2]
@@ -0,0 +1,80 @@
+import logging
+import pytest
+from django.http import HttpResponse
+from django.test import RequestFactory
+from api.instrumentation import RepeatedQueriesError, SQLInstrumentationMiddleware, query_template
+from shop.models import Perfume
+from conftest import create_perfumes
+
+
+def n_plus_one(request):
+    # What a serializer does when it reads a relation without select_related
+    for perfume in Perfume.objects.all():
+        Perfume.objects.get(pk=perfume.pk)
+    return HttpResponse()
+
+
+def records(caplog):
+    return [record for record in caplog.records if record.name == 'api.instrumentation']
+
+
+@pytest.mark.django_db
+def test_requests_get_a_server_timing_header_and_a_log_line(api_client, caplog):
+    create_perfumes(3)
+    caplog.clear()
+
+    with caplog.at_level(logging.INFO, logger='api.instrumentation'):
+        response = api_client.get('/api/perfumes/')
+
+    assert response['Server-Timing'].startswith('db;dur=')
+    record, = records(caplog)
+    assert record.view == 'PerfumesViewSet.list'
+    assert (record.method, record.path, record.status) == ('GET', '/api/perfumes/', 200)
+    assert f'desc="{record.queries} queries"' in response['Server-Timing']
+    assert record.repeated_queries == {}
+
+
+@pytest.mark.django_db
+def test_extra_actions_are_named_after_the_action(api_client, caplog):
+    perfume, = create_perfumes(1)
+    cart = api_client.post('/api/carts/').json()
+    caplog.clear()
+
+    with caplog.at_level(logging.INFO, logger='api.instrumentation'):
+        api_client.post(f"/api/carts/{cart['id']}/items/bulk/", {'items': [{'perfume_id': str(perfume.pk), 'quantity': 1}]}, format='json')
+
+    assert [record.view for record in records(caplog)] == ['CartItemViewSet.bulk']
+
+
+@pytest.mark.django_db
+def test_instrumentation_is_opt_in(api_client, settings):
+    settings.SQL_INSTRUMENTATION = False
+
+    assert 'Server-Timing' not in api_client.get('/api/perfumes/')
+
+
+@pytest.mark.django_db
+def test_repeated_queries_fail_in_strict_mode():
+    create_perfumes(3)
+
+    with pytest.raises(RepeatedQueriesError, match='3x SELECT'):
+        SQLInstrumentationMiddleware(n_plus_one)(RequestFactory().get('/'))
+
+
+@pytest.mark.django_db
+def test_repeated_queries_are_logged_otherwise(settings, caplog):
+    settings.SQL_INSTRUMENTATION_STRICT = False
+    create_perfumes(3)
+
+    with caplog.at_level(logging.INFO, logger='api.instrumentation'):
+        response = SQLInstrumentationMiddleware(n_plus_one)(RequestFactory().get('/'))
+
+    assert 'db-repeated;desc="1 repeated queries"' in response['Server-Timing']
+    record, = records(caplog)
+    assert record.levelno == logging.WARNING
+    assert list(record.repeated_queries.values()) == [3]
+
+
+def test_templates_ignore_the_number_of_values():
+    assert query_template('SELECT * FROM t WHERE id IN (%s, %s, %s)') == 'SELECT * FROM t WHERE id IN (...)'
+    assert query_template('SELECT *\n  FROM t WHERE id IN (%s)') == 'SELECT * FROM t WHERE id IN (...)'
@@ -0,0 +1,77 @@
+import gc
+import os
+import subprocess
+import sys
+from io import StringIO
+import pytest
+from django.core.management import call_command
+from drf_spectacular.generators import SchemaGenerator
+from api.schema import CachedSpectacularAPIView
+from scenthives.warmup import warm_up
+
+
+@pytest.fixture
+def schema_builds(monkeypatch):
+    builds = []
+    get_schema = SchemaGenerator.get_schema
+
+    def counting_get_schema(self, *args, **kwargs):
+        builds.append(1)
+        return get_schema(self, *args, **kwargs)
+
+    monkeypatch.setattr(SchemaGenerator, 'get_schema', counting_get_schema)
+    monkeypatch.setattr(CachedSpectacularAPIView, '_schemas', {})
+    return builds
+
+
+@pytest.mark.django_db
+def test_schema_is_built_once(api_client, schema_builds):
+    first = api_client.get('/api/schema/')
+    second = api_client.get('/api/schema/')
+
+    assert first.status_code == second.status_code == 200
+    assert first.content == second.content
+    assert len(schema_builds) == 1
+
+
+@pytest.mark.django_db
+def test_warm_up_builds_the_schema_before_the_first_request(api_client, schema_builds):
+    try:
+        timings = warm_up()
+    finally:
+        gc.unfreeze()
+
+    assert set(timings) == {'urls', 'serializers', 'schema'}
+    assert api_client.get('/api/schema/').status_code == 200
+    assert len(schema_builds) == 1
+
+
+def test_importing_the_urls_prints_nothing():
+    result = subprocess.run(
+        [sys.executable, '-c', 'import django; django.setup(); import scenthives.urls'],
+        env={**os.environ, 'DJANGO_SETTINGS_MODULE': 'scenthives.settings'},
+        capture_output=True, text=True,
+    )
+
+    assert result.returncode == 0, result.stderr
+    assert result.stdout == ''
+
+
+def test_pillow_is_only_imported_to_resize_images():
+    result = subprocess.run(
+        [sys.executable, '-c', 'import sys, django; django.setup(); import scenthives.urls; print("PIL" in sys.modules)'],
+        env={**os.environ, 'DJANGO_SETTINGS_MODULE': 'scenthives.settings'},
+        capture_output=True, text=True,
+    )
+
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == 'False'
+
+
+def test_profile_startup_reports_the_import_times():
+    out = StringIO()
+    call_command('profile_startup', '--limit', '5', '--no-warm-up', stdout=out)
+
+    lines = out.getvalue().splitlines()
+    assert lines[0].endswith('ms') and 'modules imported' in lines[0]
+    assert len([line for line in lines if 'ms  ' in line]) == 5